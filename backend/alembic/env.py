@@ -16,11 +16,16 @@ if config.config_file_name is not None:
 
 # add your model's MetaData object here
 # for 'autogenerate' support
+from app.core.config import settings
 from app.core.database import Base
 # Import all model modules so Alembic can detect all tables
-from app.models import user, property, file, message, notification, conveyancing_case
+from app.models import user, property, file, message, notification, conveyancing_case, stage_info, timeline_template, blob
 target_metadata = Base.metadata
 
+# The app's database unless a URL was given explicitly (e.g. set_main_option in a script)
+if not config.get_main_option("sqlalchemy.url"):
+    config.set_main_option("sqlalchemy.url", settings.DATABASE_URL.replace("%", "%%"))
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -0,0 +1,30 @@
+"""add file sha256
+
+Revision ID: 1f6c8d3e5a72
+Revises: 8e2d6c0b4f19
+Create Date: 2026-10-18 15:12:40.218334
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1f6c8d3e5a72'
+down_revision: Union[str, None] = '8e2d6c0b4f19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows stay NULL; the digest is only known for files ingested from now on
+    op.add_column('files', sa.Column('sha256', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.drop_column('sha256')
@@ -0,0 +1,41 @@
+"""add notification counters
+
+Revision ID: 5b9e2f7a4c18
+Revises: a7d3f1c9e6b2
+Create Date: 2026-10-18 18:42:09.316204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b9e2f7a4c18'
+down_revision: Union[str, None] = 'a7d3f1c9e6b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('notification_counters',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('property_id', sa.Integer(), nullable=False),
+        sa.Column('unread', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'property_id')
+    )
+    # Start from the current unread rows
+    op.execute(
+        "INSERT INTO notification_counters (user_id, property_id, unread) "
+        "SELECT user_id, property_id, COUNT(*) FROM notifications "
+        "WHERE NOT read AND property_id IS NOT NULL GROUP BY user_id, property_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('notification_counters')
@@ -0,0 +1,56 @@
+"""add timeline templates
+
+Revision ID: 5b9e3f7a2c84
+Revises: d4f8a2c61b37
+Create Date: 2026-10-18 12:21:05.117342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b9e3f7a2c84'
+down_revision: Union[str, None] = 'd4f8a2c61b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Templates are seeded by app.services.timelines on first use
+    op.create_table(
+        'timeline_templates',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    op.create_index('ix_timeline_templates_id', 'timeline_templates', ['id'])
+    op.create_table(
+        'timeline_template_stages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('template_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('stage', sa.String(), nullable=False),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('responsible_role', sa.String(), nullable=True),
+        sa.Column('responsible', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['template_id'], ['timeline_templates.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_timeline_template_stages_id', 'timeline_template_stages', ['id'])
+    op.create_index('ix_timeline_template_stages_template_position', 'timeline_template_stages',
+                    ['template_id', 'position'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_timeline_template_stages_template_position', table_name='timeline_template_stages')
+    op.drop_index('ix_timeline_template_stages_id', table_name='timeline_template_stages')
+    op.drop_table('timeline_template_stages')
+    op.drop_index('ix_timeline_templates_id', table_name='timeline_templates')
+    op.drop_table('timeline_templates')
@@ -0,0 +1,58 @@
+"""add property participants
+
+Revision ID: 7c1e4b2d9a10
+Revises: 3a60e76e4ede
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e4b2d9a10'
+down_revision: Union[str, None] = '3a60e76e4ede'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Participant role -> properties column, as in app.models.property.PARTICIPANT_COLUMNS
+PARTICIPANT_COLUMNS = {
+    'buyer': 'buyer_id',
+    'seller': 'seller_id',
+    'buyer_solicitor': 'buyer_solicitor_id',
+    'seller_solicitor': 'seller_solicitor_id',
+    'estate_agent': 'estate_agent_id',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # main.py runs create_all on startup, so the table may already exist (empty)
+    if not sa.inspect(op.get_bind()).has_table('property_participants'):
+        op.create_table('property_participants',
+        sa.Column('property_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('role', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('property_id', 'user_id', 'role')
+        )
+        op.create_index('ix_property_participants_user_property', 'property_participants', ['user_id', 'property_id'], unique=False)
+
+    # Backfill from the existing foreign keys
+    for role, column in PARTICIPANT_COLUMNS.items():
+        op.execute(
+            f"INSERT INTO property_participants (property_id, user_id, role) "
+            f"SELECT p.id, p.{column}, '{role}' FROM properties p "
+            f"WHERE p.{column} IS NOT NULL AND NOT EXISTS ("
+            f"SELECT 1 FROM property_participants pp "
+            f"WHERE pp.property_id = p.id AND pp.user_id = p.{column} AND pp.role = '{role}')"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_property_participants_user_property', table_name='property_participants')
+    op.drop_table('property_participants')
@@ -0,0 +1,72 @@
+"""rank property stages
+
+Revision ID: 8e2d6c0b4f19
+Revises: 5b9e3f7a2c84
+Create Date: 2026-10-18 13:47:52.603118
+
+"""
+from itertools import groupby
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.ranking import spread_keys
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2d6c0b4f19'
+down_revision: Union[str, None] = '5b9e3f7a2c84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _backfill_ranks(table, group_column, order_column):
+    """Give each group's rows evenly spaced ranks following their current order."""
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        f'SELECT id, {group_column} FROM {table} ORDER BY {group_column}, "{order_column}", id'
+    )).all()
+    updates = []
+    for _, group in groupby(rows, key=lambda row: row[1]):
+        ids = [row[0] for row in group]
+        updates.extend({"id": id_, "rank": rank} for id_, rank in zip(ids, spread_keys(len(ids))))
+    if updates:
+        bind.execute(sa.text(f"UPDATE {table} SET rank = :rank WHERE id = :id"), updates)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('property_stages', sa.Column('rank', sa.String(), nullable=True))
+    _backfill_ranks('property_stages', 'property_id', 'order')
+    with op.batch_alter_table('property_stages') as batch_op:
+        batch_op.drop_index('ix_property_stages_property_order')
+        batch_op.alter_column('rank', existing_type=sa.String(), nullable=False)
+        batch_op.drop_column('order')
+        batch_op.create_index('ix_property_stages_property_rank', ['property_id', 'rank'])
+
+    op.add_column('timeline_template_stages', sa.Column('rank', sa.String(), nullable=True))
+    _backfill_ranks('timeline_template_stages', 'template_id', 'position')
+    with op.batch_alter_table('timeline_template_stages') as batch_op:
+        batch_op.alter_column('rank', existing_type=sa.String(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('timeline_template_stages') as batch_op:
+        batch_op.drop_column('rank')
+
+    op.add_column('property_stages', sa.Column('order', sa.Integer(), nullable=False, server_default='0'))
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT id, property_id FROM property_stages ORDER BY property_id, rank, id"
+    )).all()
+    updates = []
+    for _, group in groupby(rows, key=lambda row: row[1]):
+        updates.extend({"id": row[0], "order": position} for position, row in enumerate(group))
+    if updates:
+        bind.execute(sa.text('UPDATE property_stages SET "order" = :order WHERE id = :id'), updates)
+    with op.batch_alter_table('property_stages') as batch_op:
+        batch_op.drop_index('ix_property_stages_property_rank')
+        batch_op.drop_column('rank')
+        batch_op.create_index('ix_property_stages_property_order', ['property_id', 'order'])
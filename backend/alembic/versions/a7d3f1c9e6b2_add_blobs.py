@@ -0,0 +1,39 @@
+"""add blobs
+
+Revision ID: a7d3f1c9e6b2
+Revises: 1f6c8d3e5a72
+Create Date: 2026-10-18 16:05:11.734920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3f1c9e6b2'
+down_revision: Union[str, None] = '1f6c8d3e5a72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing files move into the store with app/scripts/migrate_uploads_to_blobs.py
+    op.create_table('blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.PrimaryKeyConstraint('sha256')
+    )
+    op.create_index('ix_blobs_unreferenced', 'blobs', ['updated_at'],
+                    sqlite_where=sa.text('ref_count = 0'), postgresql_where=sa.text('ref_count = 0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_blobs_unreferenced', table_name='blobs')
+    op.drop_table('blobs')
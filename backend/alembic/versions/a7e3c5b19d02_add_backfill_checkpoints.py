@@ -0,0 +1,38 @@
+"""add backfill checkpoints
+
+Revision ID: a7e3c5b19d02
+Revises: f2c7d9e4a815
+Create Date: 2026-10-18 23:26:52.104738
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e3c5b19d02'
+down_revision: Union[str, None] = 'f2c7d9e4a815'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('backfill_checkpoints',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('last_key', sa.Integer(), nullable=False),
+        sa.Column('rows', sa.Integer(), nullable=False),
+        sa.Column('changed', sa.Integer(), nullable=False),
+        sa.Column('batches', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('backfill_checkpoints')
@@ -0,0 +1,32 @@
+"""add row versions
+
+Revision ID: b9d4e2f07c31
+Revises: a7e3c5b19d02
+Create Date: 2026-10-18 23:58:14.620417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9d4e2f07c31'
+down_revision: Union[str, None] = 'a7e3c5b19d02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('properties', sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False))
+    op.add_column('property_stages', sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('property_stages') as batch_op:
+        batch_op.drop_column('version')
+    with op.batch_alter_table('properties') as batch_op:
+        batch_op.drop_column('version')
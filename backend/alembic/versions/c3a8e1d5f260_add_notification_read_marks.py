@@ -0,0 +1,36 @@
+"""add notification read marks
+
+Revision ID: c3a8e1d5f260
+Revises: 5b9e2f7a4c18
+Create Date: 2026-10-18 19:27:51.082417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a8e1d5f260'
+down_revision: Union[str, None] = '5b9e2f7a4c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('notification_read_marks',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('property_id', sa.Integer(), nullable=False),
+        sa.Column('last_read_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'property_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Notifications only read through a mark become unread again; rerun reconcile_unread_counts after
+    op.drop_table('notification_read_marks')
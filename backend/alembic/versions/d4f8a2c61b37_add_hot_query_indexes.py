@@ -0,0 +1,54 @@
+"""add hot query indexes
+
+Revision ID: d4f8a2c61b37
+Revises: 7c1e4b2d9a10
+Create Date: 2026-10-18 11:02:17.540913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f8a2c61b37'
+down_revision: Union[str, None] = '7c1e4b2d9a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_notifications_property_user_created', 'notifications',
+                    ['property_id', 'user_id', 'created_at'])
+    op.create_index('ix_notifications_unread', 'notifications',
+                    ['property_id', 'user_id', 'created_at'],
+                    sqlite_where=sa.text('read = 0'), postgresql_where=sa.text('NOT read'))
+    op.create_index('ix_messages_property_timestamp', 'messages', ['property_id', 'timestamp'])
+    op.create_index('ix_messages_pending', 'messages', ['property_id', 'timestamp'],
+                    sqlite_where=sa.text("approval_status = 'pending'"),
+                    postgresql_where=sa.text("approval_status = 'pending'"))
+    op.create_index('ix_property_stages_property_order', 'property_stages', ['property_id', 'order'])
+    op.create_index('ix_files_property_id', 'files', ['property_id'])
+
+    # Drop duplicate explanations before adding the constraint, keeping the
+    # oldest row (the one lookups returned so far)
+    op.execute(
+        "DELETE FROM stage_info WHERE id NOT IN "
+        "(SELECT MIN(id) FROM stage_info GROUP BY stage, role)"
+    )
+    with op.batch_alter_table('stage_info', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.create_unique_constraint('uq_stage_info_stage_role', ['stage', 'role'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('stage_info', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_constraint('uq_stage_info_stage_role', type_='unique')
+    op.drop_index('ix_files_property_id', table_name='files')
+    op.drop_index('ix_property_stages_property_order', table_name='property_stages')
+    op.drop_index('ix_messages_pending', table_name='messages')
+    op.drop_index('ix_messages_property_timestamp', table_name='messages')
+    op.drop_index('ix_notifications_unread', table_name='notifications')
+    op.drop_index('ix_notifications_property_user_created', table_name='notifications')
@@ -0,0 +1,40 @@
+"""add notification archive
+
+Revision ID: e6f1b4a9d372
+Revises: c3a8e1d5f260
+Create Date: 2026-10-18 20:14:36.559821
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6f1b4a9d372'
+down_revision: Union[str, None] = 'c3a8e1d5f260'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('notification_archive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('property_id', sa.Integer(), nullable=True),
+        sa.Column('reason', sa.String(), nullable=False),
+        sa.Column('row_count', sa.Integer(), nullable=False),
+        sa.Column('first_notification_id', sa.Integer(), nullable=False),
+        sa.Column('last_notification_id', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_notification_archive_property_id'), 'notification_archive', ['property_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_notification_archive_property_id'), table_name='notification_archive')
+    op.drop_table('notification_archive')
@@ -0,0 +1,42 @@
+"""add shard directory
+
+Revision ID: f2c7d9e4a815
+Revises: e6f1b4a9d372
+Create Date: 2026-10-18 22:41:09.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c7d9e4a815'
+down_revision: Union[str, None] = 'e6f1b4a9d372'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('property_shards',
+        sa.Column('property_id', sa.Integer(), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('firm', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('property_id')
+    )
+    op.create_index(op.f('ix_property_shards_firm'), 'property_shards', ['firm'], unique=False)
+    op.create_table('firm_shards',
+        sa.Column('firm', sa.String(), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.PrimaryKeyConstraint('firm')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('firm_shards')
+    op.drop_index(op.f('ix_property_shards_firm'), table_name='property_shards')
+    op.drop_table('property_shards')
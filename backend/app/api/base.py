@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends
-from app.core.security import get_current_user
+from app.core.security import Principal, get_current_user, principal_cache
+from app.services.notifications import notifier
 
 router = APIRouter()
 
@@ -8,7 +9,13 @@ def ping():
     return {"message": "pong"}
 
 @router.get("/protected")
-def protected_route(current_user: str = Depends(get_current_user)):
+def protected_route(current_user: Principal = Depends(get_current_user)):
     return {"message": f"Hello {current_user}, you are authenticated!"}
 
+@router.get("/metrics/auth-cache")
+def auth_cache_stats(current_user=Depends(get_current_user)):
+    return principal_cache.stats()
 
+@router.get("/metrics/notifications")
+def notification_stats(current_user=Depends(get_current_user)):
+    return notifier.stats()
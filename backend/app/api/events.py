@@ -0,0 +1,69 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, WebSocket, status
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.access import get_property_access
+from app.core.database import SessionLocal
+from app.core.security import get_current_user
+from app.services.events import event_hub
+
+router = APIRouter()
+
+# Close codes: the connection was refused, or dropped for falling behind
+# (the client should reconnect with last_event_id)
+CLOSE_UNAUTHORIZED = status.WS_1008_POLICY_VIOLATION
+CLOSE_TOO_SLOW = status.WS_1013_TRY_AGAIN_LATER
+
+
+def _authorize(token: str, property_id: int):
+    db = SessionLocal()
+    try:
+        user = get_current_user(token=token, db=db)
+        access = get_property_access(db, property_id, user.id)
+        if access is None or not access.is_participant:
+            return None
+        return user
+    except HTTPException:
+        return None
+    finally:
+        db.close()
+
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    # Nothing the client sends is acted on; reading just surfaces the disconnect
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@router.websocket("/ws/properties/{property_id}")
+async def property_events(websocket: WebSocket, property_id: int, token: str, last_event_id: Optional[int] = None):
+    """
+    Push stage, document, message and notification events for one property.
+    Browsers can't set headers on a WebSocket, so the JWT comes as ?token=.
+    Pass the ID of the last event seen as ?last_event_id= to resume after a drop.
+    """
+    user = await run_in_threadpool(_authorize, token, property_id)
+    if user is None:
+        await websocket.close(code=CLOSE_UNAUTHORIZED)
+        return
+    await websocket.accept()
+
+    subscription = event_hub.subscribe(property_id, user.id, last_event_id)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(websocket))
+    try:
+        while True:
+            next_event = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                next_event.cancel()
+                return
+            event = next_event.result()
+            if event is None:
+                await websocket.close(code=CLOSE_TOO_SLOW)
+                return
+            await websocket.send_json(event.to_message())
+    finally:
+        event_hub.unsubscribe(subscription)
+        disconnected.cancel()
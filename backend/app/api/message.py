@@ -3,14 +3,25 @@ from sqlalchemy.orm import Session
 from app.core.database import SessionLocal
 from app.models.message import Message
 from app.models.user import User
-from app.models.property import Property
 from datetime import datetime
 from typing import List
-from app.core.security import get_current_user
-from app.models.notification import Notification
+from sqlalchemy import or_
+from app.core.security import Principal, get_current_user
+from app.core.access import get_property_access
+from app.core.read_routing import get_read_db
+from app.core.pagination import PageParams, page_params, paginate
+from app.core.projection import projection
+from app.services.notifications import notify_after_commit
+from app.services.events import publish_after_commit
 
 router = APIRouter()
 
+# What the message lists return, selected as plain dicts
+MESSAGE_COLUMNS = projection(
+    Message.id, Message.sender_id, Message.recipient_id, Message.property_id,
+    Message.stage_id, Message.content, Message.timestamp, Message.status,
+)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -52,6 +63,9 @@ def send_message(
         approval_status="approved"  # Ensure approval_status is also set to approved
     )
     db.add(message)
+    db.flush()
+    publish_after_commit(db, property_id, "message.created",
+                         {"message_id": message.id, "stage_id": stage_id, "approval_status": "approved"})
     db.commit()
     db.refresh(message)
     
@@ -63,81 +77,56 @@ def approve_message(message_id: int, db: Session = Depends(get_db)):
     if not message:
         raise HTTPException(status_code=404, detail="Message not found.")
     message.status = "approved"
-    db.commit()
+    publish_after_commit(db, message.property_id, "message.approved",
+                         {"message_id": message.id, "stage_id": message.stage_id})
     # Notify the recipient that their message was approved and delivered
-    notif = Notification(
-        user_id=message.recipient_id,
-        property_id=message.property_id,
-        message="A message has been approved and delivered to you.",
-        type="message"
-    )
-    db.add(notif)
+    notify_after_commit(db, message.property_id, "message",
+                        "A message has been approved and delivered to you.", [message.recipient_id])
     # Notify the sender that their message was delivered (for buyers/solicitors)
-    notif_sender = Notification(
-        user_id=message.sender_id,
-        property_id=message.property_id,
-        message="Your message was approved and delivered to the recipient.",
-        type="delivered"
-    )
-    db.add(notif_sender)
+    notify_after_commit(db, message.property_id, "delivered",
+                        "Your message was approved and delivered to the recipient.", [message.sender_id])
     db.commit()
     return {"message": "Message approved and delivered."}
 
 @router.get("/messages/property/{property_id}")
-def get_messages_for_property(property_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    messages = db.query(Message).filter(Message.property_id == property_id).order_by(Message.timestamp).all()
-    result = []
-    for m in messages:
-        # Show message if approved, or if the current user is the sender
-        if m.status == "approved" or m.sender_id == current_user.id:
-            result.append({
-                "id": m.id,
-                "sender_id": m.sender_id,
-                "recipient_id": m.recipient_id,
-                "property_id": m.property_id,
-                "stage_id": m.stage_id,
-                "content": m.content,
-                "timestamp": m.timestamp,
-                "status": m.status
-            })
-    return result
+def get_messages_for_property(
+    property_id: int,
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    # Show message if approved, or if the current user is the sender
+    query = db.query(MESSAGE_COLUMNS).filter(
+        Message.property_id == property_id,
+        or_(Message.status == "approved", Message.sender_id == current_user.id)
+    )
+    if page.paginated:
+        messages, next_cursor = paginate(query, page, Message.id, Message.timestamp)
+        return {"items": messages, "next_cursor": next_cursor}
+    return query.order_by(Message.timestamp).all()
 
 @router.get("/messages/pending/{property_id}")
-def get_pending_messages(property_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_pending_messages(property_id: int, db: Session = Depends(get_read_db), current_user: Principal = Depends(get_current_user)):
     # Check if user is estate agent for this property
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop or prop.estate_agent_id != current_user.id:
+    access = get_property_access(db, property_id, current_user.id)
+    if not access or not access.has_role("estate_agent"):
         raise HTTPException(status_code=403, detail="Not authorized to view pending messages for this property")
 
-    # Get all pending messages for this property
-    messages = db.query(Message).filter(
+    # Get all pending messages for this property (still-moderating ones are held back)
+    return db.query(MESSAGE_COLUMNS).filter(
         Message.property_id == property_id,
-        Message.status == "pending"
+        Message.approval_status == "pending"
     ).order_by(Message.timestamp.desc()).all()
 
-    return [
-        {
-            "id": m.id,
-            "sender_id": m.sender_id,
-            "recipient_id": m.recipient_id,
-            "property_id": m.property_id,
-            "stage_id": m.stage_id,
-            "content": m.content,
-            "timestamp": m.timestamp,
-            "status": m.status
-        }
-        for m in messages
-    ]
-
 @router.post("/messages/reject/{message_id}")
-def reject_message(message_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def reject_message(message_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     message = db.query(Message).filter(Message.id == message_id).first()
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     
     # Check if user is estate agent for this property
-    prop = db.query(Property).filter(Property.id == message.property_id).first()
-    if not prop or prop.estate_agent_id != current_user.id:
+    access = get_property_access(db, message.property_id, current_user.id)
+    if not access or not access.has_role("estate_agent"):
         raise HTTPException(status_code=403, detail="Not authorized to reject messages for this property")
 
     message.status = "rejected"
@@ -1,47 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, Body
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, Response, Body
+from sqlalchemy import String, literal, tuple_
 from sqlalchemy.orm import Session
-from app.models.property import Property, PropertyStage, PropertyStatus
-from app.models.user import User, UserRole
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.concurrency import run_in_threadpool
+from app.models.property import Property, PropertyStage, PropertyStatus, PropertyParticipant
+from app.models.user import User
 from app.models.notification import Notification
-from app.models.file import File
+from app.models.file import File, DocumentType
 from app.models.message import Message
-from app.core.database import get_db
-from app.core.security import get_current_user
-from typing import List, Optional
-from pydantic import BaseModel
+from app.core.database import get_db, get_async_db, get_uow
+from app.core.read_routing import get_read_db
+from app.core.security import Principal, get_current_user
+from app.core.access import PropertyAccess, property_participant, property_reader, get_property_access, get_property_access_async
+from app.core.concurrency import check_if_match, claim_version, set_etag
+from app.core.pagination import Page, PageParams, encode_cursor, page_params, paginate
+from app.core.projection import projection
+from app.core.sharding import get_async_shard_db, get_shard_db, get_shard_read_db, shard_router
+from typing import List, Optional, Union
+from pydantic import BaseModel, Field
 from datetime import datetime, timedelta
 import os
 from app.schemas.property import PropertyResponse
-import openai
 import re
-from app.models.stage_info import StageInfo
+from app.services.moderation import moderation_pipeline, MODERATING
+from app.services.events import publish_after_commit
+from app.services.notifications import notify_after_commit, property_recipients
+from app.services.unread_counts import forget_property, mark_read, mark_read_up_to, read_watermark, unread_counts
+from app.services.ingest import receive_upload
+from app.services.blobs import blob_store, release_blobs
+from app.services.timelines import (
+    apply_order, clone_template, clone_template_stages, ensure_stage_info, needs_rebalance, rank_for_position,
+    rebalance_stages_task, stage_position,
+)
 
 router = APIRouter()
 
-# Preset stages for property conveyancing
-PRESET_STAGES = [
-    {"stage": "Offer Accepted", "responsible_role": "estate_agent", "description": "Initial acceptance of offer by the estate agent"},
-    {"stage": "Buyer ID Verification", "responsible_role": "buyer", "description": "Buyer provides proof of ID and address"},
-    {"stage": "Seller ID Verification", "responsible_role": "seller", "description": "Seller provides proof of ID and address"},
-    {"stage": "Draft Contract Issued", "responsible_role": "seller_solicitor", "description": "Seller's solicitor prepares and issues draft contract"},
-    {"stage": "Searches Ordered", "responsible_role": "buyer_solicitor", "description": "Buyer's solicitor orders property searches"},
-    {"stage": "Searches Received & Reviewed", "responsible_role": "buyer_solicitor", "description": "Buyer's solicitor reviews search results"},
-    {"stage": "Survey Booked", "responsible_role": "buyer", "description": "Buyer arranges property survey"},
-    {"stage": "Survey Completed", "responsible_role": "surveyor", "description": "Surveyor completes property survey"},
-    {"stage": "Mortgage Offer Received", "responsible_role": "buyer", "description": "Buyer receives mortgage offer from lender"},
-    {"stage": "Proof of Funds Verified", "responsible_role": "buyer", "description": "Buyer provides proof of funds"},
-    {"stage": "Enquiries Raised by Buyer's Solicitor", "responsible_role": "buyer_solicitor", "description": "Buyer's solicitor raises enquiries"},
-    {"stage": "Enquiries Answered by Seller's Solicitor", "responsible_role": "seller_solicitor", "description": "Seller's solicitor answers enquiries"},
-    {"stage": "Final Contract Approved", "responsible_role": "both_solicitors", "description": "Both solicitors approve final contract"},
-    {"stage": "Contracts Signed by Buyer & Seller", "responsible_role": "both_parties", "description": "Buyer and seller sign contracts"},
-    {"stage": "Completion Date Agreed", "responsible_role": "both_solicitors", "description": "Both solicitors agree on completion date"},
-    {"stage": "Deposit Paid by Buyer", "responsible_role": "buyer", "description": "Buyer pays deposit to solicitor"},
-    {"stage": "Contracts Exchanged", "responsible_role": "both_solicitors", "description": "Solicitors exchange contracts"},
-    {"stage": "Final Checks & Funds Requested", "responsible_role": "buyer_solicitor", "description": "Buyer's solicitor requests final funds"},
-    {"stage": "Completion Day", "responsible_role": "buyer_solicitor", "description": "Property ownership transfers to buyer"},
-    {"stage": "Keys Released & Registration", "responsible_role": "estate_agent", "description": "Keys released and property registered"}
-]
-
 # Schemas (simple inline for now)
 class PropertyBase(BaseModel):
     address: str
@@ -94,10 +89,16 @@ class PropertyStageResponse(PropertyStageBase):
     created_at: datetime
     updated_at: Optional[datetime]
     responsible_role: Optional[str] = None
+    version: int = 1  # the stage's ETag, for If-Match
 
     class Config:
         orm_mode = True
 
+# The columns PropertyStageResponse is built from, for reads that don't need ORM objects
+STAGE_COLUMNS = projection(*(
+    getattr(PropertyStage, field) for field in PropertyStageResponse.model_fields if field != "order"
+))
+
 class TimelineApprovalRequest(BaseModel):
     """Request model for timeline approval."""
     approved: bool = True
@@ -106,30 +107,47 @@ class TimelineApprovalRequest(BaseModel):
 class ReorderStagesRequest(BaseModel):
     stage_ids: List[int]
 
-@router.get("/properties", response_model=List[PropertyResponse])
-def get_user_properties(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    return db.query(Property).filter(
-        (Property.buyer_id == current_user.id) |
-        (Property.buyer_solicitor_id == current_user.id) |
-        (Property.seller_solicitor_id == current_user.id) |
-        (Property.estate_agent_id == current_user.id)
-    ).all()
+class MarkNotificationsReadRequest(BaseModel):
+    ids: List[int] = Field(..., max_length=1000)
+
+class MarkReadUpToRequest(BaseModel):
+    notification_id: int
+
+@router.get("/properties", response_model=Union[Page[PropertyResponse], List[PropertyResponse]])
+def get_user_properties(
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    def member_properties(shard_db):
+        member_of = shard_db.query(PropertyParticipant.property_id).filter(PropertyParticipant.user_id == current_user.id)
+        query = shard_db.query(Property).filter(Property.id.in_(member_of))
+        if not page.paginated:
+            return query.all(), None
+        return paginate(query, page, Property.id)
+
+    if not shard_router.sharded:
+        items, next_cursor = member_properties(db)
+        return items if not page.paginated else {"items": items, "next_cursor": next_cursor}
+
+    # Every shard's page at once, merged by id; copies left behind by a move are skipped
+    results = shard_router.fan_out(member_properties)
+    owners = shard_router.owners(db, [prop.id for items, _ in results for prop in items])
+    items = sorted((prop for shard, (shard_items, _) in enumerate(results) for prop in shard_items
+                    if owners.get(prop.id) == shard), key=lambda prop: prop.id)
+    if not page.paginated:
+        return items
+    has_more = len(items) > page.size or any(cursor for _, cursor in results)
+    items = items[:page.size]
+    return {"items": items, "next_cursor": encode_cursor([items[-1].id]) if has_more and items else None}
 
 @router.get("/properties/{property_id}", response_model=PropertyResponse)
-def get_property(property_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop or (
-        prop.buyer_id != current_user.id and 
-        prop.buyer_solicitor_id != current_user.id and 
-        prop.seller_solicitor_id != current_user.id and 
-        prop.estate_agent_id != current_user.id and
-        prop.seller_id != current_user.id
-    ):
-        raise HTTPException(status_code=404, detail="Property not found or access denied")
-    return prop
+def get_property(response: Response, access: PropertyAccess = Depends(property_participant)):
+    set_etag(response, access.property)
+    return access.property
 
 @router.post("/properties", response_model=PropertyResponse)
-def create_property(data: PropertyCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_property(data: PropertyCreate, db: Session = Depends(get_uow), current_user: Principal = Depends(get_current_user)):
     # Check if user is an estate agent or admin
     if not (current_user.role.value == "estate_agent" or current_user.role.value == "admin"):
         raise HTTPException(status_code=403, detail="Only estate agents or admin can create a property")
@@ -137,18 +155,19 @@ def create_property(data: PropertyCreate, db: Session = Depends(get_db), current
     # Validate assigned users
     def validate_user(user_id, expected_roles):
         if user_id is None:
-            return
+            return None
         user = db.query(User).filter(User.id == user_id).first()
         if not user:
             raise HTTPException(status_code=400, detail=f"User with id {user_id} does not exist")
         if user.role.value not in expected_roles:
             raise HTTPException(status_code=400, detail=f"User {user.email} does not have a valid role for this assignment (expected: {expected_roles}, got: {user.role.value})")
+        return user
 
     validate_user(data.buyer_id, ["buyer"])
     validate_user(data.seller_id, ["seller"])
     validate_user(data.buyer_solicitor_id, ["solicitor"])
     validate_user(data.seller_solicitor_id, ["solicitor"])
-    validate_user(data.estate_agent_id, ["estate_agent"])
+    agent = validate_user(data.estate_agent_id, ["estate_agent"])
 
     # Convert status string to enum value if provided
     status = PropertyStatus.AVAILABLE.name
@@ -158,7 +177,10 @@ def create_property(data: PropertyCreate, db: Session = Depends(get_db), current
         except ValueError:
             raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {[s.value for s in PropertyStatus]}")
 
+    # The shard for the agent's firm; the catalog itself when unsharded
+    property_id, shard = shard_router.place(db, agent.company_name if agent else None)
     prop = Property(
+        id=property_id,
         address=data.address,
         postcode=data.postcode,
         status=status,
@@ -173,289 +195,319 @@ def create_property(data: PropertyCreate, db: Session = Depends(get_db), current
         seller_solicitor_id=data.seller_solicitor_id,
         estate_agent_id=data.estate_agent_id
     )
-    db.add(prop)
-    db.commit()
-    db.refresh(prop)
-
-    # Add preset stages
-    for i, stage_data in enumerate(PRESET_STAGES):
-        stage = PropertyStage(
-            property_id=prop.id,
-            stage=stage_data["stage"],
-            status="pending",
-            description=stage_data["description"],
-            responsible_role=stage_data["responsible_role"],
-            order=i,
-            is_draft=False
-        )
-        db.add(stage)
-        # Add stage_info for all roles if not exists
-        for role in UserRole:
-            exists = db.query(StageInfo).filter_by(stage=stage_data["stage"], role=role.value).first()
-            if not exists:
-                db.add(StageInfo(stage=stage_data["stage"], role=role.value, explanation=f"Explain the {stage_data['stage']}"))
-    db.commit()
-
-    return prop
+    if not shard_router.sharded:
+        db.add(prop)
+        db.flush()
+        # Preset stages and their StageInfo placeholders, one statement each
+        clone_template(db, prop.id)
+        db.refresh(prop)
+        return prop
+
+    # Written to the shard before get_uow commits the directory entry; until then nothing can find it
+    shard_db = shard_router.session(shard)
+    try:
+        shard_db.add(prop)
+        shard_db.flush()
+        # Only the stages go to the shard; the template and StageInfo stay in the catalog
+        clone_template_stages(shard_db, db, prop.id)
+        shard_db.commit()
+        shard_db.refresh(prop)
+        return prop
+    except Exception:
+        shard_db.rollback()
+        raise
+    finally:
+        shard_db.close()
 
 @router.patch("/properties/{property_id}", response_model=PropertyResponse)
-def update_property(property_id: int, data: PropertyUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop or (
-        prop.buyer_id != current_user.id and 
-        prop.buyer_solicitor_id != current_user.id and 
-        prop.seller_solicitor_id != current_user.id and 
-        prop.estate_agent_id != current_user.id and
-        prop.seller_id != current_user.id
-    ):
+def update_property(property_id: int, data: PropertyUpdate, response: Response, if_match: Optional[str] = Header(None),
+                    db: Session = Depends(get_shard_db), current_user: Principal = Depends(get_current_user)):
+    access = get_property_access(db, property_id, current_user.id)
+    if access is None or not access.is_participant:
         raise HTTPException(status_code=404, detail="Property not found or access denied")
+    prop = access.property
+    check_if_match(if_match, prop)
     for field, value in data.dict(exclude_unset=True).items():
         setattr(prop, field, value)
-    db.commit()
+    db.flush()
     db.refresh(prop)
+    set_etag(response, prop)
     return prop
 
 @router.get("/properties/{property_id}/stages", response_model=List[PropertyStageResponse])
-def get_property_stages(property_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop:
+def get_property_stages(property_id: int, db: Session = Depends(get_shard_read_db), current_user: Principal = Depends(get_current_user)):
+    access = get_property_access(db, property_id, current_user.id)
+    if not access:
         raise HTTPException(status_code=404, detail="Property not found")
-    if (prop.buyer_id != current_user.id and 
-        prop.buyer_solicitor_id != current_user.id and 
-        prop.seller_solicitor_id != current_user.id and 
-        prop.estate_agent_id != current_user.id and
-        prop.seller_id != current_user.id):
+    if not access.is_participant:
         raise HTTPException(status_code=403, detail="Access denied")
-    stages = db.query(PropertyStage).filter(PropertyStage.property_id == property_id).order_by(PropertyStage.order).all()
-    result = []
-    for s in stages:
-        d = s.__dict__.copy()
-        d['responsible_role'] = getattr(s, 'responsible_role', None) or getattr(s, 'responsible', None)
-        d.pop('_sa_instance_state', None)
-        result.append(PropertyStageResponse(**d))
-    return result
+    stages = db.query(STAGE_COLUMNS).filter(PropertyStage.property_id == property_id).order_by(PropertyStage.rank, PropertyStage.id).all()
+    for position, stage in enumerate(stages):
+        stage['order'] = position
+        stage['responsible_role'] = stage['responsible_role'] or stage['responsible']
+    return stages
 
 @router.post("/properties/{property_id}/stages", response_model=PropertyStageResponse)
-def create_property_stage(property_id: int, stage: PropertyStageCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop or (prop.buyer_id != current_user.id and prop.buyer_solicitor_id != current_user.id and prop.seller_solicitor_id != current_user.id and prop.estate_agent_id != current_user.id):
+def create_property_stage(property_id: int, stage: PropertyStageCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_shard_db), catalog: Session = Depends(get_uow), current_user: Principal = Depends(get_current_user)):
+    access = get_property_access(db, property_id, current_user.id)
+    if not access or not access.has_role("buyer", "buyer_solicitor", "seller_solicitor", "estate_agent"):
         raise HTTPException(status_code=404, detail="Property not found or access denied")
-    order = getattr(stage, 'order', None)
-    if order is not None:
-        db.query(PropertyStage).filter(
-            PropertyStage.property_id == property_id,
-            PropertyStage.order >= order
-        ).update({PropertyStage.order: PropertyStage.order + 1}, synchronize_session=False)
-        db.commit()
-    else:
-        max_order = db.query(PropertyStage).filter(PropertyStage.property_id == property_id).count()
-        order = max_order
+    prop = access.property
+    # Slot in between the neighbours at `order`; no other stage is rewritten
     db_stage = PropertyStage(
         property_id=property_id,
-        order=order,
+        rank=rank_for_position(db, property_id, stage.order),
         **stage.dict(exclude_unset=True, exclude={'order'})
     )
     db.add(db_stage)
-    db.commit()
-    db.refresh(db_stage)
-
     # Ensure stage_info exists for all roles
-    for role in UserRole:
-        exists = db.query(StageInfo).filter_by(stage=db_stage.stage, role=role.value).first()
-        if not exists:
-            db.add(StageInfo(stage=db_stage.stage, role=role.value, explanation=f"Explain the {db_stage.stage}"))
-    db.commit()
+    ensure_stage_info(catalog, [db_stage.stage])
+    db.flush()
+    publish_after_commit(db, property_id, "stage.created", {"stage_id": db_stage.id})
+    db.refresh(db_stage)
+    if needs_rebalance(db_stage.rank):
+        background_tasks.add_task(rebalance_stages_task, property_id, shard_router.session_factory(db))
 
+    db_stage.order = stage_position(db, db_stage)
     return db_stage
 
+# Declared before /stages/{stage_id} so 'reorder' isn't taken for a stage id
+@router.patch("/properties/{property_id}/stages/reorder")
+def reorder_property_stages(
+    property_id: int,
+    response: Response,
+    request: ReorderStagesRequest = Body(...),
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_shard_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Reorder the stages for a property. Only allowed if timeline is not locked and user is a solicitor for the property.
+    Accepts a list of stage IDs in the new order. The order belongs to the
+    property, so If-Match and the ETag returned are the property's.
+    """
+    access = get_property_access(db, property_id, current_user.id)
+    if not access:
+        raise HTTPException(status_code=404, detail="Property not found")
+    prop = access.property
+    if prop.timeline_locked:
+        raise HTTPException(status_code=400, detail="Cannot reorder stages when timeline is locked")
+    if not access.has_role("buyer_solicitor", "seller_solicitor"):
+        raise HTTPException(status_code=403, detail="Not authorized to reorder stages for this property")
+    check_if_match(if_match, prop)
+    stage_ids = db.query(PropertyStage.id).filter(PropertyStage.property_id == property_id).all()
+    if len(request.stage_ids) != len(stage_ids) or set(request.stage_ids) != {stage_id for stage_id, in stage_ids}:
+        raise HTTPException(status_code=400, detail="Stage IDs do not match current stages")
+    # A concurrent reorder loses on the property's version; then the whole new ordering in one UPDATE
+    claim_version(db, prop)
+    apply_order(db, property_id, request.stage_ids)
+    set_etag(response, prop)
+    publish_after_commit(db, property_id, "stages.reordered", {"stage_ids": request.stage_ids})
+    return {"message": "Stages reordered successfully"}
+
 @router.patch("/properties/{property_id}/stages/{stage_id}", response_model=PropertyStageResponse)
-def update_property_stage(property_id: int, stage_id: int, stage: PropertyStageUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop or (prop.buyer_id != current_user.id and prop.buyer_solicitor_id != current_user.id and prop.seller_solicitor_id != current_user.id and prop.estate_agent_id != current_user.id):
+def update_property_stage(property_id: int, stage_id: int, stage: PropertyStageUpdate, background_tasks: BackgroundTasks,
+                          response: Response, if_match: Optional[str] = Header(None),
+                          db: Session = Depends(get_shard_db), current_user: Principal = Depends(get_current_user)):
+    access = get_property_access(db, property_id, current_user.id)
+    if not access or not access.has_role("buyer", "buyer_solicitor", "seller_solicitor", "estate_agent"):
         raise HTTPException(status_code=404, detail="Property not found or access denied")
+    prop = access.property
     db_stage = db.query(PropertyStage).filter(PropertyStage.id == stage_id, PropertyStage.property_id == property_id).first()
     if not db_stage:
         raise HTTPException(status_code=404, detail="Stage not found")
+    check_if_match(if_match, db_stage)
     
     is_completing = stage.status == 'completed' and db_stage.status != 'completed'
     
-    for field, value in stage.dict(exclude_unset=True).items():
+    changes = stage.dict(exclude_unset=True)
+    if changes.pop('order', None) is not None:
+        # Moving a stage only rewrites its own rank
+        db_stage.rank = rank_for_position(db, property_id, stage.order, exclude_id=db_stage.id)
+        if needs_rebalance(db_stage.rank):
+            background_tasks.add_task(rebalance_stages_task, property_id, shard_router.session_factory(db))
+    for field, value in changes.items():
         setattr(db_stage, field, value)
     
     if is_completing:
         next_stage = db.query(PropertyStage).filter(
             PropertyStage.property_id == property_id,
-            PropertyStage.id > db_stage.id,
+            tuple_(PropertyStage.rank, PropertyStage.id) > tuple_(literal(db_stage.rank, String), db_stage.id),
             PropertyStage.status == 'pending'
-        ).order_by(PropertyStage.id).first()
+        ).order_by(PropertyStage.rank, PropertyStage.id).first()
         if next_stage:
+            # Versioned UPDATE: if two requests complete stages at once, only one advances it
             next_stage.status = 'in-progress'
+            publish_after_commit(db, property_id, "stage.updated", {"stage_id": next_stage.id, "status": next_stage.status})
         
-        users_to_notify = [
-            prop.buyer_id,
-            prop.buyer_solicitor_id,
-            prop.seller_solicitor_id,
-            prop.estate_agent_id,
-            prop.seller_id
-        ]
-        
-        for user_id in users_to_notify:
-            if user_id and user_id != current_user.id:
-                notif = Notification(
-                    user_id=user_id,
-                    property_id=property_id,
-                    message=f"Stage '{db_stage.stage}' has been completed by {current_user.first_name} {current_user.last_name}.",
-                    type="stage_completed"
-                )
-                db.add(notif)
+        notify_after_commit(
+            db, property_id, "stage_completed",
+            f"Stage '{db_stage.stage}' has been completed by {current_user.first_name} {current_user.last_name}.",
+            property_recipients(prop, exclude=current_user.id),
+        )
     
-    db.commit()
+    publish_after_commit(db, property_id, "stage.updated", {"stage_id": db_stage.id, "status": db_stage.status})
+    db.flush()
     db.refresh(db_stage)
+    db_stage.order = stage_position(db, db_stage)
+    set_etag(response, db_stage)
     return db_stage
 
 @router.get("/properties/{property_id}/notifications")
 def get_property_notifications(
     property_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    access: PropertyAccess = Depends(property_reader),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop or (
-        prop.buyer_id != current_user.id and 
-        prop.buyer_solicitor_id != current_user.id and 
-        prop.seller_solicitor_id != current_user.id and 
-        prop.estate_agent_id != current_user.id and
-        prop.seller_id != current_user.id
-    ):
-        raise HTTPException(status_code=404, detail="Property not found or access denied")
-    
     notifications = db.query(Notification).filter(
         Notification.property_id == property_id,
         Notification.user_id == current_user.id,
-        Notification.read == False
+        Notification.read == False,
+        Notification.id > read_watermark(db, current_user.id, property_id)
     ).order_by(Notification.created_at.desc()).all()
     
     return notifications
 
+@router.get("/me/unread-counts")
+def get_unread_counts(db: Session = Depends(get_read_db), current_user: Principal = Depends(get_current_user)):
+    """Unread notification badges for all of the user's properties, from the counters."""
+    counts = unread_counts(db, current_user.id)
+    return {
+        "total": sum(counts.values()),
+        "properties": [{"property_id": property_id, "unread": unread} for property_id, unread in counts.items()],
+    }
+
 @router.post("/notifications/{notification_id}/read")
-def mark_notification_as_read(notification_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    notif = db.query(Notification).filter(Notification.id == notification_id, Notification.user_id == current_user.id).first()
-    if not notif:
+def mark_notification_as_read(notification_id: int, db: Session = Depends(get_uow), current_user=Depends(get_current_user)):
+    exists = db.query(Notification.id).filter(
+        Notification.id == notification_id, Notification.user_id == current_user.id
+    ).first()
+    if not exists:
         raise HTTPException(status_code=404, detail="Notification not found")
-    notif.read = True
-    db.commit()
-    print(f"Notification {notification_id} marked as read for user {current_user.id}")
+    # Uncounts it from the user's unread badge in the same transaction
+    mark_read(db, current_user.id, [notification_id])
     return {"success": True}
 
+@router.post("/notifications/read")
+def mark_notifications_as_read(request: MarkNotificationsReadRequest, db: Session = Depends(get_uow),
+                               current_user: Principal = Depends(get_current_user)):
+    """Mark several notifications read in one transaction; ids that aren't the user's are ignored."""
+    marked = mark_read(db, current_user.id, request.ids)
+    return {"success": True, "marked": marked}
+
+@router.post("/properties/{property_id}/notifications/read-up-to")
+def mark_property_notifications_read(
+    property_id: int,
+    request: MarkReadUpToRequest,
+    access: PropertyAccess = Depends(property_participant),
+    db: Session = Depends(get_uow),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Mark every notification on the property up to `notification_id` read, by moving one watermark row."""
+    # The watermark must be one of the user's own notifications on this property,
+    # or a foreign/future id would hide notifications that are still counted
+    exists = db.query(Notification.id).filter(
+        Notification.id == request.notification_id,
+        Notification.user_id == current_user.id,
+        Notification.property_id == property_id,
+    ).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Notification not found")
+    unread = mark_read_up_to(db, current_user.id, property_id, request.notification_id)
+    return {"success": True, "unread": unread}
+
+def with_watermark(notifications, watermark):
+    # Show notifications below the read watermark as read, without writing them
+    for notification in notifications:
+        if notification.id <= watermark and not notification.read:
+            set_committed_value(notification, "read", True)
+    return notifications
+
 @router.get("/properties/{property_id}/notifications/all")
 def get_all_property_notifications(
     property_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    access: PropertyAccess = Depends(property_reader),
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop or (
-        prop.buyer_id != current_user.id and 
-        prop.buyer_solicitor_id != current_user.id and 
-        prop.seller_solicitor_id != current_user.id and 
-        prop.estate_agent_id != current_user.id and
-        prop.seller_id != current_user.id
-    ):
-        raise HTTPException(status_code=404, detail="Property not found or access denied")
-    
-    notifications = db.query(Notification).filter(
+    query = db.query(Notification).filter(
         Notification.property_id == property_id,
         Notification.user_id == current_user.id
-    ).order_by(Notification.created_at.desc()).all()
-    
-    return notifications
+    )
+    if not page.paginated:
+        return with_watermark(query.order_by(Notification.created_at.desc()).all(),
+                              read_watermark(db, current_user.id, property_id))
+    items, next_cursor = paginate(query, page, Notification.id, Notification.created_at, descending=True)
+    return {"items": with_watermark(items, read_watermark(db, current_user.id, property_id)),
+            "next_cursor": next_cursor}
 
 @router.post("/properties/{property_id}/stages/{stage_id}/complete")
 def complete_stage(
     property_id: int,
     stage_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    access: PropertyAccess = Depends(property_participant),
+    db: Session = Depends(get_shard_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop or (
-        prop.buyer_id != current_user.id and 
-        prop.buyer_solicitor_id != current_user.id and 
-        prop.seller_solicitor_id != current_user.id and 
-        prop.estate_agent_id != current_user.id and
-        prop.seller_id != current_user.id
-    ):
-        raise HTTPException(status_code=404, detail="Property not found or access denied")
-    
-    stage = db.query(PropertyStage).filter(PropertyStage.id == stage_id).first()
+    prop = access.property
+
+    stage = db.query(PropertyStage).filter(PropertyStage.id == stage_id, PropertyStage.property_id == property_id).first()
     if not stage:
         raise HTTPException(status_code=404, detail="Stage not found")
     
     stage.status = "completed"
     stage.completed_at = datetime.utcnow()
-    db.commit()
-    
-    users_to_notify = [
-        prop.buyer_id,
-        prop.buyer_solicitor_id,
-        prop.seller_solicitor_id,
-        prop.estate_agent_id,
-        prop.seller_id
-    ]
-    
-    for user_id in users_to_notify:
-        if user_id and user_id != current_user.id:
-            notif = Notification(
-                user_id=user_id,
-                property_id=property_id,
-                message=f"Stage '{stage.stage}' has been completed by {current_user.first_name} {current_user.last_name}.",
-                type="stage_completed"
-            )
-            db.add(notif)
-    
-    db.commit()
+    publish_after_commit(db, property_id, "stage.updated", {"stage_id": stage.id, "status": stage.status})
+    notify_after_commit(
+        db, property_id, "stage_completed",
+        f"Stage '{stage.stage}' has been completed by {current_user.first_name} {current_user.last_name}.",
+        property_recipients(prop, exclude=current_user.id),
+    )
     return {"message": "Stage completed successfully"}
 
-@router.post("/properties/{property_id}/documents")
+@router.post("/properties/{property_id}/documents", openapi_extra={"requestBody": {
+    "required": True,
+    "content": {"multipart/form-data": {"schema": {
+        "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}},
+    }}},
+}})
 async def upload_document(
     property_id: int,
-    file: UploadFile,
+    request: Request,
     document_type: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop or (
-        prop.buyer_id != current_user.id and 
-        prop.buyer_solicitor_id != current_user.id and 
-        prop.seller_solicitor_id != current_user.id and 
-        prop.estate_agent_id != current_user.id and
-        prop.seller_id != current_user.id
-    ):
+    access = await get_property_access_async(db, property_id, current_user.id)
+    if not access or not access.is_participant:
         raise HTTPException(status_code=404, detail="Property not found or access denied")
-    
+    prop = access.property
     try:
-        upload_dir = f"uploads/{property_id}"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{file.filename}"
-        file_path = f"{upload_dir}/{filename}"
-        
-        content = await file.read()
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
+        doc_type = DocumentType(document_type.lower())
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid document type: {document_type}")
+
+    # Streamed straight into the blob store, capped for this document type
+    upload = (await receive_upload(request, blob_store.incoming, document_type=doc_type.value)).file
+    try:
+        file_path = await blob_store.add_async(db, upload)
         
         document = File(
             property_id=property_id,
-            filename=filename,
-            original_filename=file.filename,
-            document_type=document_type,
-            uploaded_by=current_user.id,
-            file_path=file_path
+            filename=upload.filename,
+            file_path=file_path,
+            file_type=upload.content_type,
+            file_size=upload.size,
+            sha256=upload.sha256,
+            document_type=doc_type,
+            uploaded_by=current_user.id
         )
         db.add(document)
-        db.commit()
+        await db.flush()
+        publish_after_commit(db, property_id, "document.uploaded",
+                             {"document_id": document.id, "document_type": doc_type.value})
         
         document_labels = {
             'proof_of_id': 'Proof of ID',
@@ -464,62 +516,58 @@ async def upload_document(
             'local_authority_search': 'Local Authority Search',
             'draft_contract': 'Draft Contract'
         }
-        document_label = document_labels.get(document_type, document_type)
-        
-        users_to_notify = [
-            prop.buyer_id,
-            prop.buyer_solicitor_id,
-            prop.seller_solicitor_id,
-            prop.estate_agent_id,
-            prop.seller_id
-        ]
-        
-        for user_id in users_to_notify:
-            if user_id and user_id != current_user.id:
-                notif = Notification(
-                    user_id=user_id,
-                    property_id=property_id,
-                    message=f"{document_label} has been uploaded by {current_user.first_name} {current_user.last_name}.",
-                    type="document_uploaded"
-                )
-                db.add(notif)
-        
-        db.commit()
+        document_label = document_labels.get(doc_type.value, doc_type.value)
+        uploader = f"{current_user.first_name} {current_user.last_name}"
+        # A batch of uploads becomes one notification per recipient
+        notify_after_commit(
+            db, property_id, "document_uploaded", f"{document_label} has been uploaded by {uploader}.",
+            property_recipients(prop, exclude=current_user.id),
+            summary="{count} documents have been uploaded by " + uploader + ".",
+        )
+        await db.commit()
         return {"message": "Document uploaded successfully", "document_id": document.id}
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to upload document: {str(e)}")
+    finally:
+        await run_in_threadpool(upload.discard)
 
 @router.delete("/properties/{property_id}")
-def delete_property(property_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop:
+def delete_property(property_id: int, shard_db: Session = Depends(get_shard_db), db: Session = Depends(get_uow), current_user: Principal = Depends(get_current_user)):
+    # The property and its stages are on shard_db; everything else is in the catalog (the same session unsharded)
+    access = get_property_access(shard_db, property_id, current_user.id)
+    if not access:
         raise HTTPException(status_code=404, detail="Property not found")
+    prop = access.property
     # Only estate agent assigned to property can delete
-    if not (current_user.role.value == "estate_agent" and prop.estate_agent_id == current_user.id):
+    if not (current_user.role.value == "estate_agent" and access.has_role("estate_agent")):
         raise HTTPException(status_code=403, detail="Only the assigned estate agent can delete this property")
-    db.query(PropertyStage).filter(PropertyStage.property_id == property_id).delete()
+    shard_db.query(PropertyStage).filter(PropertyStage.property_id == property_id).delete()
     db.query(Notification).filter(Notification.property_id == property_id).delete()
+    forget_property(db, property_id)
+    files = db.query(File.file_path, File.sha256).filter(File.property_id == property_id).all()
+    release_blobs(db, [sha256 for path, sha256 in files if blob_store.owns(path)])
     db.query(File).filter(File.property_id == property_id).delete()
-    db.delete(prop)
-    db.commit()
+    shard_router.forget(db, property_id)
+    shard_db.delete(prop)
     return {"message": "Property and all associated data deleted successfully"}
 
 @router.delete("/properties/{property_id}/stages/{stage_id}", response_model=PropertyStageResponse)
 def delete_property_stage(
     property_id: int,
     stage_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_shard_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Delete a property stage and reorder remaining stages."""
     # Check if user has access to the property
-    property = db.query(Property).filter(Property.id == property_id).first()
-    if not property:
+    access = get_property_access(db, property_id, current_user.id)
+    if not access:
         raise HTTPException(status_code=404, detail="Property not found")
+    property = access.property
     # Check if user is a solicitor for this property
-    if not (current_user.id == property.buyer_solicitor_id or current_user.id == property.seller_solicitor_id):
+    if not access.has_role("buyer_solicitor", "seller_solicitor"):
         raise HTTPException(status_code=403, detail="Not authorized to modify this property's stages")
     # Check if timeline is locked
     if property.timeline_locked:
@@ -531,34 +579,34 @@ def delete_property_stage(
     ).first()
     if not stage:
         raise HTTPException(status_code=404, detail="Stage not found")
-    deleted_order = stage.order
-    # Delete the stage
+    # Later stages keep their ranks, so nothing else needs renumbering
+    position = stage_position(db, stage)
     db.delete(stage)
-    db.commit()
-    # Decrement order of all subsequent stages
-    db.query(PropertyStage).filter(PropertyStage.property_id == property_id, PropertyStage.order > deleted_order).update({PropertyStage.order: PropertyStage.order - 1})
-    db.commit()
+    publish_after_commit(db, property_id, "stage.deleted", {"stage_id": stage_id})
+    db.flush()
+    stage.order = position
     return stage
 
 @router.post("/properties/{property_id}/timeline-approval", response_model=PropertyResponse)
 async def approve_timeline(
     property_id: int,
     approval: TimelineApprovalRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_shard_db)
 ):
     """
     Approve the timeline for a property.
     Requires both buyer and seller solicitors to approve before locking.
     """
     # Get the property
-    property = db.query(Property).filter(Property.id == property_id).first()
-    if not property:
+    access = await get_property_access_async(db, property_id, current_user.id)
+    if not access:
         raise HTTPException(status_code=404, detail="Property not found")
+    property = access.property
 
     # Check if user is authorized to approve
-    is_buyer_solicitor = current_user.id == property.buyer_solicitor_id
-    is_seller_solicitor = current_user.id == property.seller_solicitor_id
+    is_buyer_solicitor = access.has_role("buyer_solicitor")
+    is_seller_solicitor = access.has_role("seller_solicitor")
     
     if not (is_buyer_solicitor or is_seller_solicitor):
         raise HTTPException(
@@ -600,34 +648,30 @@ async def approve_timeline(
         if approval.comment:
             # Create a notification for the other solicitor
             other_solicitor_id = property.seller_solicitor_id if is_buyer_solicitor else property.buyer_solicitor_id
-            notification = Notification(
-                user_id=other_solicitor_id,
-                property_id=property.id,
-                message=f"Timeline approved with comment: {approval.comment}",
-                type="timeline_approval"
-            )
-            db.add(notification)
+            notify_after_commit(db, property.id, "timeline_approval",
+                                f"Timeline approved with comment: {approval.comment}", [other_solicitor_id])
 
-        db.commit()
-        db.refresh(property)
+        await db.commit()
+        await db.refresh(property)
 
         return property
 
+    except StaleDataError:
+        # The other solicitor approved at the same moment; a retry sees both approvals and locks
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/properties/{property_id}/reset-stages")
-def reset_property_stages(property_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop:
+def reset_property_stages(property_id: int, db: Session = Depends(get_shard_db), current_user: Principal = Depends(get_current_user)):
+    access = get_property_access(db, property_id, current_user.id)
+    if not access:
         raise HTTPException(status_code=404, detail="Property not found")
+    prop = access.property
     # Only allow users associated with the property
-    if (prop.buyer_id != current_user.id and 
-        prop.buyer_solicitor_id != current_user.id and 
-        prop.seller_solicitor_id != current_user.id and 
-        prop.estate_agent_id != current_user.id and
-        prop.seller_id != current_user.id):
+    if not access.is_participant:
         raise HTTPException(status_code=403, detail="Access denied")
     # Reset all stages
     stages = db.query(PropertyStage).filter(PropertyStage.property_id == property_id).all()
@@ -639,134 +683,98 @@ def reset_property_stages(property_id: int, db: Session = Depends(get_db), curre
     prop.timeline_locked = False
     prop.timeline_approved_by_buyer_solicitor = False
     prop.timeline_approved_by_seller_solicitor = False
-    db.commit()
     return {"message": "Stages reset and timeline unlocked"}
 
 @router.post("/properties/{property_id}/unlock-timeline", response_model=PropertyResponse)
 def unlock_timeline(
     property_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_shard_db)
 ):
     """
     Unlock the timeline for a property. Only the assigned buyer or seller solicitor can perform this action.
     Resets timeline_locked and both approvals to False.
     """
-    property = db.query(Property).filter(Property.id == property_id).first()
-    if not property:
+    access = get_property_access(db, property_id, current_user.id)
+    if not access:
         raise HTTPException(status_code=404, detail="Property not found")
+    property = access.property
 
-    is_buyer_solicitor = current_user.id == property.buyer_solicitor_id
-    is_seller_solicitor = current_user.id == property.seller_solicitor_id
+    is_buyer_solicitor = access.has_role("buyer_solicitor")
+    is_seller_solicitor = access.has_role("seller_solicitor")
     if not (is_buyer_solicitor or is_seller_solicitor):
         raise HTTPException(status_code=403, detail="Only assigned solicitors can unlock the timeline")
 
     property.timeline_locked = False
     property.timeline_approved_by_buyer_solicitor = False
     property.timeline_approved_by_seller_solicitor = False
-    db.commit()
+    db.flush()
     db.refresh(property)
     return property
 
-# --- AI Filter Placeholder ---
+# --- AI Filter ---
 def ai_filter_message(text: str) -> str:
-    openai.api_key = os.getenv('OPENAI_API_KEY')
-    try:
-        # Always rephrase the message
-        rephrase_prompt = f"""Please rephrase the following message to be more professional and appropriate for a property transaction context. \
-        Keep the main points but make it more formal and business-like:\n\n        Original message: {text}\n\n        Rephrased message:"""
-        rephrase_response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a professional real estate communication assistant. Your task is to rephrase messages to be more professional and appropriate for property transactions."},
-                {"role": "user", "content": rephrase_prompt}
-            ],
-            max_tokens=500,
-            temperature=0.7
-        )
-        rephrased_text = rephrase_response.choices[0].message.content.strip()
-
-        # Extract only the actual rephrased message (after the last colon)
-        if ":" in rephrased_text:
-            rephrased_text = rephrased_text.split(":")[-1].strip()
-
-        # Optionally, check moderation on the rephrased text
-        try:
-            rephrased_check = openai.moderations.create(input=rephrased_text)
-            if not rephrased_check.results[0].flagged:
-                return rephrased_text
-            else:
-                return '[Flagged by AI] ' + rephrased_text
-        except Exception as e:
-            print(f"OpenAI moderation error: {e}")
-            return rephrased_text
-
-    except Exception as e:
-        print(f"OpenAI rephrasing error: {e}")
-        return '[AI moderation unavailable] ' + text
+    return moderation_pipeline.provider.filter(text)
 
 # --- Messaging Endpoints ---
 from fastapi import status as http_status
 
 @router.post("/properties/{property_id}/stages/{stage_id}/messages")
-def send_message(property_id: int, stage_id: int, body: dict = Body(...), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def send_message(property_id: int, stage_id: int, body: dict = Body(...), db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     """
-    Buyer or seller sends a message to the other party. Message is AI-filtered and sent for estate agent approval.
+    Buyer or seller sends a message to the other party. The message is stored straight away
+    as 'moderating' and AI-filtered in the background before it reaches the estate agent.
     """
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop:
+    access = get_property_access(db, property_id, current_user.id)
+    if not access:
         raise HTTPException(status_code=404, detail="Property not found")
+    prop = access.property
     # Only buyer or seller can send
-    if current_user.id not in [prop.buyer_id, prop.seller_id]:
+    if not access.has_role("buyer", "seller"):
         raise HTTPException(status_code=403, detail="Only buyer or seller can send messages")
     recipient_id = prop.seller_id if current_user.id == prop.buyer_id else prop.buyer_id
     original_content = body.get('content', '')
-    print(f"[DEBUG] Received message content: '{original_content}' from user {current_user.id}")
-    filtered_content = ai_filter_message(original_content)
     msg = Message(
         sender_id=current_user.id,
         recipient_id=recipient_id,
         property_id=property_id,
         stage_id=stage_id,
-        content=filtered_content,
         original_content=original_content,
-        filtered_content=filtered_content,
-        approval_status='pending',
+        approval_status=MODERATING,
         status='pending'
     )
     db.add(msg)
+    db.flush()
+    # Not visible to anyone else until moderation and approval
+    publish_after_commit(db, property_id, "message.created",
+                         {"message_id": msg.id, "stage_id": stage_id, "approval_status": MODERATING},
+                         audience=[current_user.id])
     db.commit()
     db.refresh(msg)
+    moderation_pipeline.submit(msg.id, original_content)
     return {"message": "Message sent for agent approval", "id": msg.id}
 
 @router.get("/properties/{property_id}/pending-messages")
-def get_pending_messages(property_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_pending_messages(property_id: int, db: Session = Depends(get_read_db), current_user: Principal = Depends(get_current_user)):
     """
     Estate agent fetches all pending messages for this property.
+    Messages still being moderated ('moderating') are not included.
     """
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop or current_user.id != prop.estate_agent_id:
+    access = get_property_access(db, property_id, current_user.id)
+    if not access or not access.has_role("estate_agent"):
         raise HTTPException(status_code=403, detail="Only the estate agent can view pending messages")
-    messages = db.query(Message).filter(Message.property_id == property_id, Message.approval_status == 'pending').all()
-    return [
-        {
-            "id": m.id,
-            "sender_id": m.sender_id,
-            "recipient_id": m.recipient_id,
-            "stage_id": m.stage_id,
-            "original_content": m.original_content,
-            "filtered_content": m.filtered_content,
-            "timestamp": m.timestamp
-        } for m in messages
-    ]
+    return db.query(projection(
+        Message.id, Message.sender_id, Message.recipient_id, Message.stage_id,
+        Message.original_content, Message.filtered_content, Message.timestamp,
+    )).filter(Message.property_id == property_id, Message.approval_status == 'pending').order_by(Message.timestamp).all()
 
 @router.post("/properties/{property_id}/messages/{message_id}/approve")
-def approve_message(property_id: int, message_id: int, body: dict = Body(...), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def approve_message(property_id: int, message_id: int, body: dict = Body(...), db: Session = Depends(get_uow), current_user: Principal = Depends(get_current_user)):
     """
     Estate agent approves either the original or filtered message version.
     """
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop or current_user.id != prop.estate_agent_id:
+    access = get_property_access(db, property_id, current_user.id)
+    if not access or not access.has_role("estate_agent"):
         raise HTTPException(status_code=403, detail="Only the estate agent can approve messages")
     msg = db.query(Message).filter(Message.id == message_id, Message.property_id == property_id).first()
     if not msg or msg.approval_status != 'pending':
@@ -780,23 +788,24 @@ def approve_message(property_id: int, message_id: int, body: dict = Body(...), d
     msg.approval_status = 'approved'
     msg.approved_by = current_user.id
     msg.status = 'approved'
-    db.commit()
+    publish_after_commit(db, property_id, "message.approved", {"message_id": msg.id, "stage_id": msg.stage_id})
     return {"message": "Message approved and delivered", "approved_content": approved_content}
 
 @router.post("/properties/{property_id}/messages/{message_id}/reject")
-def reject_message(property_id: int, message_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def reject_message(property_id: int, message_id: int, db: Session = Depends(get_uow), current_user: Principal = Depends(get_current_user)):
     """
     Estate agent rejects a pending message.
     """
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop or current_user.id != prop.estate_agent_id:
+    access = get_property_access(db, property_id, current_user.id)
+    if not access or not access.has_role("estate_agent"):
         raise HTTPException(status_code=403, detail="Only the estate agent can reject messages")
     msg = db.query(Message).filter(Message.id == message_id, Message.property_id == property_id).first()
     if not msg or msg.approval_status != 'pending':
         raise HTTPException(status_code=404, detail="Message not found or already processed")
     msg.approval_status = 'rejected'
     msg.status = 'rejected'
-    db.commit()
+    publish_after_commit(db, property_id, "message.rejected", {"message_id": msg.id},
+                         audience=[msg.sender_id, current_user.id])
     return {"message": "Message rejected"}
 
 @router.post("/test-openai-moderation")
@@ -813,63 +822,31 @@ def test_openai_moderation(body: dict = Body(...)):
         return {"error": str(e)}
 
 @router.get("/properties/{property_id}/messages")
-def get_all_property_messages(property_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    print("DEBUG: /properties/{property_id}/messages endpoint HIT")
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop:
-        raise HTTPException(status_code=404, detail="Property not found")
-    # Allow estate agent, buyer, or seller to view all messages
-    if current_user.id not in [prop.buyer_id, prop.seller_id, prop.estate_agent_id]:
-        raise HTTPException(status_code=403, detail="Not authorized to view messages for this property")
-    messages = db.query(Message).filter(Message.property_id == property_id).order_by(Message.timestamp).all()
-    buyer_id = prop.buyer_id
-    seller_id = prop.seller_id
-    result = [
-        {
-            "id": m.id,
-            "sender_id": m.sender_id,
-            "recipient_id": m.recipient_id,
-            "property_id": m.property_id,
-            "stage_id": m.stage_id,
-            "content": m.content,
-            "original_content": m.original_content,
-            "filtered_content": m.filtered_content,
-            "approved_content": m.approved_content,
-            "approval_status": m.approval_status,
-            "timestamp": m.timestamp,
-            "status": m.status,
-            "is_buyer_seller_message": (
-                (m.sender_id == buyer_id and m.recipient_id == seller_id) or
-                (m.sender_id == seller_id and m.recipient_id == buyer_id)
-            )
-        } for m in messages
-    ]
-    print("DEBUG: Returning messages:", result)
-    return result
-
-@router.patch("/properties/{property_id}/stages/reorder")
-def reorder_property_stages(
+def get_all_property_messages(
     property_id: int,
-    request: ReorderStagesRequest = Body(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    """
-    Reorder the stages for a property. Only allowed if timeline is not locked and user is a solicitor for the property.
-    Accepts a list of stage IDs in the new order.
-    """
-    prop = db.query(Property).filter(Property.id == property_id).first()
-    if not prop:
+    access = get_property_access(db, property_id, current_user.id)
+    if not access:
         raise HTTPException(status_code=404, detail="Property not found")
-    if prop.timeline_locked:
-        raise HTTPException(status_code=400, detail="Cannot reorder stages when timeline is locked")
-    if not (current_user.id == prop.buyer_solicitor_id or current_user.id == prop.seller_solicitor_id):
-        raise HTTPException(status_code=403, detail="Not authorized to reorder stages for this property")
-    stages = db.query(PropertyStage).filter(PropertyStage.property_id == property_id).all()
-    stage_id_set = set(s.id for s in stages)
-    if set(request.stage_ids) != stage_id_set:
-        raise HTTPException(status_code=400, detail="Stage IDs do not match current stages")
-    for new_order, stage_id in enumerate(request.stage_ids):
-        db.query(PropertyStage).filter(PropertyStage.id == stage_id, PropertyStage.property_id == property_id).update({"order": new_order})
-    db.commit()
-    return {"message": "Stages reordered successfully"} 
\ No newline at end of file
+    prop = access.property
+    # Allow estate agent, buyer, or seller to view all messages
+    if not access.has_role("buyer", "seller", "estate_agent"):
+        raise HTTPException(status_code=403, detail="Not authorized to view messages for this property")
+    query = db.query(projection(
+        Message.id, Message.sender_id, Message.recipient_id, Message.property_id, Message.stage_id,
+        Message.content, Message.original_content, Message.filtered_content, Message.approved_content,
+        Message.approval_status, Message.timestamp, Message.status,
+    )).filter(Message.property_id == property_id)
+    if page.paginated:
+        messages, next_cursor = paginate(query, page, Message.id, Message.timestamp)
+    else:
+        messages = query.order_by(Message.timestamp).all()
+    buyer_seller = {(prop.buyer_id, prop.seller_id), (prop.seller_id, prop.buyer_id)}
+    for m in messages:
+        m["is_buyer_seller_message"] = (m["sender_id"], m["recipient_id"]) in buyer_seller
+    if page.paginated:
+        return {"items": messages, "next_cursor": next_cursor}
+    return messages
@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
 from app.models.stage_info import StageInfo
 from pydantic import BaseModel
 from typing import Optional
@@ -19,17 +22,17 @@ class StageInfoResponse(BaseModel):
 @router.post("/generateStageInfo", response_model=StageInfoResponse)
 async def generate_stage_info(
     request: StageInfoRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Validate role
     if request.role not in ['buyer', 'seller']:
         raise HTTPException(status_code=403, detail="Only buyers and sellers can access stage information")
 
     # Check cache first
-    cached_info = db.query(StageInfo).filter(
+    cached_info = (await db.execute(select(StageInfo).where(
         StageInfo.stage == request.stage,
         StageInfo.role == request.role
-    ).first()
+    ))).scalars().first()
 
     if cached_info:
         return StageInfoResponse(explanation=cached_info.explanation)
@@ -43,7 +46,8 @@ async def generate_stage_info(
 Focus ONLY on the immediate actions and responsibilities of this specific stage. Do not mention what happens before or after this stage.
 Keep the explanation under 100 words and make it clear what the {request.role} needs to do right now. Additionally, provide a rough estimate of how long this stage typically takes in a usual process (e.g., 'This stage typically takes around 2-3 weeks')."""
         
-        response = openai.ChatCompletion.create(
+        response = await run_in_threadpool(
+            openai.ChatCompletion.create,
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant explaining UK property purchase stages. Your explanations should be focused, specific, and only cover the current stage."},
@@ -61,8 +65,11 @@ Keep the explanation under 100 words and make it clear what the {request.role} n
             explanation=explanation
         )
         db.add(new_stage_info)
-        db.commit()
-        db.refresh(new_stage_info)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # A concurrent request cached this stage/role first
+            await db.rollback()
 
         return StageInfoResponse(explanation=explanation)
 
@@ -70,7 +77,7 @@ Keep the explanation under 100 words and make it clear what the {request.role} n
         raise HTTPException(status_code=500, detail=f"Failed to generate stage information: {str(e)}")
 
 @router.get("/api/stage-info", response_model=StageInfoResponse)
-async def get_stage_info(stage: str, role: str, db: Session = Depends(get_db)):
+async def get_stage_info(stage: str, role: str, db: AsyncSession = Depends(get_async_db)):
     # Validate role
     if role not in ['buyer', 'seller']:
         raise HTTPException(status_code=403, detail="Only buyers and sellers can access stage information")
@@ -78,7 +85,8 @@ async def get_stage_info(stage: str, role: str, db: Session = Depends(get_db)):
     try:
         client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
         prompt = f"Explain in simple terms what typically happens during the '{stage}' stage of a UK house purchase, from the perspective of a {role}. Keep it under 100 words."
-        response = client.chat.completions.create(
+        response = await run_in_threadpool(
+            client.chat.completions.create,
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant explaining UK property purchase stages."},
@@ -89,15 +97,18 @@ async def get_stage_info(stage: str, role: str, db: Session = Depends(get_db)):
         explanation = response.choices[0].message.content.strip()
 
         # Overwrite or create the explanation in the database
-        cached_info = db.query(StageInfo).filter(
+        cached_info = (await db.execute(select(StageInfo).where(
             StageInfo.stage == stage,
             StageInfo.role == role
-        ).first()
+        ))).scalars().first()
         if cached_info:
             cached_info.explanation = explanation
         else:
             db.add(StageInfo(stage=stage, role=role, explanation=explanation))
-        db.commit()
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
 
         return StageInfoResponse(explanation=explanation)
     except Exception as e:
@@ -1,33 +1,52 @@
-from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, Form, status, Body
-from fastapi.responses import FileResponse, StreamingResponse
-import shutil
-import os
-from typing import Optional
-from app.core.security import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from typing import Optional, Union
+from app.core.security import Principal, get_current_user
 from app.models.file import File as FileModel, ReviewStatus, DocumentType
 from app.schemas.file import FileResponse, FileNotesUpdate, FileReviewUpdate, FileExpiryUpdate
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.core.read_routing import get_async_read_db
 import mimetypes
-from app.models.user import User
-from app.models.property import Property
+from app.core.access import get_property_access_async
+from app.core.pagination import Page, PageParams, page_params, paginate_async
+from app.services.ingest import receive_upload
+from app.services.blobs import blob_store, release_file_async
+from app.core.signed_urls import sign_download, verify_download
 
 router = APIRouter()
 
-UPLOAD_DIR = "app/uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+UPLOAD_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file", "document_type"],
+            "properties": {
+                "file": {"type": "string", "format": "binary"},
+                "document_type": {"type": "string"},
+                "property_id": {"type": "integer"},
+                "description": {"type": "string"},
+            },
+        }}},
+    }
+}
 
-@router.post("/upload", response_model=FileResponse)
+# The body is read by the ingest service rather than FastAPI's form parsing,
+# so the file is streamed to disk once instead of being spooled and copied
+@router.post("/upload", response_model=FileResponse, openapi_extra=UPLOAD_FORM)
 async def upload_file(
-    file: UploadFile = File(...),
-    description: Optional[str] = Form(None),
-    property_id: Optional[int] = Form(None),
-    document_type: str = Form(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    file_location = None  # Initialize file_location at the start
+    form = await receive_upload(request, blob_store.incoming)
+    upload = form.file
     try:
+        document_type = form.fields.get("document_type")
+        if not document_type:
+            raise HTTPException(status_code=422, detail="document_type is required")
         # Convert document_type to enum
         try:
             doc_type = DocumentType[document_type.upper()]
@@ -36,255 +55,230 @@ async def upload_file(
                 status_code=400,
                 detail=f"Invalid document type. Must be one of: {', '.join([dt.name for dt in DocumentType])}"
             )
+        try:
+            property_id = int(form.fields["property_id"]) if form.fields.get("property_id") else None
+        except ValueError:
+            raise HTTPException(status_code=422, detail="property_id must be an integer")
 
         # Check property access if property_id is provided
         if property_id is not None:
-            prop = db.query(Property).filter(Property.id == property_id).first()
-            if not prop:
+            access = await get_property_access_async(db, property_id, current_user.id)
+            if not access:
                 raise HTTPException(
                     status_code=404,
                     detail="Property not found"
                 )
-            # Compare user IDs instead of User objects
-            if (prop.buyer_id != current_user.id and 
-                prop.buyer_solicitor_id != current_user.id and 
-                prop.seller_solicitor_id != current_user.id and 
-                prop.estate_agent_id != current_user.id and
-                prop.seller_id != current_user.id):
+            if not access.is_participant:
                 raise HTTPException(
                     status_code=403,
                     detail="Not authorized for this property"
                 )
 
         # Create a safe filename
-        safe_filename = file.filename.replace(" ", "_")
-        file_location = os.path.join(UPLOAD_DIR, safe_filename)
-        print(f"Saving file to: {file_location}")  # Debug print
-
-        # Save the file
-        try:
-            with open(file_location, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-        except Exception as e:
-            if file_location and os.path.exists(file_location):
-                os.remove(file_location)
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to save file: {str(e)}"
-            )
-
-        # Get file metadata
-        try:
-            file_size = os.path.getsize(file_location)
-            file_type = mimetypes.guess_type(file.filename)[0] or "application/octet-stream"
-        except Exception as e:
-            if file_location and os.path.exists(file_location):
-                os.remove(file_location)
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to get file metadata: {str(e)}"
-            )
+        safe_filename = upload.filename.replace(" ", "_")
 
         # Create file record in database
         try:
+            # Stored by content, so same-named uploads can't overwrite each other
+            file_location = await blob_store.add_async(db, upload)
             db_file = FileModel(
                 filename=safe_filename,
                 file_path=file_location,
-                file_type=file_type,
-                file_size=file_size,
+                file_type=upload.content_type,
+                file_size=upload.size,
+                sha256=upload.sha256,
                 uploaded_by=current_user.id,
                 property_id=property_id,
-                description=description,
+                description=form.fields.get("description"),
                 document_type=doc_type,
                 review_status=ReviewStatus.PENDING
             )
             db.add(db_file)
-            db.commit()
-            db.refresh(db_file)
+            await db.commit()
+            await db.refresh(db_file)
             return db_file
         except Exception as e:
-            if file_location and os.path.exists(file_location):
-                os.remove(file_location)
+            # The blob's reference rolls back with the row; the collector reclaims the file
+            await db.rollback()
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to create file record: {str(e)}"
             )
 
     except HTTPException:
-        if file_location and os.path.exists(file_location):
-            os.remove(file_location)
         raise
     except Exception as e:
-        if file_location and os.path.exists(file_location):
-            os.remove(file_location)
         raise HTTPException(
             status_code=500,
             detail=f"Unexpected error: {str(e)}"
         )
+    finally:
+        # No-op once saved; otherwise drops the staged temp file
+        await run_in_threadpool(upload.discard)
 
-@router.get("/files", response_model=list[FileResponse])
+@router.get("/files", response_model=Union[Page[FileResponse], list[FileResponse]])
 async def get_files(
     property_id: Optional[int] = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    page: PageParams = Depends(page_params),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    print(f"[DEBUG] user.id={current_user.id}, property_id={property_id}")
-    query = db.query(FileModel)
+    query = select(FileModel)
     
     if property_id is not None:
-        prop = db.query(Property).filter(Property.id == property_id).first()
-        print(f"[DEBUG] property found: {prop is not None}, buyer_id={getattr(prop, 'buyer_id', None)}, buyer_solicitor_id={getattr(prop, 'buyer_solicitor_id', None)}, seller_solicitor_id={getattr(prop, 'seller_solicitor_id', None)}, estate_agent_id={getattr(prop, 'estate_agent_id', None)}")
-        if not prop:
+        access = await get_property_access_async(db, property_id, current_user.id)
+        if not access:
             raise HTTPException(status_code=404, detail="Property not found")
-        if (prop.buyer_id != current_user.id and 
-            prop.buyer_solicitor_id != current_user.id and 
-            prop.seller_solicitor_id != current_user.id and 
-            prop.estate_agent_id != current_user.id and
-            prop.seller_id != current_user.id):
-            print("[DEBUG] Not authorized for this property")
+        if not access.is_participant:
             raise HTTPException(status_code=403, detail="Not authorized for this property")
-        query = query.filter(FileModel.property_id == property_id)
+        query = query.where(FileModel.property_id == property_id)
     
-    files = query.all()
-    print(f"[DEBUG] Returning {len(files)} files")
-    response = files
-    return response
+    if page.paginated:
+        files, next_cursor = await paginate_async(db, query, page, FileModel.id)
+        return {"items": files, "next_cursor": next_cursor}
+
+    return (await db.execute(query)).scalars().all()
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "http://localhost:5173",
+    "Access-Control-Allow-Methods": "GET, OPTIONS",
+    "Access-Control-Allow-Headers": "Authorization, Content-Type",
+    "Access-Control-Allow-Credentials": "true",
+}
+
+
+def _media_type(file: FileModel) -> str:
+    return file.file_type or mimetypes.guess_type(file.filename)[0] or "application/octet-stream"
+
+
+def _content_hash(file: FileModel) -> Optional[str]:
+    # Only blobs are known to hold exactly the hashed bytes
+    return file.sha256 if blob_store.owns(file.file_path) else None
+
 
 @router.get("/files/{file_id}", response_model=FileResponse)
 async def get_file(
     file_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    file = db.query(FileModel).filter(FileModel.id == file_id).first()
+    file = await db.get(FileModel, file_id)
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
     
     if file.property_id:
-        prop = db.query(Property).filter(Property.id == file.property_id).first()
-        if not prop:
+        access = await get_property_access_async(db, file.property_id, current_user.id)
+        if not access:
             raise HTTPException(status_code=404, detail="Property not found")
-        if (prop.buyer_id != current_user.id and 
-            prop.buyer_solicitor_id != current_user.id and 
-            prop.seller_solicitor_id != current_user.id and 
-            prop.estate_agent_id != current_user.id and
-            prop.seller_id != current_user.id):
+        if not access.is_participant:
             raise HTTPException(status_code=403, detail="Not authorized for this property")
     
-    return file
+    # Access is checked here, once; the link itself needs no lookups to serve
+    token = sign_download(file.file_path, file.filename, _media_type(file), _content_hash(file))
+    return FileResponse.model_validate(file).model_copy(
+        update={"download_url": str(request.url_for("download_signed", token=token))}
+    )
 
 @router.get("/files/{file_id}/download")
 async def download_file(
     file_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    file = db.query(FileModel).filter(FileModel.id == file_id).first()
-    if not file or not os.path.exists(file.file_path):
+    file = await db.get(FileModel, file_id)
+    if not file or not file.file_path:
         raise HTTPException(status_code=404, detail="File not found")
     
     if file.property_id:
-        prop = db.query(Property).filter(Property.id == file.property_id).first()
-        if not prop:
+        access = await get_property_access_async(db, file.property_id, current_user.id)
+        if not access:
             raise HTTPException(status_code=404, detail="Property not found")
-        if (prop.buyer_id != current_user.id and 
-            prop.buyer_solicitor_id != current_user.id and 
-            prop.seller_solicitor_id != current_user.id and 
-            prop.estate_agent_id != current_user.id and
-            prop.seller_id != current_user.id):
+        if not access.is_participant:
             raise HTTPException(status_code=403, detail="Not authorized for this property")
     
-    def iterfile():
-        with open(file.file_path, mode="rb") as f:
-            yield from f
-    
-    media_type = file.file_type or mimetypes.guess_type(file.filename)[0] or "application/octet-stream"
-    response = StreamingResponse(iterfile(), media_type=media_type)
-    response.headers["Content-Disposition"] = f'attachment; filename="{file.filename}"'
-    response.headers["Access-Control-Allow-Origin"] = "http://localhost:5173"
-    response.headers["Access-Control-Allow-Methods"] = "GET, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Authorization, Content-Type"
-    response.headers["Access-Control-Allow-Credentials"] = "true"
-    return response
+    # Supports Range (206) and If-None-Match / If-Modified-Since (304)
+    return await blob_store.download(
+        request, file.file_path, filename=file.filename, media_type=_media_type(file),
+        content_hash=_content_hash(file), headers=CORS_HEADERS,
+    )
+
+@router.get("/downloads/{token}", name="download_signed")
+async def download_signed(token: str, request: Request):
+    """Serve a link minted by get_file. The signature stands in for auth, so no database access."""
+    grant = verify_download(token)
+    return await blob_store.download(
+        request, grant.location, filename=grant.filename, media_type=grant.media_type,
+        content_hash=grant.content_hash, headers=CORS_HEADERS,
+    )
 
 @router.delete("/files/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_file(
     file_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = current_user  # current_user is already a User object
-    file = db.query(FileModel).filter(FileModel.id == file_id).first()
+    file = await db.get(FileModel, file_id)
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
-    prop = db.query(Property).filter(Property.id == file.property_id).first()
-    if not prop or (prop.buyer_id != user.id and 
-                   prop.buyer_solicitor_id != user.id and 
-                   prop.seller_solicitor_id != user.id and 
-                   prop.estate_agent_id != user.id and
-                   prop.seller_id != user.id):
+    access = await get_property_access_async(db, file.property_id, current_user.id) if file.property_id else None
+    if not access or not access.is_participant:
         raise HTTPException(status_code=403, detail="Not authorized for this property")
-    if os.path.exists(file.file_path):
-        os.remove(file.file_path)
-    db.delete(file)
-    db.commit()
+    await release_file_async(db, file)
+    await db.delete(file)
+    await db.commit()
     return
 
 @router.patch("/files/{file_id}/notes", response_model=FileResponse)
 async def update_file_notes(
     file_id: int,
     notes_update: FileNotesUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = current_user  # current_user is already a User object
-    file = db.query(FileModel).filter(FileModel.id == file_id).first()
+    file = await db.get(FileModel, file_id)
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
-    prop = db.query(Property).filter(Property.id == file.property_id).first()
-    if not prop or (prop.buyer_id != user.id and 
-                   prop.buyer_solicitor_id != user.id and 
-                   prop.seller_solicitor_id != user.id and 
-                   prop.estate_agent_id != user.id and
-                   prop.seller_id != user.id):
+    access = await get_property_access_async(db, file.property_id, current_user.id) if file.property_id else None
+    if not access or not access.is_participant:
         raise HTTPException(status_code=403, detail="Not authorized for this property")
     file.notes = notes_update.notes
-    db.commit()
-    db.refresh(file)
+    await db.commit()
+    await db.refresh(file)
     return file
 
 @router.patch("/files/{file_id}/review", response_model=FileResponse)
 async def update_file_review(
     file_id: int,
     review_update: FileReviewUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Get the file
-    file = db.query(FileModel).filter(FileModel.id == file_id).first()
+    file = await db.get(FileModel, file_id)
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
     
     # Check if user is a solicitor for this property
     if file.property_id:
-        prop = db.query(Property).filter(Property.id == file.property_id).first()
-        if not prop:
+        access = await get_property_access_async(db, file.property_id, current_user.id)
+        if not access:
             raise HTTPException(status_code=404, detail="Property not found")
-        if prop.buyer_solicitor_id != current_user.id and prop.seller_solicitor_id != current_user.id:
+        if not access.has_role("buyer_solicitor", "seller_solicitor"):
             raise HTTPException(status_code=403, detail="Only the property's solicitor can review documents")
     
     # Update review status
     file.review_status = review_update.review_status
-    db.commit()
-    db.refresh(file)
+    await db.commit()
+    await db.refresh(file)
     
     # If denied, delete the file
     if review_update.review_status == ReviewStatus.DENIED:
         try:
-            if os.path.exists(file.file_path):
-                os.remove(file.file_path)
-            db.delete(file)
-            db.commit()
+            await release_file_async(db, file)
+            await db.delete(file)
+            await db.commit()
         except Exception as e:
             raise HTTPException(
                 status_code=500,
@@ -297,25 +291,19 @@ async def update_file_review(
 async def update_file_expiry(
     file_id: int,
     expiry_update: FileExpiryUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    print(f"[DEBUG] Received expires_at: {expiry_update.expires_at}")
-    file = db.query(FileModel).filter(FileModel.id == file_id).first()
+    file = await db.get(FileModel, file_id)
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
     if file.property_id:
-        prop = db.query(Property).filter(Property.id == file.property_id).first()
-        if not prop:
+        access = await get_property_access_async(db, file.property_id, current_user.id)
+        if not access:
             raise HTTPException(status_code=404, detail="Property not found")
-        if (prop.buyer_id != current_user.id and \
-            prop.buyer_solicitor_id != current_user.id and \
-            prop.seller_solicitor_id != current_user.id and \
-            prop.estate_agent_id != current_user.id and \
-            prop.seller_id != current_user.id):
+        if not access.is_participant:
             raise HTTPException(status_code=403, detail="Not authorized for this property")
     file.expires_at = expiry_update.expires_at
-    db.commit()
-    db.refresh(file)
-    print(f"[DEBUG] Saved expires_at in DB: {file.expires_at}")
+    await db.commit()
+    await db.refresh(file)
     return file 
\ No newline at end of file
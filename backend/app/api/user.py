@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.models.user import User
+from app.core.pagination import PageParams, page_params, paginate
+from app.core.projection import projection
 from typing import Optional
 
 router = APIRouter()
@@ -20,18 +22,16 @@ def get_user(user_id: int, db: Session = Depends(get_db)):
     }
 
 @router.get('/users')
-def get_users(role: Optional[str] = None, db: Session = Depends(get_db)):
-    query = db.query(User)
+def get_users(role: Optional[str] = None, page: PageParams = Depends(page_params), db: Session = Depends(get_db)):
+    query = db.query(projection(User.id, User.first_name, User.last_name, User.email, User.role))
     if role:
         query = query.filter(User.role == role.upper())
-    users = query.all()
-    return [
-        {
-            'id': user.id,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'email': user.email,
-            'role': user.role.value if hasattr(user.role, 'value') else str(user.role)
-        }
-        for user in users
-    ] 
\ No newline at end of file
+    if page.paginated:
+        users, next_cursor = paginate(query, page, User.id)
+    else:
+        users = query.all()
+    for user in users:
+        user['role'] = user['role'].value if hasattr(user['role'], 'value') else str(user['role'])
+    if page.paginated:
+        return {'items': users, 'next_cursor': next_cursor}
+    return users
@@ -0,0 +1,86 @@
+from dataclasses import dataclass
+from typing import FrozenSet, Optional
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.database import get_db
+from app.core.read_routing import get_read_db
+from app.core.security import get_current_user
+from app.core.sharding import shard_router
+from app.models.property import Property, PropertyParticipant
+
+
+@dataclass
+class PropertyAccess:
+    """A property together with the roles the caller holds on it (empty if none)."""
+    property: Property
+    roles: FrozenSet[str]
+
+    @property
+    def is_participant(self) -> bool:
+        return bool(self.roles)
+
+    def has_role(self, *roles: str) -> bool:
+        return not self.roles.isdisjoint(roles)
+
+
+def _access_query(property_id: int, user_id: int):
+    # One indexed lookup: the property by primary key, outer-joined to the
+    # caller's membership rows on the (property_id, user_id, role) key
+    return (
+        select(Property, PropertyParticipant.role)
+        .outerjoin(PropertyParticipant, and_(
+            PropertyParticipant.property_id == Property.id,
+            PropertyParticipant.user_id == user_id,
+        ))
+        .where(Property.id == property_id)
+    )
+
+
+def _to_access(rows) -> Optional[PropertyAccess]:
+    if not rows:
+        return None
+    return PropertyAccess(property=rows[0][0], roles=frozenset(role for _, role in rows if role))
+
+
+def get_property_access(db: Session, property_id: int, user_id: int) -> Optional[PropertyAccess]:
+    """Load a property and the user's roles on it. Returns None if the property doesn't exist.
+
+    Works from any session: with shards configured, a catalog session reads the
+    property from its shard (and the property comes back detached).
+    """
+    with shard_router.reading(db, property_id) as shard_db:
+        if shard_db is None:
+            return None
+        return _to_access(shard_db.execute(_access_query(property_id, user_id)).all())
+
+
+async def get_property_access_async(db: AsyncSession, property_id: int, user_id: int) -> Optional[PropertyAccess]:
+    async with shard_router.reading_async(db, property_id) as shard_db:
+        if shard_db is None:
+            return None
+        return _to_access((await shard_db.execute(_access_query(property_id, user_id))).all())
+
+
+def property_participant(
+    property_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+) -> PropertyAccess:
+    """Dependency: the property, if the caller is one of its participants."""
+    access = get_property_access(db, property_id, current_user.id)
+    if access is None or not access.is_participant:
+        raise HTTPException(status_code=404, detail="Property not found or access denied")
+    return access
+
+
+def property_reader(
+    property_id: int,
+    db: Session = Depends(get_read_db),
+    current_user=Depends(get_current_user),
+) -> PropertyAccess:
+    """Like `property_participant`, but on the request's read session, for GET handlers."""
+    return property_participant(property_id, db, current_user)
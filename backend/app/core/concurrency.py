@@ -0,0 +1,62 @@
+"""Optimistic concurrency for properties and stages.
+
+`Property` and `PropertyStage` carry a `version` column that the ORM uses as
+its version_id_col: every UPDATE it flushes is `... WHERE id = ? AND version
+= <version loaded>` and increments the version. If another request changed
+the row in between, no row matches, SQLAlchemy raises StaleDataError, the
+unit of work rolls back, and `conflict_handler` answers 409. Nothing holds a
+lock while the handler runs; the check costs nothing extra in the UPDATE.
+Bulk rank rewrites (reorder, the background rebalance) bypass the ORM, so
+`apply_order` bumps the stage versions itself.
+
+The version is also the resource's ETag. The PATCH endpoints take an
+optional `If-Match`: if the client's copy is no longer current they answer
+412 before changing anything. Without the header, a request still gets the
+409 if its own read races with another write.
+"""
+from typing import Optional
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import inspect, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def set_etag(response: Response, obj) -> None:
+    response.headers["ETag"] = etag(obj.version)
+
+
+def check_if_match(if_match: Optional[str], obj) -> None:
+    """412 unless `if_match` is absent, '*', or names `obj`'s current version."""
+    if if_match is None:
+        return
+    tags = {tag.strip().removeprefix("W/") for tag in if_match.split(",")}
+    if "*" not in tags and etag(obj.version) not in tags:
+        raise HTTPException(status_code=412, detail="This has changed since you loaded it; reload and try again")
+
+
+def claim_version(db: Session, obj) -> None:
+    """Bump `obj`'s version for a change the ORM doesn't see (e.g. a bulk UPDATE of its stages).
+
+    Conditional on the loaded version, like the ORM's own UPDATEs: raises
+    StaleDataError if someone else got there first.
+    """
+    table = inspect(obj).mapper.local_table
+    claimed = db.execute(
+        update(table).where(table.c.id == obj.id, table.c.version == obj.version).values(version=obj.version + 1)
+    ).rowcount
+    if claimed != 1:
+        raise StaleDataError(f"{table.name} {obj.id} was changed by another request")
+    db.expire(obj, ["version"])
+
+
+async def conflict_handler(request: Request, exc: StaleDataError) -> JSONResponse:
+    return JSONResponse(
+        status_code=409,
+        content={"detail": "Someone else changed this at the same time; reload and try again"},
+    )
@@ -6,18 +6,80 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 class Settings(BaseSettings):
-    # Database settings
-    DATABASE_URL: str = "sqlite:////Users/athee/Documents/Individual BEng/individual-beng/backend/app.db"
+    # Database settings: any SQLAlchemy URL; sqlite and postgresql get tuned profiles (app/core/database.py)
+    DATABASE_URL: str = "sqlite:///" + os.path.join(BACKEND_DIR, "app.db")
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # wait this long for a lock instead of failing with "database is locked"
+    SQLITE_CACHE_SIZE_KIB: int = 64 * 1024  # page cache per connection
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # bytes of the file read through mmap
+    DB_POOL_SIZE: int = 10  # Postgres connections kept open per process
+    DB_MAX_OVERFLOW: int = 20  # extra connections allowed under burst load
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_STATEMENT_CACHE_SIZE: int = 500  # compiled SQL (SQLAlchemy) and prepared statements (asyncpg)
+    # Optional read-only engine for GET handlers: a Postgres replica, or an SQLite URL (opened read-only)
+    READ_REPLICA_URL: str = ""
+    READ_YOUR_WRITES_SECONDS: float = 5.0  # after a write, the user's reads go to the primary for this long
+    # Comma-separated database URLs to spread properties over (app/core/sharding.py); empty keeps
+    # everything in DATABASE_URL, which stays the catalog for users and other shared tables either way
+    SHARD_URLS: str = ""
+    SHARD_KEY: str = "firm"  # place properties by the estate agent's company ("firm") or by "property" id
+
+    # Per-request SQL timing (app/core/sql_timing.py)
+    SLOW_QUERY_THRESHOLD_MS: float = 100.0
+    SLOW_QUERY_LOG_FILE: str = os.path.join(BACKEND_DIR, "logs", "slow_queries.log")  # empty to disable the file
+    SLOW_QUERY_LOG_MAX_BYTES: int = 5 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUPS: int = 5
     
     # JWT settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    AUTH_CACHE_MAXSIZE: int = 1024  # cached token -> principal entries
+    AUTH_CACHE_TTL_SECONDS: int = 60
     
     # OpenAI settings
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
-    
+
+    # Message moderation settings
+    MODERATION_PROVIDER: str = "openai"  # 'openai' or 'stub' (offline, for tests/benchmarks)
+    MODERATION_WORKERS: int = 4
+    MODERATION_MAX_PENDING: int = 100
+
+    # Realtime events (WebSocket)
+    EVENTS_BACKEND: str = "memory"  # 'memory' (single worker) or 'redis' (shared between workers)
+    EVENTS_REDIS_URL: str = "redis://localhost:6379/0"
+    EVENTS_REPLAY_SIZE: int = 256  # buffered events per property for resume
+    EVENTS_QUEUE_SIZE: int = 100  # undelivered events before a slow client is dropped
+    EVENTS_OUTBOX_SIZE: int = 10000  # events waiting to be sent to Redis before new ones are dropped
+
+    # Notification fan-out: bursts of the same notification (e.g. several uploads) become one per recipient
+    NOTIFICATION_COALESCE_SECONDS: float = 60  # longest a burst is held
+    NOTIFICATION_QUIET_SECONDS: float = 10  # a burst's held repeats are sent once this long passes without another
+    NOTIFICATION_BATCH_SIZE: int = 500  # queued notifications written per INSERT
+    NOTIFICATION_RETENTION_DAYS: int = 90  # read notifications older than this are archived
+    NOTIFICATION_ARCHIVE_BATCH_SIZE: int = 500  # rows moved per (short) transaction
+    NOTIFICATION_ARCHIVE_INTERVAL_SECONDS: int = 3600
+
+    # Batched backfills (app/services/backfills.py)
+    BACKFILL_BATCH_SIZE: int = 500  # rows per (short) transaction
+    BACKFILL_PAUSE_SECONDS: float = 0.05  # between batches, so other writers get the lock
+
+    # Uploads
+    UPLOAD_MAX_BYTES: int = 25 * 1024 * 1024  # default cap; some document types have their own
+    BLOB_STORE_DIR: str = os.path.join(BACKEND_DIR, "app", "uploads", "blobs")  # content-addressed document store
+    BLOB_GC_INTERVAL_SECONDS: int = 3600
+    BLOB_GC_GRACE_SECONDS: int = 3600  # unreferenced blobs and stray files younger than this are kept
+
+    # Blob storage: 'local', 'accel' (nginx X-Accel-Redirect), 'sendfile' (X-Sendfile) or 's3' (needs boto3)
+    STORAGE_BACKEND: str = "local"
+    STORAGE_OFFLOAD_PREFIX: str = "/protected/"  # nginx internal location aliased to BLOB_STORE_DIR
+    S3_BUCKET: str = ""
+    S3_PREFIX: str = "blobs/"
+    S3_ENDPOINT_URL: str = ""  # e.g. http://localhost:9000 for MinIO
+    DOWNLOAD_URL_TTL_SECONDS: int = 300  # lifetime of signed download links
+
     class Config:
         env_file = ".env"
         extra = "ignore"
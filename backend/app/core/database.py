@@ -1,22 +1,248 @@
-from sqlalchemy import create_engine
+"""Engines and sessions, configured from settings.DATABASE_URL.
+
+`create_db_engine` tunes each backend for this app's load, many small
+reads with occasional writes:
+
+- SQLite: WAL journal (readers don't block the writer or each other),
+  synchronous=NORMAL (no fsync per commit in WAL mode; still crash-safe),
+  a busy timeout instead of immediate "database is locked" errors, and a
+  larger page cache and mmap window. Applied to every new connection.
+- PostgreSQL: a bounded connection pool with pre-ping and recycling, and
+  statement caching (SQLAlchemy's compiled cache; prepared statements on
+  asyncpg).
+
+The async engine uses the matching async driver (aiosqlite / asyncpg).
+
+With READ_REPLICA_URL set, `ReadSessionLocal` / `AsyncReadSessionLocal` use
+a second, read-only engine: a Postgres replica, or the SQLite file opened
+through a `mode=ro` URI. Without it they use the primary. Either way their
+sessions refuse to flush or run INSERT/UPDATE/DELETE (ReadOnlySessionError),
+so an endpoint can't write through one by mistake. Which requests use them
+is decided in app/core/read_routing.py.
+"""
+import logging
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
 
-SQLALCHEMY_DATABASE_URL = "sqlite:////Users/athee/Documents/Individual BEng/individual-beng/backend/app.db"
+from app.core.config import settings
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def sqlite_pragmas(read_only: bool = False) -> dict:
+    pragmas = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KIB,  # negative means KiB rather than pages
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+    }
+    if read_only:
+        # The journal mode is the primary's to set; a read-only connection can't change it
+        del pragmas["journal_mode"], pragmas["synchronous"]
+        pragmas["query_only"] = 1
+    return pragmas
+
+
+def read_only_url(url: str) -> str:
+    """`url` opened read-only: SQLite files through a mode=ro URI, anything else unchanged."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or not parsed.database or parsed.query.get("uri"):
+        return url
+    return f"{parsed.drivername}:///file:{parsed.database}?mode=ro&uri=true"
+
+
+def async_url(url: str) -> str:
+    """The same database, through its async driver."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}' databases")
+    parsed = parsed.set(drivername=ASYNC_DRIVERS[backend])
+    if backend == "postgresql":
+        parsed = parsed.update_query_dict({"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)})
+    return parsed.render_as_string(hide_password=False)
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """Keyword arguments for create_engine / create_async_engine for `url`'s backend."""
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        options = {"connect_args": {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}}
+        if is_async:
+            # SQLite connections are cheap to open, and NullPool stops a pooled connection
+            # being handed to a different event loop than the one that created it
+            options["poolclass"] = NullPool
+        return options
+    if backend == "postgresql":
+        return {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_pre_ping": True,
+            "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+            "query_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        }
+    return {}
+
+
+def _sqlite_pragma_setter(read_only: bool):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in sqlite_pragmas(read_only).items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+def create_db_engine(url: str, is_async: bool = False, read_only: bool = False):
+    if read_only:
+        url = read_only_url(url)
+    if is_async:
+        engine = create_async_engine(async_url(url), **engine_options(url, is_async=True))
+        sync_engine = engine.sync_engine
+    else:
+        engine = sync_engine = create_engine(url, **engine_options(url))
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _sqlite_pragma_setter(read_only))
+    return engine
+
+
+def engine_profile(engine) -> dict:
+    """The settings an engine actually runs with, for the startup log."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    profile = {"url": sync_engine.url.render_as_string(hide_password=True), "pool": type(sync_engine.pool).__name__}
+    if sync_engine.dialect.name == "sqlite":
+        with sync_engine.connect() as conn:
+            for name in sqlite_pragmas():
+                profile[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+    else:
+        profile.update(engine_options(str(sync_engine.url)))
+    return profile
+
+
+def log_engine_profile():
+    logger.info("Database engine: %s", engine_profile(engine))
+
+
+engine = create_db_engine(settings.DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for `async def` routes so queries don't block the event loop.
+async_engine = create_db_engine(settings.DATABASE_URL, is_async=True)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+# Read-only sessions, on the replica if there is one
+if settings.READ_REPLICA_URL:
+    read_engine = create_db_engine(settings.READ_REPLICA_URL, read_only=True)
+    async_read_engine = create_db_engine(settings.READ_REPLICA_URL, is_async=True, read_only=True)
+else:
+    read_engine, async_read_engine = engine, async_engine
+
+_READ_ONLY = "read_only"
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine, info={_READ_ONLY: True})
+
+AsyncReadSessionLocal = async_sessionmaker(
+    bind=async_read_engine, autoflush=False, expire_on_commit=False, info={_READ_ONLY: True}
+)
+
+
+class ReadOnlySessionError(RuntimeError):
+    """A write was attempted through a read session."""
+
+
+@event.listens_for(Session, "before_flush")
+def _refuse_read_session_flush(session, flush_context, instances):
+    if session.info.get(_READ_ONLY) and (
+        session.new or session.deleted or any(session.is_modified(obj) for obj in session.dirty)
+    ):
+        raise ReadOnlySessionError("Read sessions can't write; use get_db for endpoints that change data")
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _refuse_read_session_dml(orm_execute_state):
+    if orm_execute_state.session.info.get(_READ_ONLY) and (
+        orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete
+    ):
+        raise ReadOnlySessionError("Read sessions can't write; use get_db for endpoints that change data")
+
 
 Base = declarative_base()
 
+_REQUEST_SESSION = "request"
+
+
+class CommitCounter:
+    """Commits made by request sessions (get_db, get_uow, get_async_db), for tests to assert on."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def increment(self):
+        with self._lock:
+            self.count += 1
+
+
+request_commits = CommitCounter()
+
+
+@event.listens_for(Session, "after_commit")
+def _count_request_commit(session):
+    if session.info.get(_REQUEST_SESSION):
+        request_commits.increment()
+
+
 # Dependency
 def get_db():
-    db = SessionLocal()
+    db = SessionLocal(info={_REQUEST_SESSION: True})
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_uow():
+    """Unit of work for a request that writes.
+
+    Handlers only flush; the session is committed once, after the handler
+    returns and before the response is sent, so the request's writes land
+    in one transaction (one write lock and, on SQLite, one fsync). Any error
+    rolls everything back. After-commit hooks (events, notifications) fire
+    on that commit.
+    """
+    db = SessionLocal(info={_REQUEST_SESSION: True})
     try:
         yield db
+        if db.in_transaction():
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
+
+# Async dependency
+async def get_async_db():
+    async with AsyncSessionLocal(info={_REQUEST_SESSION: True}) as db:
+        yield db
+
+def dialect_insert(db, model):
+    """INSERT construct for the session's dialect, so callers can use on_conflict_do_*."""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
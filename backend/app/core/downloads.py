@@ -0,0 +1,157 @@
+"""File download responses with byte ranges and revalidation.
+
+`document_response` answers a GET for a stored file with:
+
+- 304 when the client's cached copy is still current (If-None-Match, or
+  If-Modified-Since when no ETag is sent),
+- 206 with just the requested bytes for a single `Range` (honouring
+  If-Range), or 416 if the range is past the end of the file,
+- otherwise the whole file.
+
+Bodies are sent with the server's zero-copy extensions when it offers them
+(`http.response.zerocopysend`, or `http.response.pathsend` for whole files),
+and otherwise read in 1 MiB chunks off the event loop.
+"""
+import hashlib
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, Response
+
+# Documents are private to a transaction's participants, and clients should
+# revalidate (cheaply, via 304) rather than trust a stale copy
+CACHE_CONTROL = "private, no-cache"
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class DocumentResponse(FileResponse):
+    """A FileResponse for the whole file or one byte range of it."""
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, path: str, stat_result: os.stat_result, byte_range: Optional[Tuple[int, int]] = None,
+                 **kwargs):
+        super().__init__(path, stat_result=stat_result, status_code=206 if byte_range else 200, **kwargs)
+        size = stat_result.st_size
+        self.start, self.end = byte_range or (0, size - 1)
+        self.headers["accept-ranges"] = "bytes"
+        if byte_range:
+            self.headers["content-range"] = f"bytes {self.start}-{self.end}/{size}"
+            self.headers["content-length"] = str(self.end - self.start + 1)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.end - self.start + 1
+        extensions = scope.get("extensions") or {}
+        if scope["method"].upper() == "HEAD" or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif self.status_code == 200 and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+        elif "http.response.zerocopysend" in extensions:
+            file = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                await send({"type": "http.response.zerocopysend", "file": file,
+                            "offset": self.start, "count": count, "more_body": False})
+            finally:
+                await anyio.to_thread.run_sync(file.close)
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.start)
+                remaining = count
+                while remaining:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break  # the file shrank underneath us
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining:
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+def file_etag(stat_result: os.stat_result, content_hash: Optional[str] = None) -> str:
+    """Strong ETag: the content hash if known, else one derived from mtime and size."""
+    if content_hash:
+        return f'"{content_hash}"'
+    base = f"{stat_result.st_mtime}-{stat_result.st_size}"
+    return f'"{hashlib.md5(base.encode(), usedforsecurity=False).hexdigest()}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Weak comparison, as If-None-Match uses
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since.timestamp()
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """The (first, last) byte of a single range; None to send the whole file.
+
+    Raises ValueError if the range can't be satisfied. Multi-range requests
+    are answered with the whole file, which RFC 9110 allows.
+    """
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # Suffix range: the final `last` bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("range starts past the end of the file")
+    return start, end
+
+
+async def document_response(request: Request, path: str, *, filename: str, media_type: str,
+                            content_hash: Optional[str] = None, headers: dict = None) -> Response:
+    try:
+        stat_result = await run_in_threadpool(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    etag = file_etag(stat_result, content_hash)
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    headers = {**(headers or {}), "etag": etag, "last-modified": last_modified, "cache-control": CACHE_CONTROL}
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if (if_none_match is not None and _etag_matches(if_none_match, etag)) or (
+        if_none_match is None and if_modified_since and _not_modified_since(if_modified_since, stat_result.st_mtime)
+    ):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range: only send part of the file if it's the version the client already has part of
+    if range_header and (if_range is None or if_range.strip() in (etag, last_modified)):
+        try:
+            byte_range = parse_range(range_header, stat_result.st_size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{stat_result.st_size}"})
+
+    return DocumentResponse(path, stat_result, byte_range, filename=filename, media_type=media_type,
+                            headers=headers)
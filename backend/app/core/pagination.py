@@ -0,0 +1,147 @@
+"""Keyset (cursor) pagination for list endpoints.
+
+A page is fetched with `WHERE (sort_key, id) > (last_sort_key, last_id)
+ORDER BY sort_key, id LIMIT n`, so page 100 costs the same index range scan as
+page 1. The cursor handed to the client is an opaque base64 token holding the
+last row's key.
+
+On typed backends (Postgres) the sort key travels in the cursor as JSON
+(datetimes in ISO format) and is bound back with the column's own type. On
+SQLite it travels as the database's own text form of the column
+(`CAST(col AS VARCHAR)`) instead: SQLite keeps server-default timestamps as
+'YYYY-MM-DD HH:MM:SS' while SQLAlchemy binds datetimes with microseconds,
+and comparing the two strings would skip rows that share a second with the
+cursor.
+
+Endpoints stay unpaginated unless the caller passes `limit` or `cursor`; the
+unpaginated form is deprecated and says so in a `Deprecation` header.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Generic, List, Optional, TypeVar
+
+from fastapi import HTTPException, Query, Response
+from pydantic import BaseModel
+from sqlalchemy import String, cast, literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+
+@dataclass
+class PageParams:
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
+
+    @property
+    def paginated(self) -> bool:
+        return self.limit is not None or self.cursor is not None
+
+    @property
+    def size(self) -> int:
+        return self.limit or DEFAULT_LIMIT
+
+
+def page_params(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+) -> PageParams:
+    """Dependency: the caller's page request. Flags unpaginated calls as deprecated."""
+    params = PageParams(limit=limit, cursor=cursor)
+    if not params.paginated:
+        response.headers["Deprecation"] = "true"
+    return params
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size or not isinstance(values[-1], int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def _to_json(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def _sort_value(value, sort_col):
+    # The cursor's sort key, back as the column's Python type
+    python_type = sort_col.type.python_type
+    try:
+        if python_type in (date, datetime):
+            return python_type.fromisoformat(value)
+        if not isinstance(value, python_type):
+            raise TypeError(value)
+        return value
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _keyset(query, params: PageParams, id_col, sort_col, descending, as_text):
+    # Works on both legacy Query objects and 2.0 select() statements
+    if sort_col is not None:
+        keys = [sort_col, id_col]
+        key_columns = [cast(sort_col, String) if as_text else sort_col, id_col]
+    else:
+        keys = key_columns = [id_col]
+
+    if params.cursor:
+        values = decode_cursor(params.cursor, len(keys))
+        if sort_col is not None:
+            if as_text:
+                sort_value = literal(values[0], String)
+            else:
+                sort_value = literal(_sort_value(values[0], sort_col), type_=sort_col.type)
+            left, right = tuple_(*keys), tuple_(sort_value, values[1])
+        else:
+            left, right = id_col, values[0]
+        query = query.filter(left < right if descending else left > right)
+
+    return (
+        query.add_columns(*key_columns)
+        .order_by(*(key.desc() if descending else key for key in keys))
+        .limit(params.size + 1)
+    )
+
+
+def _split(rows, params: PageParams):
+    # One extra row was fetched to learn whether another page exists
+    has_more = len(rows) > params.size
+    rows = rows[:params.size]
+    next_cursor = encode_cursor([_to_json(value) for value in rows[-1][1:]]) if has_more else None
+    return [row[0] for row in rows], next_cursor
+
+
+def _is_sqlite(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+def paginate(query, params: PageParams, id_col, sort_col=None, descending: bool = False):
+    """Fetch one page of a legacy Query. Returns (items, next_cursor)."""
+    as_text = _is_sqlite(query.session.get_bind())
+    return _split(_keyset(query, params, id_col, sort_col, descending, as_text).all(), params)
+
+
+async def paginate_async(db: AsyncSession, stmt, params: PageParams, id_col, sort_col=None, descending: bool = False):
+    as_text = _is_sqlite(db.sync_session.get_bind())
+    return _split((await db.execute(_keyset(stmt, params, id_col, sort_col, descending, as_text))).all(), params)
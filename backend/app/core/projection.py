@@ -0,0 +1,26 @@
+"""Column projections for read-only list endpoints.
+
+`projection(*columns)` selects just the given columns and loads each row as
+a plain dict keyed by column name, skipping ORM object hydration (identity
+map, instance state, lazy-load hooks). It's a `Bundle`, so it works with
+both `db.query(...)` and `select(...)` and with `paginate()`:
+
+    rows = db.query(projection(Message.id, Message.content)).filter(...).all()
+
+Use it where a handler only reads rows to serialize them; handlers that
+modify what they load still need the ORM objects.
+"""
+from sqlalchemy.orm import Bundle
+
+
+class Projection(Bundle):
+    """A Bundle whose rows come back as dicts."""
+
+    def create_row_processor(self, query, procs, labels):
+        def as_dict(row):
+            return dict(zip(labels, [proc(row) for proc in procs]))
+        return as_dict
+
+
+def projection(*columns, name: str = "row") -> Projection:
+    return Projection(name, *columns, single_entity=True)
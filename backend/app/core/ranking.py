@@ -0,0 +1,58 @@
+"""Lexicographic order keys (fractional indexing).
+
+A key can always be generated that sorts strictly between two others, so an
+item is inserted or moved by writing only its own key; nothing else is
+renumbered. Keys grow by roughly one character per five inserts into the same
+gap, so lists are occasionally rebalanced back to short, evenly spaced keys.
+
+Keys use only digits and lowercase letters, which sort the same way under
+SQLite's BINARY collation and the usual PostgreSQL locales, and never end in
+'0', which keeps a gap open below every key.
+"""
+from typing import List, Optional
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+
+
+def key_between(before: Optional[str], after: Optional[str]) -> str:
+    """A key sorting after `before` and before `after` (None means unbounded)."""
+    lower = before or ""
+    if after is not None and lower >= after:
+        raise ValueError(f"{before!r} does not sort before {after!r}")
+    return _midpoint(lower, after)
+
+
+def _midpoint(lower: str, upper: Optional[str]) -> str:
+    if upper is not None:
+        # Keep the shared prefix (reading missing digits of `lower` as zeros)
+        n = 0
+        while n < len(upper) and (lower[n] if n < len(lower) else "0") == upper[n]:
+            n += 1
+        if n:
+            return upper[:n] + _midpoint(lower[n:], upper[n:])
+    low = DIGITS.index(lower[0]) if lower else 0
+    high = DIGITS.index(upper[0]) if upper is not None else BASE
+    if high - low > 1:
+        return DIGITS[(low + high) // 2]
+    # Adjacent first digits: go one digit deeper
+    if upper is not None and len(upper) > 1:
+        return upper[0]
+    return DIGITS[low] + _midpoint(lower[1:], None)
+
+
+def spread_keys(count: int) -> List[str]:
+    """`count` ascending keys, evenly spaced, with about a digit's room between neighbours."""
+    width = 1
+    while BASE ** width < (count + 1) * BASE:
+        width += 1
+    step = BASE ** width // (count + 1)
+    return [_encode(step * (i + 1), width).rstrip("0") for i in range(count)]
+
+
+def _encode(value: int, width: int) -> str:
+    digits = []
+    for _ in range(width):
+        value, digit = divmod(value, BASE)
+        digits.append(DIGITS[digit])
+    return "".join(reversed(digits))
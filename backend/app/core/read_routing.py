@@ -0,0 +1,105 @@
+"""Read sessions for GET handlers, with read-your-writes.
+
+Handlers that only read take `get_read_db` / `get_async_read_db` instead of
+get_db / get_async_db, so with READ_REPLICA_URL set their queries go to the
+read-only engine and leave the primary to writers (app/core/database.py).
+
+A replica can be a moment behind the primary, so a user who has just
+changed something could read the old data back. `ReadYourWritesMiddleware`
+records each user whose POST/PUT/PATCH/DELETE succeeded, and for
+READ_YOUR_WRITES_SECONDS afterwards that user's read sessions use the
+primary instead. Other users keep reading from the replica.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Depends
+
+from app.core.config import settings
+from app.core.database import AsyncReadSessionLocal, ReadSessionLocal, async_engine, engine
+from app.core.security import get_current_user
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class RecentWriters:
+    """User ids that wrote within the last `window` seconds (bounded LRU).
+
+    The record is per process: with several workers, a write handled by one
+    worker doesn't send the user's reads on another worker to the primary, so
+    read-your-writes only holds within a worker (or behind sticky sessions).
+    """
+
+    def __init__(self, window: float, maxsize: int = 10000):
+        self.window = window
+        self.maxsize = maxsize
+        self._writes = OrderedDict()  # user_id -> monotonic time of last write
+        self._lock = threading.Lock()
+
+    def mark(self, user_id: int):
+        with self._lock:
+            self._writes[user_id] = time.monotonic()
+            self._writes.move_to_end(user_id)
+            while len(self._writes) > self.maxsize:
+                self._writes.popitem(last=False)
+
+    def wrote_recently(self, user_id: Optional[int]) -> bool:
+        with self._lock:
+            written = self._writes.get(user_id)
+            if written is None:
+                return False
+            if time.monotonic() - written < self.window:
+                return True
+            del self._writes[user_id]
+            return False
+
+    def clear(self):
+        with self._lock:
+            self._writes.clear()
+
+
+recent_writers = RecentWriters(window=settings.READ_YOUR_WRITES_SECONDS)
+
+
+class ReadYourWritesMiddleware:
+    """Marks the user as a recent writer when an unsafe request's response starts without an error."""
+
+    def __init__(self, app, writers: RecentWriters = recent_writers):
+        self.app = app
+        self.writers = writers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        state = scope.setdefault("state", {})  # get_current_user puts user_id here
+
+        async def send_and_mark(message):
+            if message["type"] == "http.response.start" and message["status"] < 400 and "user_id" in state:
+                self.writers.mark(state["user_id"])
+            await send(message)
+
+        await self.app(scope, receive, send_and_mark)
+
+
+def get_read_db(current_user=Depends(get_current_user)):
+    # Same read-only guard either way; only the engine differs
+    if recent_writers.wrote_recently(current_user.id):
+        db = ReadSessionLocal(bind=engine)
+    else:
+        db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(current_user=Depends(get_current_user)):
+    if recent_writers.wrote_recently(current_user.id):
+        db = AsyncReadSessionLocal(bind=async_engine)
+    else:
+        db = AsyncReadSessionLocal()
+    async with db:
+        yield db
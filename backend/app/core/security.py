@@ -1,14 +1,20 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
-from app.models.user import User
+from app.models.user import User, UserRole
+from app.core.config import settings
 from app.core.database import get_db
 from typing import Optional
+from collections import OrderedDict
+from dataclasses import dataclass
 import os
 import secrets
+import threading
+import time
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -38,7 +44,93 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+@dataclass(frozen=True)
+class Principal:
+    """Lightweight snapshot of the authenticated user, safe to share across requests."""
+    id: int
+    email: str
+    first_name: str
+    last_name: str
+    role: UserRole
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(id=user.id, email=user.email, first_name=user.first_name,
+                   last_name=user.last_name, role=user.role)
+
+class PrincipalCache:
+    """Bounded LRU cache of token -> Principal with a TTL.
+
+    An entry lives until the cache TTL or the token's own expiry, whichever is
+    sooner, so an expired token always falls through to a full decode and gets
+    the usual 401. Hit/miss counters show how many requests skipped the JWT
+    decode and the users-table lookup.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token -> (principal, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[token]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, principal: Principal, token_exp: float):
+        expires_at = min(time.time() + self.ttl, token_exp)
+        with self._lock:
+            self._entries[token] = (principal, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: Optional[int] = None, emails=()):
+        with self._lock:
+            stale = [
+                token for token, (principal, _) in self._entries.items()
+                if principal.id == user_id or principal.email in emails
+            ]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+principal_cache = PrincipalCache(maxsize=settings.AUTH_CACHE_MAXSIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+
+def _invalidate_cached_principal(mapper, connection, target):
+    # Drop cached principals for this user (by id, and by old and new email so
+    # a recreated account with the same email isn't served a stale snapshot)
+    emails = {target.email, *inspect(target).attrs.email.history.deleted}
+    principal_cache.invalidate_user(user_id=target.id, emails=emails)
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(User, _event_name, _invalidate_cached_principal)
+
+def _remember_user(request: Optional[Request], principal: Principal):
+    # For app/core/read_routing.py, which routes a user's reads to the primary right after they write
+    if request is not None:
+        request.state.user_id = principal.id
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db), request: Request = None) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
@@ -50,6 +142,11 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    principal = principal_cache.get(token)
+    if principal is not None:
+        _remember_user(request, principal)
+        return principal
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -65,8 +162,11 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         user = db.query(User).filter(User.email == email).first()
         if user is None:
             raise credentials_exception
-            
-        return user
+
+        principal = Principal.from_user(user)
+        principal_cache.put(token, principal, exp)
+        _remember_user(request, principal)
+        return principal
     except JWTError as e:
         if "expired" in str(e).lower():
             raise expired_exception
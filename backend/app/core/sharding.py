@@ -0,0 +1,228 @@
+"""Horizontal sharding of property transactions across databases.
+
+A property, its participants and its stages live together on one shard.
+Users and the other shared tables (notifications, messages, files, stage
+info, blobs) stay in the catalog database, DATABASE_URL. The catalog's
+`property_shards` directory records each property's shard and, once shards
+are configured, allocates property ids so they stay unique across shards.
+
+New properties are placed by SHARD_KEY: by the estate agent's firm
+(`User.company_name`), so a firm's transactions share a database and its
+write load doesn't contend with other firms', or by property id. A firm
+pinned in `firm_shards` (by app/scripts/rebalance_shards.py) goes to its pin.
+
+With SHARD_URLS empty the catalog is the only shard. Every dependency here
+then hands back the request's usual session and nothing is looked up, so the
+single-database setup runs exactly as before. Before turning shards on, run
+`python -m app.scripts.rebalance_shards --backfill` to fill the directory
+(with the catalog's database as shard 0).
+
+- `get_shard_db` / `get_shard_read_db` / `get_async_shard_db`: a session on
+  the shard of the path's `property_id`.
+- `get_property_access` (app/core/access.py) finds a property on its shard
+  from any session, for handlers that only need the access check.
+- `ShardRouter.fan_out` runs a query on every shard at once (GET /properties).
+"""
+import contextvars
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from functools import partial
+from typing import Callable, List, Optional, Sequence
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import (
+    AsyncSessionLocal, ReadSessionLocal, SessionLocal, async_engine, create_db_engine, engine, get_async_db, get_uow,
+)
+from app.core.read_routing import get_read_db
+from app.models.shard import FirmShard, PropertyShard
+
+_SHARD = "shard"
+
+
+class ShardRouter:
+    def __init__(self, urls: Sequence[str] = (), key: str = "firm"):
+        self._owned = []
+        self._pool = None
+        self.configure(urls, key)
+
+    def configure(self, urls: Sequence[str], key: str = "firm"):
+        """(Re)build the shard engines. No URLs means the catalog is the only shard."""
+        for owned in self._owned:
+            getattr(owned, "sync_engine", owned).dispose()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+        self.key = key
+        self.urls = [url for url in urls if url]
+        if self.urls:
+            self.engines = [create_db_engine(url) for url in self.urls]
+            self.async_engines = [create_db_engine(url, is_async=True) for url in self.urls]
+            self._owned = self.engines + self.async_engines
+        else:
+            self.engines, self.async_engines = [engine], [async_engine]
+            self._owned = []
+        self._pool = ThreadPoolExecutor(max_workers=len(self.engines), thread_name_prefix="shard")
+
+    @property
+    def sharded(self) -> bool:
+        return bool(self.urls)
+
+    @property
+    def count(self) -> int:
+        return len(self.engines)
+
+    def session(self, shard: int, read_only: bool = False) -> Session:
+        # Same configuration (and read-only guard) as the catalog's sessions, bound to the shard
+        factory = ReadSessionLocal if read_only else SessionLocal
+        return factory(bind=self.engines[shard], info={_SHARD: shard})
+
+    def async_session(self, shard: int) -> AsyncSession:
+        return AsyncSessionLocal(bind=self.async_engines[shard], info={_SHARD: shard})
+
+    def session_factory(self, db: Session) -> Callable[[], Session]:
+        """New sessions on the same database as `db`, e.g. for a background task."""
+        shard = db.info.get(_SHARD)
+        return SessionLocal if shard is None else partial(self.session, shard)
+
+    def placement(self, db: Session, property_id: int, firm: Optional[str]) -> int:
+        """The shard a new property goes to; `db` is a catalog session."""
+        if not self.sharded:
+            return 0
+        if firm:
+            pinned = db.execute(select(FirmShard.shard).where(FirmShard.firm == firm)).scalar()
+            if pinned is not None and pinned < self.count:
+                return pinned
+            if self.key == "firm":
+                # crc32 rather than hash(): the same firm must land on the same shard in every process
+                return zlib.crc32(firm.encode()) % self.count
+        return property_id % self.count
+
+    def place(self, db: Session, firm: Optional[str]) -> tuple:
+        """Allocate a directory entry for a new property. Returns (property_id, shard).
+
+        Unsharded, the property keeps its own autoincrement id: returns (None, 0)
+        and nothing is written.
+        """
+        if not self.sharded:
+            return None, 0
+        entry = PropertyShard(firm=firm, shard=0)
+        db.add(entry)
+        db.flush()
+        entry.shard = self.placement(db, entry.property_id, firm)
+        return entry.property_id, entry.shard
+
+    def forget(self, db: Session, property_id: int):
+        db.execute(delete(PropertyShard).where(PropertyShard.property_id == property_id))
+
+    def locate(self, db: Session, property_id: int) -> Optional[int]:
+        """The property's shard per the catalog directory; None if it has no entry."""
+        if not self.sharded:
+            return 0
+        return db.execute(select(PropertyShard.shard).where(PropertyShard.property_id == property_id)).scalar()
+
+    @contextmanager
+    def reading(self, db: Session, property_id: int):
+        """A session that can read the property: `db` itself if it can, else one on its shard (None if unknown)."""
+        if not self.sharded or db.info.get(_SHARD) is not None:
+            yield db
+            return
+        shard = self.locate(db, property_id)
+        if shard is None:
+            yield None
+            return
+        shard_db = self.session(shard, read_only=True)
+        try:
+            yield shard_db
+        finally:
+            shard_db.close()
+
+    @asynccontextmanager
+    async def reading_async(self, db: AsyncSession, property_id: int):
+        if not self.sharded or db.sync_session.info.get(_SHARD) is not None:
+            yield db
+            return
+        shard = await db.run_sync(lambda sync_db: self.locate(sync_db, property_id))
+        if shard is None:
+            yield None
+            return
+        async with self.async_session(shard) as shard_db:
+            yield shard_db
+
+    def fan_out(self, query: Callable[[Session], object]) -> List[object]:
+        """Run `query(session)` on every shard concurrently. Returns the results in shard order."""
+        def run(shard):
+            shard_db = self.session(shard, read_only=True)
+            try:
+                return query(shard_db)
+            finally:
+                shard_db.close()
+        if self.count == 1:
+            return [run(0)]
+        # Each task runs in a copy of the caller's context, so per-request
+        # state (e.g. the SQL counters in app/core/sql_timing.py) sees its queries
+        futures = [self._pool.submit(contextvars.copy_context().run, run, shard) for shard in range(self.count)]
+        return [future.result() for future in futures]
+
+    def owners(self, db: Session, property_ids) -> dict:
+        """{property_id: shard} from the directory, to drop rows a shard holds but no longer owns (mid-move)."""
+        return dict(db.execute(select(PropertyShard.property_id, PropertyShard.shard).where(
+            PropertyShard.property_id.in_(set(property_ids))
+        )).all())
+
+
+shard_router = ShardRouter([url.strip() for url in settings.SHARD_URLS.split(",")], settings.SHARD_KEY)
+
+
+def _shard_or_404(db: Session, property_id: int) -> int:
+    shard = shard_router.locate(db, property_id)
+    if shard is None:
+        raise HTTPException(status_code=404, detail="Property not found")
+    return shard
+
+
+def get_shard_db(property_id: int, db: Session = Depends(get_uow)):
+    """Unit of work on the shard holding `property_id`; the request's get_uow session when unsharded.
+
+    The shard commits when the handler returns, just before get_uow commits
+    the catalog.
+    """
+    if not shard_router.sharded:
+        yield db
+        return
+    shard_db = shard_router.session(_shard_or_404(db, property_id))
+    try:
+        yield shard_db
+        if shard_db.in_transaction():
+            shard_db.commit()
+    except Exception:
+        shard_db.rollback()
+        raise
+    finally:
+        shard_db.close()
+
+
+def get_shard_read_db(property_id: int, db: Session = Depends(get_read_db)):
+    """Read session on the shard holding `property_id`; the request's get_read_db session when unsharded."""
+    if not shard_router.sharded:
+        yield db
+        return
+    shard_db = shard_router.session(_shard_or_404(db, property_id), read_only=True)
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
+
+
+async def get_async_shard_db(property_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Async session on the shard holding `property_id`; the handler commits, as with get_async_db."""
+    if not shard_router.sharded:
+        yield db
+        return
+    shard = await db.run_sync(lambda sync_db: _shard_or_404(sync_db, property_id))
+    async with shard_router.async_session(shard) as shard_db:
+        yield shard_db
@@ -0,0 +1,69 @@
+"""Short-lived signed download links.
+
+`get_file` checks access once and mints a token naming what to send: the
+stored location, the filename and type to send it as, and the content hash.
+The token is HMAC-signed and expires after DOWNLOAD_URL_TTL_SECONDS, so the
+download route can trust it without looking anything up in the database.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException
+
+from app.core import security
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class DownloadGrant:
+    location: str
+    filename: str
+    media_type: str
+    content_hash: Optional[str] = None
+    expires: int = 0
+
+
+def _key() -> bytes:
+    # Separate from the JWT key, so a download token can never pass as a login token or vice versa
+    return hmac.new(security.SECRET_KEY.encode(), b"download-url", hashlib.sha256).digest()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_key(), payload.encode(), hashlib.sha256).digest())
+
+
+def sign_download(location: str, filename: str, media_type: str, content_hash: Optional[str] = None,
+                  ttl: Optional[int] = None) -> str:
+    expires = int(time.time()) + (settings.DOWNLOAD_URL_TTL_SECONDS if ttl is None else ttl)
+    payload = _b64encode(json.dumps(
+        {"l": location, "n": filename, "t": media_type, "h": content_hash, "e": expires},
+        separators=(",", ":"),
+    ).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_download(token: str) -> DownloadGrant:
+    """The grant a token carries; 403 if it was tampered with or has expired."""
+    payload, _, signature = token.partition(".")
+    if not signature or not hmac.compare_digest(signature, _sign(payload)):
+        raise HTTPException(status_code=403, detail="Invalid download link")
+    try:
+        data = json.loads(_b64decode(payload))
+    except ValueError:
+        raise HTTPException(status_code=403, detail="Invalid download link")
+    if data["e"] < time.time():
+        raise HTTPException(status_code=403, detail="Download link has expired")
+    return DownloadGrant(data["l"], data["n"], data["t"], data["h"], data["e"])
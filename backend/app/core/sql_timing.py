@@ -0,0 +1,147 @@
+"""Per-request SQL instrumentation.
+
+`QueryTimingMiddleware` counts the statements each request runs, on any
+engine and through sync or async sessions, including those of its
+dependencies (e.g. get_uow's commit), and reports them in a Server-Timing
+header the browser's network panel understands:
+
+    Server-Timing: db;dur=12.4;desc="7 queries", db-slowest;dur=5.1
+
+Statements slower than SLOW_QUERY_THRESHOLD_MS are written to the
+`app.slow_queries` logger, normalized (literals and placeholders replaced by
+`?`) with the route that ran them, and from there to a rotating file.
+Statements run outside a request, such as by the notification worker, are
+only checked against the threshold.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+slow_query_log = logging.getLogger("app.slow_queries")
+
+_QUERY_STARTS = "query_starts"
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|\$\d+|:\w+|\?")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """The statement with literals and bound parameters as `?`, so repeats of one query read the same."""
+    statement = _STRING.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _IN_LIST.sub("(?...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+@dataclass
+class RequestQueries:
+    scope: dict = field(repr=False)
+    count: int = 0
+    seconds: float = 0.0
+    slowest: float = 0.0
+    slowest_statement: Optional[str] = None
+    # Sharded fan-outs add to one request's statistics from several threads
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def route(self) -> str:
+        # The route's template once routing has matched one, e.g. "GET /properties/{property_id}/stages"
+        route = self.scope.get("route")
+        return f"{self.scope['method']} {route.path if route is not None else self.scope['path']}"
+
+    def add(self, statement: str, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            if seconds >= self.slowest:
+                self.slowest = seconds
+                self.slowest_statement = statement
+
+    def server_timing(self) -> str:
+        return (f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries", '
+                f'db-slowest;dur={self.slowest * 1000:.1f}')
+
+
+_request_queries: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+def current_queries() -> Optional[RequestQueries]:
+    """The running request's statistics, or None outside a request."""
+    return _request_queries.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_QUERY_STARTS, []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info[_QUERY_STARTS].pop()
+    queries = _request_queries.get()
+    if queries is not None:
+        queries.add(statement, seconds)
+    if seconds * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+        slow_query_log.warning("%.1fms %s %s", seconds * 1000, queries.route if queries else "-",
+                               normalize_sql(statement))
+
+
+@event.listens_for(Engine, "handle_error")
+def _drop_timer(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    conn = exception_context.connection
+    if conn is not None and conn.info.get(_QUERY_STARTS):
+        conn.info[_QUERY_STARTS].pop()
+
+
+def configure_slow_query_log(path: str = settings.SLOW_QUERY_LOG_FILE):
+    """Send the slow-query log to a rotating file at `path` (once; an empty path leaves it alone)."""
+    if not path or any(isinstance(h, RotatingFileHandler) for h in slow_query_log.handlers):
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+                                  backupCount=settings.SLOW_QUERY_LOG_BACKUPS)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_query_log.addHandler(handler)
+    slow_query_log.setLevel(logging.WARNING)
+
+
+class QueryTimingMiddleware:
+    """Collects each HTTP request's SQL statistics and adds them as a Server-Timing header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        queries = RequestQueries(scope)
+        token = _request_queries.set(queries)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", queries.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_queries.reset(token)
@@ -2,7 +2,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
-from app.core.database import Base, engine  
+from sqlalchemy.orm.exc import StaleDataError
+from app.core.concurrency import conflict_handler
+from app.core.database import Base, engine, log_engine_profile
+from app.core.read_routing import ReadYourWritesMiddleware
+from app.core.sharding import shard_router
+from app.core.sql_timing import QueryTimingMiddleware, configure_slow_query_log
 from app.api.base import router as base_router
 from app.api.signup import router as signup_router
 from app.api.login import router as login_router
@@ -11,9 +16,15 @@ from app.api.property import router as property_router
 from app.api.message import router as message_router
 from app.api.user import router as user_router
 from app.api.stage_info import router as stage_info_router
+from app.api.events import router as events_router
 from app.models.user import User
 from app.models.file import File
 from app.models.property import Property
+from app.services.moderation import moderation_pipeline
+from app.services.events import event_hub
+from app.services.blobs import blob_collector
+from app.services.notifications import notifier
+from app.services.notification_archive import notification_archiver
 
 # Load environment variables from .env file
 load_dotenv()
@@ -23,6 +34,8 @@ print("OpenAI API Key loaded:", bool(os.getenv('OPENAI_API_KEY')))
 
 # Create all tables
 Base.metadata.create_all(bind=engine)  
+for shard_engine in shard_router.engines if shard_router.sharded else ():
+    Base.metadata.create_all(bind=shard_engine)
 
 app = FastAPI()
 
@@ -37,9 +50,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Disposition", "Content-Type"],
+    expose_headers=["Content-Disposition", "Content-Type", "Server-Timing", "ETag"],
 )
 
+# Lost-update conflicts on versioned rows (app/core/concurrency.py)
+app.add_exception_handler(StaleDataError, conflict_handler)
+
+# Sends a user's reads to the primary for a moment after they write (app/core/read_routing.py)
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Query count and DB time per request in a Server-Timing header, slow statements to a log
+app.add_middleware(QueryTimingMiddleware)
+
 # Include routers
 app.include_router(base_router)
 app.include_router(signup_router)
@@ -49,6 +71,46 @@ app.include_router(property_router)
 app.include_router(message_router)
 app.include_router(user_router)
 app.include_router(stage_info_router)
+app.include_router(events_router)
+
+@app.on_event("startup")
+def report_database():
+    log_engine_profile()
+    configure_slow_query_log()
+
+@app.on_event("startup")
+def resume_moderation():
+    # Messages left in 'moderating' by a previous process would never reach the agent
+    moderation_pipeline.requeue_stuck()
+
+@app.on_event("shutdown")
+def stop_moderation():
+    moderation_pipeline.shutdown()
+
+@app.on_event("shutdown")
+def stop_events():
+    event_hub.shutdown()
+
+@app.on_event("shutdown")
+def stop_notifications():
+    # Writes any held bursts before exiting
+    notifier.shutdown()
+
+@app.on_event("startup")
+def start_notification_archiver():
+    notification_archiver.start()
+
+@app.on_event("shutdown")
+def stop_notification_archiver():
+    notification_archiver.stop()
+
+@app.on_event("startup")
+def start_blob_collector():
+    blob_collector.start()
+
+@app.on_event("shutdown")
+def stop_blob_collector():
+    blob_collector.stop()
 
 @app.get("/")
 def read_root():
@@ -1,4 +1,7 @@
 from app.models.user import User
 from app.models.property import Property
 from app.models.file import File
-from app.models.conveyancing_case import ConveyancingCase 
\ No newline at end of file
+from app.models.blob import Blob
+from app.models.conveyancing_case import ConveyancingCase
+from app.models.shard import PropertyShard, FirmShard
+from app.models.backfill import BackfillCheckpoint
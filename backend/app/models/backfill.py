@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime, func
+from app.core.database import Base
+
+class BackfillCheckpoint(Base):
+    """Progress of a batched backfill (app/services/backfills.py), so an interrupted run can resume.
+
+    Updated in the same transaction as each batch it records.
+    """
+    __tablename__ = "backfill_checkpoints"
+
+    name = Column(String, primary_key=True)
+    last_key = Column(Integer, nullable=False, default=0)  # keyset position: the last key processed
+    rows = Column(Integer, nullable=False, default=0)
+    changed = Column(Integer, nullable=False, default=0)
+    batches = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False, default="running")  # 'running' or 'done'
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index, text
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class Blob(Base):
+    """A stored file's content, kept once however many File rows point at it."""
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # File rows using this blob
+    created_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'))
+    # Last time ref_count changed; the collector leaves recently released blobs alone
+    updated_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'),
+                        onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_blobs_unreferenced", "updated_at",
+              sqlite_where=text("ref_count = 0"),
+              postgresql_where=text("ref_count = 0")),
+    )
@@ -44,26 +44,28 @@ class CaseInsensitiveEnum(TypeDecorator):
 
     def __init__(self, enum_class):
         self.enum_class = enum_class
+        # value -> member, looked up per row instead of scanning the members
+        self._members = {member.value: member for member in enum_class}
         super().__init__()
 
     def process_bind_param(self, value, dialect):
         if value is None:
             return None
+        if isinstance(value, self.enum_class):
+            return value.value
         if isinstance(value, str):
-            value = value.lower()
-            for member in self.enum_class:
-                if member.value == value:
-                    return member.value
-        return value.value if isinstance(value, self.enum_class) else value
+            return value.lower()
+        return value
 
     def process_result_value(self, value, dialect):
         if value is None:
             return None
         if isinstance(value, str):
-            value = value.lower()
-            for member in self.enum_class:
-                if member.value == value:
-                    return member
+            member = self._members.get(value)
+            if member is None:
+                value = value.lower()
+                member = self._members.get(value)
+            return value if member is None else member
         return value
 
 class File(Base):
@@ -74,11 +76,12 @@ class File(Base):
     file_path = Column(String, nullable=False)
     file_type = Column(String, nullable=True)
     file_size = Column(Integer, nullable=True)  # Size in bytes
+    sha256 = Column(String(64), nullable=True)  # content hash; new uploads are stored as blobs.sha256
     uploaded_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     
     # Optional relationships - at least one must be set
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # For user-specific documents
-    property_id = Column(Integer, ForeignKey("properties.id"), nullable=True)  # For property-specific documents
+    property_id = Column(Integer, ForeignKey("properties.id"), nullable=True, index=True)  # For property-specific documents
     conveyancing_case_id = Column(Integer, ForeignKey("conveyancing_cases.id"), nullable=True)  # For case-specific documents
     
     uploaded_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index, text
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -19,4 +19,12 @@ class Message(Base):
     approval_status = Column(String, nullable=False, default="pending")  # 'pending', 'approved'
     approved_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     timestamp = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'))
-    status = Column(String, nullable=False, default="pending")  # pending, approved, delivered 
\ No newline at end of file
+    status = Column(String, nullable=False, default="pending")  # pending, approved, delivered
+
+    __table_args__ = (
+        Index("ix_messages_property_timestamp", "property_id", "timestamp"),
+        # Estate agent's approval queue
+        Index("ix_messages_pending", "property_id", "timestamp",
+              sqlite_where=text("approval_status = 'pending'"),
+              postgresql_where=text("approval_status = 'pending'")),
+    )
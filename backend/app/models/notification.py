@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, func
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index, LargeBinary, func, text
 from app.core.database import Base
 
 class Notification(Base):
@@ -10,4 +10,54 @@ class Notification(Base):
     message = Column(Text, nullable=False)
     type = Column(String, nullable=False, default="system")  # e.g. 'message', 'approval', 'system'
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    read = Column(Boolean, default=False) 
\ No newline at end of file
+    read = Column(Boolean, default=False)
+
+    __table_args__ = (
+        Index("ix_notifications_property_user_created", "property_id", "user_id", "created_at"),
+        # Unread badge/list: only the small unread slice is indexed
+        Index("ix_notifications_unread", "property_id", "user_id", "created_at",
+              sqlite_where=text("read = 0"), postgresql_where=text("NOT read")),
+    )
+
+
+class NotificationCounter(Base):
+    """Unread notifications per (user, property), kept in step with `notifications`.
+
+    Changed in the same transaction as the rows it counts, so badges are one
+    primary-key range read instead of a scan of unread rows.
+    """
+    __tablename__ = "notification_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    property_id = Column(Integer, ForeignKey("properties.id"), primary_key=True)
+    unread = Column(Integer, nullable=False, default=0)
+
+
+class NotificationReadMark(Base):
+    """A user's read watermark on a property: notifications with id <= last_read_id count as read.
+
+    Marking everything read moves this one row instead of updating every notification.
+    """
+    __tablename__ = "notification_read_marks"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    property_id = Column(Integer, ForeignKey("properties.id"), primary_key=True)
+    last_read_id = Column(Integer, nullable=False, default=0)
+
+
+class NotificationArchive(Base):
+    """A batch of archived notifications for one property, as zlib-compressed JSON.
+
+    Written by the retention job (app/services/notification_archive.py); the
+    rows it holds are deleted from `notifications` in the same transaction.
+    """
+    __tablename__ = "notification_archive"
+
+    id = Column(Integer, primary_key=True)
+    property_id = Column(Integer, nullable=True, index=True)  # no FK: outlives deleted properties
+    reason = Column(String, nullable=False)  # 'expired' or 'closed'
+    row_count = Column(Integer, nullable=False)
+    first_notification_id = Column(Integer, nullable=False)
+    last_notification_id = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
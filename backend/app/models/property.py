@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, text, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, text, Boolean, Index, event, delete, insert, inspect
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from datetime import datetime
@@ -58,6 +58,11 @@ class Property(Base):
     timeline_approved_by_seller_solicitor = Column(Boolean, default=False, nullable=False)
     timeline_locked = Column(Boolean, default=False, nullable=False)
 
+    # Optimistic concurrency: every ORM UPDATE is `... WHERE version = <loaded>` and bumps it (app/core/concurrency.py)
+    version = Column(Integer, nullable=False, server_default=text("1"))
+
+    __mapper_args__ = {"version_id_col": version}
+
 class PropertyStage(Base):
     __tablename__ = "property_stages"
 
@@ -75,7 +80,63 @@ class PropertyStage(Base):
 
     # Collaborative Timeline Fields
     is_draft = Column(Boolean, default=False, nullable=False)
-    order = Column(Integer, nullable=False, default=0)
+    rank = Column(String, nullable=False)  # lexicographic order key, see app.core.ranking
     responsible_role = Column(String, nullable=True)
+    version = Column(Integer, nullable=False, server_default=text("1"))  # see Property.version
+
+    # 0-based position in the timeline; not stored, the API fills it in from rank
+    order = None
+
+    __table_args__ = (
+        Index("ix_property_stages_property_rank", "property_id", "rank"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+    property = relationship("Property", back_populates="stages") 
+
+# Participant role -> Property foreign key column
+PARTICIPANT_COLUMNS = {
+    "buyer": "buyer_id",
+    "seller": "seller_id",
+    "buyer_solicitor": "buyer_solicitor_id",
+    "seller_solicitor": "seller_solicitor_id",
+    "estate_agent": "estate_agent_id",
+}
+
+class PropertyParticipant(Base):
+    """Denormalised (property, user, role) membership, kept in sync with the Property foreign keys."""
+    __tablename__ = "property_participants"
+
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    role = Column(String, primary_key=True)
+
+    __table_args__ = (
+        # Listing a user's properties is a range scan on this index
+        Index("ix_property_participants_user_property", "user_id", "property_id"),
+    )
+
+def participant_rows(prop):
+    return [
+        {"property_id": prop.id, "user_id": getattr(prop, column), "role": role}
+        for role, column in PARTICIPANT_COLUMNS.items()
+        if getattr(prop, column) is not None
+    ]
+
+@event.listens_for(Property, "after_insert")
+def _insert_participants(mapper, connection, target):
+    rows = participant_rows(target)
+    if rows:
+        connection.execute(insert(PropertyParticipant), rows)
+
+@event.listens_for(Property, "after_update")
+def _sync_participants(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[column].history.has_changes() for column in PARTICIPANT_COLUMNS.values()):
+        return
+    connection.execute(delete(PropertyParticipant).where(PropertyParticipant.property_id == target.id))
+    _insert_participants(mapper, connection, target)
 
-    property = relationship("Property", back_populates="stages") 
\ No newline at end of file
+@event.listens_for(Property, "after_delete")
+def _delete_participants(mapper, connection, target):
+    connection.execute(delete(PropertyParticipant).where(PropertyParticipant.property_id == target.id))
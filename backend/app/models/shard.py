@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, text
+from app.core.database import Base
+
+class PropertyShard(Base):
+    """Shard directory, in the catalog database: which shard holds each property.
+
+    Property ids are allocated here, so they stay unique across shards.
+    """
+    __tablename__ = "property_shards"
+
+    property_id = Column(Integer, primary_key=True)
+    shard = Column(Integer, nullable=False, default=0)
+    firm = Column(String, nullable=True, index=True)  # estate agency the property was placed by
+
+class FirmShard(Base):
+    """A firm pinned to a shard (by the rebalancing tool) instead of the hashed placement."""
+    __tablename__ = "firm_shards"
+
+    firm = Column(String, primary_key=True)
+    shard = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'))
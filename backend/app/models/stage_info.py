@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, text
+from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint, text
 from app.core.database import Base
 
 class StageInfo(Base):
@@ -13,5 +13,6 @@ class StageInfo(Base):
 
     # Create a unique constraint on stage and role combination
     __table_args__ = (
+        UniqueConstraint('stage', 'role', name='uq_stage_info_stage_role'),
         {'sqlite_autoincrement': True},
     ) 
\ No newline at end of file
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, text
+from sqlalchemy.orm import relationship
+from app.core.database import Base
+
+class TimelineTemplate(Base):
+    """A named list of stages that new property timelines are cloned from."""
+    __tablename__ = "timeline_templates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False, unique=True)
+    created_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'))
+
+    stages = relationship("TimelineTemplateStage", back_populates="template",
+                          cascade="all, delete-orphan", order_by="TimelineTemplateStage.position")
+
+class TimelineTemplateStage(Base):
+    __tablename__ = "timeline_template_stages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    template_id = Column(Integer, ForeignKey("timeline_templates.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    rank = Column(String, nullable=False)  # copied to PropertyStage.rank
+    stage = Column(String, nullable=False)
+    description = Column(String, nullable=True)
+    responsible_role = Column(String, nullable=True)
+    responsible = Column(String, nullable=True)
+
+    template = relationship("TimelineTemplate", back_populates="stages")
+
+    __table_args__ = (
+        Index("ix_timeline_template_stages_template_position", "template_id", "position"),
+    )
@@ -26,10 +26,12 @@ class FileResponse(FileBase):
     file_path: str
     file_type: str | None = None
     file_size: int | None = None
+    sha256: str | None = None
     uploaded_by: int
     uploaded_at: datetime
     notes: str | None = None
     review_status: ReviewStatus | None = None
+    download_url: str | None = None  # signed, short-lived; only set by GET /files/{id}
 
     class Config:
         from_attributes = True 
\ No newline at end of file
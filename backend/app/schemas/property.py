@@ -45,5 +45,6 @@ class PropertyResponse(PropertyBase):
     timeline_locked: bool = False
     timeline_approved_by_buyer_solicitor: bool = False
     timeline_approved_by_seller_solicitor: bool = False
+    version: int = 1  # the ETag; send it back in If-Match to update
     class Config:
         orm_mode = True 
\ No newline at end of file
@@ -0,0 +1,26 @@
+"""Run the notification retention job once, e.g. after lowering NOTIFICATION_RETENTION_DAYS.
+
+Usage (from backend/):
+    python -m app.scripts.archive_notifications [--days 90] [--batch-size 500]
+"""
+import argparse
+
+from app.core.database import SessionLocal
+from app.services.notification_archive import archive_notifications
+
+
+def main(days=None, batch_size=None):
+    db = SessionLocal()
+    try:
+        stats = archive_notifications(db, retention_days=days, batch_size=batch_size, pause=0.05)
+        print(f"Archived {stats['moved']} notifications in {stats['batches']} batches ({stats['seconds']}s).")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+    main(args.days, args.batch_size)
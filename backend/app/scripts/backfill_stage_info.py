@@ -1,23 +1,14 @@
 from app.core.database import SessionLocal
-from app.models.property import PropertyStage
-from app.models.stage_info import StageInfo
-from app.models.user import UserRole
+from app.services.backfills import BACKFILLS, run_backfill
 
 def backfill_stage_info():
+    # Batched and resumable; same as `python -m app.scripts.run_backfill stage_info`
     db = SessionLocal()
     try:
-        stages = db.query(PropertyStage).all()
-        count = 0
-        for stage in stages:
-            for role in UserRole:
-                exists = db.query(StageInfo).filter_by(stage=stage.stage, role=role.value).first()
-                if not exists:
-                    db.add(StageInfo(stage=stage.stage, role=role.value, explanation=f"Explain the {stage.stage}"))
-                    count += 1
-        db.commit()
-        print(f"Backfilled {count} stage_info entries.")
+        stats = run_backfill(db, BACKFILLS["stage_info"])
+        print(f"Backfilled {stats['changed']} stage_info entries.")
     finally:
         db.close()
 
 if __name__ == "__main__":
-    backfill_stage_info() 
\ No newline at end of file
+    backfill_stage_info()
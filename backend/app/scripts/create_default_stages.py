@@ -1,5 +1,6 @@
 from app.core.database import SessionLocal
 from app.models.property import PropertyStage
+from app.services.timelines import rank_for_position
 from datetime import datetime
 
 # Define default stages
@@ -30,11 +31,13 @@ def create_default_stages(property_id=1):
                     stage=stage,
                     status=status,
                     description=description,
-                    order=i,
+                    rank=rank_for_position(db, property_id),
                     is_draft=False,
                     created_at=datetime.utcnow(),
                     updated_at=datetime.utcnow()
                 ))
+                # Flush so the next stage is appended after this one
+                db.flush()
         db.commit()
         print(f"Default stages created for property_id={property_id}")
     except Exception as e:
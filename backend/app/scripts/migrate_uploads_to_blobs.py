@@ -0,0 +1,60 @@
+"""Move documents uploaded before the blob store into it.
+
+Each File row still pointing at a loose file is re-pointed at the blob for
+that file's content, so duplicate copies collapse into one. The loose file is
+deleted once nothing points at it any more. Safe to re-run.
+"""
+import os
+
+from app.core.database import SessionLocal
+from app.models.file import File
+from app.services.blobs import blob_store
+from app.services.ingest import CHUNK_SIZE, StagedUpload
+
+
+def stage_existing(path: str) -> StagedUpload:
+    upload = StagedUpload(blob_store.incoming, os.path.basename(path), max_bytes=float("inf"))
+    try:
+        with open(path, "rb") as source:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                upload.write(chunk)
+        upload.finish()
+    except BaseException:
+        upload.discard()
+        raise
+    return upload
+
+
+def migrate_uploads_to_blobs():
+    db = SessionLocal()
+    try:
+        files = db.query(File).order_by(File.id).all()
+        loose_paths = set()
+        for file in files:
+            if blob_store.owns(file.file_path):
+                continue
+            if not file.file_path or not os.path.exists(file.file_path):
+                print(f"File {file.id}: {file.file_path} is missing, skipped")
+                continue
+            upload = stage_existing(file.file_path)
+            try:
+                old_path = file.file_path
+                file.file_path = blob_store.add(db, upload)
+                file.sha256 = upload.sha256
+                file.file_size = upload.size
+                db.commit()
+            finally:
+                upload.discard()
+            loose_paths.add(old_path)
+            print(f"File {file.id}: {old_path} -> {file.file_path}")
+
+        still_used = {path for path, in db.query(File.file_path).filter(File.file_path.in_(loose_paths))}
+        for path in loose_paths - still_used:
+            os.remove(path)
+        print(f"Removed {len(loose_paths - still_used)} loose files")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate_uploads_to_blobs()
@@ -0,0 +1,123 @@
+"""Fill the shard directory, show how properties are spread, and move a firm to another shard.
+
+Usage (from backend/):
+    python -m app.scripts.rebalance_shards --backfill
+    python -m app.scripts.rebalance_shards --list
+    python -m app.scripts.rebalance_shards --firm "Acme Estates" --to 2
+
+--backfill records every property already in the catalog database as being
+on shard 0; run it once before setting SHARD_URLS (with DATABASE_URL first).
+
+Moving a firm copies each of its properties (row, participants, stages) to
+the target shard, points the directory at the copy and pins the firm there,
+then deletes the original. Stages get new ids on the target, and the catalog's
+messages are updated to match. Requests that read a property mid-move see
+the old copy until the directory changes; run it when the firm is quiet, as
+writes to the old copy in that window are lost.
+"""
+import argparse
+
+from sqlalchemy import delete, func, insert, select, update
+
+from app.core.database import SessionLocal, dialect_insert
+from app.core.sharding import shard_router
+from app.models.message import Message
+from app.models.property import Property, PropertyParticipant, PropertyStage
+from app.models.shard import FirmShard, PropertyShard
+from app.services.backfills import BACKFILLS, run_backfill
+
+
+def backfill(db) -> int:
+    """Add a shard 0 directory entry for every catalog property that has none. Returns how many."""
+    return run_backfill(db, BACKFILLS["property_shards"])["changed"]
+
+
+def distribution(db) -> dict:
+    """{shard: number of properties}."""
+    return dict(db.execute(
+        select(PropertyShard.shard, func.count()).group_by(PropertyShard.shard).order_by(PropertyShard.shard)
+    ).all())
+
+
+def _copy_property(source, target, property_id: int) -> dict:
+    """Copy a property, its participants and stages with Core inserts. Returns {old stage id: new stage id}."""
+    prop = source.execute(select(Property.__table__).where(Property.id == property_id)).mappings().first()
+    if prop is None:
+        return {}
+    target.execute(insert(Property.__table__).values(dict(prop)))
+    participants = source.execute(select(PropertyParticipant.__table__).where(
+        PropertyParticipant.property_id == property_id
+    )).mappings().all()
+    if participants:
+        target.execute(insert(PropertyParticipant.__table__), [dict(row) for row in participants])
+    stage_ids = {}
+    for stage in source.execute(select(PropertyStage.__table__).where(
+        PropertyStage.property_id == property_id
+    ).order_by(PropertyStage.id)).mappings():
+        values = {key: value for key, value in stage.items() if key != "id"}
+        stage_ids[stage["id"]] = target.execute(insert(PropertyStage.__table__).values(values)).inserted_primary_key[0]
+    return stage_ids
+
+
+def _delete_property(db, property_id: int):
+    db.execute(delete(PropertyStage).where(PropertyStage.property_id == property_id))
+    db.execute(delete(PropertyParticipant).where(PropertyParticipant.property_id == property_id))
+    db.execute(delete(Property).where(Property.id == property_id))
+
+
+def move_firm(db, firm: str, shard: int) -> int:
+    """Move every property placed by `firm` to `shard` and pin the firm there. Returns how many moved."""
+    if not 0 <= shard < shard_router.count:
+        raise ValueError(f"There is no shard {shard}; {shard_router.count} are configured")
+    entries = db.execute(select(PropertyShard.property_id, PropertyShard.shard).where(
+        PropertyShard.firm == firm, PropertyShard.shard != shard
+    )).all()
+    target = shard_router.session(shard)
+    try:
+        for property_id, source_shard in entries:
+            source = shard_router.session(source_shard)
+            try:
+                # Copy, then repoint (the copy is invisible until now), then remove the original
+                stage_ids = _copy_property(source, target, property_id)
+                target.commit()
+                for old_id, new_id in stage_ids.items():
+                    db.execute(update(Message).where(
+                        Message.property_id == property_id, Message.stage_id == old_id
+                    ).values(stage_id=new_id))
+                db.execute(update(PropertyShard).where(PropertyShard.property_id == property_id).values(shard=shard))
+                db.commit()
+                _delete_property(source, property_id)
+                source.commit()
+            finally:
+                source.close()
+    finally:
+        target.close()
+    pin = dialect_insert(db, FirmShard).values(firm=firm, shard=shard)
+    db.execute(pin.on_conflict_do_update(index_elements=[FirmShard.firm], set_={"shard": shard, "updated_at": func.now()}))
+    db.commit()
+    return len(entries)
+
+
+def main(backfill_directory=False, firm=None, shard=None):
+    db = SessionLocal()
+    try:
+        if backfill_directory:
+            print(f"Added {backfill(db)} properties to the shard directory.")
+        if firm is not None:
+            print(f"Moved {move_firm(db, firm, shard)} properties of {firm} to shard {shard}.")
+        for number, count in distribution(db).items():
+            print(f"shard {number}: {count} properties")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backfill", action="store_true")
+    parser.add_argument("--list", action="store_true", help="only show the distribution (the default)")
+    parser.add_argument("--firm", default=None)
+    parser.add_argument("--to", type=int, default=None, dest="shard")
+    args = parser.parse_args()
+    if (args.firm is None) != (args.shard is None):
+        parser.error("--firm and --to go together")
+    main(args.backfill, args.firm, args.shard)
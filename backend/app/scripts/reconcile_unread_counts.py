@@ -0,0 +1,20 @@
+"""Repair unread notification counters that have drifted from the notifications table.
+
+Safe to run at any time (e.g. nightly from cron); counters that already
+match are left alone.
+"""
+from app.core.database import SessionLocal
+from app.services.unread_counts import reconcile_unread_counts
+
+
+def main():
+    db = SessionLocal()
+    try:
+        stats = reconcile_unread_counts(db)
+        print(f"Checked {stats['counters']} unread counters, repaired {stats['repaired']}.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
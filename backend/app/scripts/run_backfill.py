@@ -0,0 +1,43 @@
+"""Run a batched backfill against the live database, resuming where the last run stopped.
+
+Usage (from backend/):
+    python -m app.scripts.run_backfill --list
+    python -m app.scripts.run_backfill stage_info [--batch-size 500] [--pause 0.05] [--dry-run] [--restart]
+"""
+import argparse
+
+from sqlalchemy import select
+
+from app.core.database import SessionLocal
+from app.models.backfill import BackfillCheckpoint
+from app.services.backfills import BACKFILLS, run_backfill
+
+
+def main(name=None, batch_size=None, pause=None, dry_run=False, restart=False):
+    db = SessionLocal()
+    try:
+        if name is None:
+            checkpoints = {row.name: row for row in db.execute(select(BackfillCheckpoint)).scalars()}
+            for known in BACKFILLS:
+                checkpoint = checkpoints.get(known)
+                progress = f"{checkpoint.status}, {checkpoint.rows} rows up to key {checkpoint.last_key}" if checkpoint else "never run"
+                print(f"{known}: {progress}")
+            return
+        stats = run_backfill(db, BACKFILLS[name], batch_size=batch_size, pause=pause, dry_run=dry_run, restart=restart)
+        verb = "Would write" if dry_run else "Wrote"
+        print(f"{verb} {stats['changed']} rows for {name} over {stats['rows']} rows in {stats['batches']} batches "
+              f"({stats['seconds']}s, resumed from key {stats['resumed_from']}).")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("name", nargs="?", choices=sorted(BACKFILLS))
+    parser.add_argument("--list", action="store_true", help="show every backfill's progress (the default)")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--pause", type=float, default=None, help="seconds between batches")
+    parser.add_argument("--dry-run", action="store_true", help="apply each batch and roll it back")
+    parser.add_argument("--restart", action="store_true", help="ignore an unfinished run's checkpoint")
+    args = parser.parse_args()
+    main(args.name, args.batch_size, args.pause, args.dry_run, args.restart)
@@ -0,0 +1,147 @@
+"""Batched, resumable data backfills that can run against the live database.
+
+A backfill walks a table in key order, `batch_size` rows at a time. Each
+batch is changed and committed in its own short transaction, so SQLite's
+write lock is only ever held for one batch, and the runner pauses between
+batches to let request traffic in. The batch's position is written to
+`backfill_checkpoints` in the same transaction as its changes, so a run that
+is interrupted resumes after the last committed batch rather than starting
+over; a finished backfill starts from the beginning the next time it runs.
+
+Every backfill here is idempotent: re-running one over rows it has already
+done changes nothing. Schema changes stay in alembic migrations; a backfill
+fills or fixes the data around them.
+
+Usage: `python -m app.scripts.run_backfill <name>` (see `BACKFILLS`).
+"""
+import time
+from typing import Optional, Sequence
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import dialect_insert
+from app.models.backfill import BackfillCheckpoint
+from app.models.property import PARTICIPANT_COLUMNS, Property, PropertyParticipant, PropertyStage, participant_rows
+from app.models.shard import PropertyShard
+from app.models.user import User
+from app.services.timelines import ensure_stage_info
+
+
+class Backfill:
+    """A data change applied in keyset-ordered batches.
+
+    Subclasses set `name`, select the rows to visit in `query()` and change
+    them in `apply()`. The query's first column is the batching key: an
+    integer column, usually the primary key.
+    """
+    name: str
+
+    def query(self):
+        raise NotImplementedError
+
+    def apply(self, db: Session, rows: Sequence) -> int:
+        """Change one batch without committing. Returns how many rows were written."""
+        raise NotImplementedError
+
+
+class StageInfoBackfill(Backfill):
+    """Placeholder StageInfo rows for every role of every stage name in use."""
+    name = "stage_info"
+
+    def query(self):
+        return select(PropertyStage.id, PropertyStage.stage)
+
+    def apply(self, db, rows):
+        return ensure_stage_info(db, {row.stage for row in rows})
+
+
+class ParticipantsBackfill(Backfill):
+    """Rebuild `property_participants` from the Property foreign keys, e.g. after they were edited by hand."""
+    name = "property_participants"
+
+    def query(self):
+        return select(Property.id, *(getattr(Property, column) for column in PARTICIPANT_COLUMNS.values()))
+
+    def apply(self, db, rows):
+        db.execute(delete(PropertyParticipant).where(PropertyParticipant.property_id.in_([row.id for row in rows])))
+        participants = [participant for row in rows for participant in participant_rows(row)]
+        if participants:
+            db.execute(insert(PropertyParticipant), participants)
+        return len(participants)
+
+
+class ShardDirectoryBackfill(Backfill):
+    """A shard 0 directory entry for every property in this database that has none."""
+    name = "property_shards"
+
+    def query(self):
+        return select(Property.id, User.company_name).outerjoin(User, User.id == Property.estate_agent_id)
+
+    def apply(self, db, rows):
+        if not rows:
+            return 0
+        return db.execute(dialect_insert(db, PropertyShard).values([
+            {"property_id": row.id, "shard": 0, "firm": row.company_name} for row in rows
+        ]).on_conflict_do_nothing(index_elements=[PropertyShard.property_id])).rowcount
+
+
+BACKFILLS = {backfill.name: backfill for backfill in (StageInfoBackfill(), ParticipantsBackfill(), ShardDirectoryBackfill())}
+
+
+def _save_checkpoint(db: Session, name: str, last_key: int, rows: int, changed: int, batches: int, status: str):
+    values = {"last_key": last_key, "rows": rows, "changed": changed, "batches": batches, "status": status}
+    upsert = dialect_insert(db, BackfillCheckpoint).values(name=name, **values)
+    db.execute(upsert.on_conflict_do_update(
+        index_elements=[BackfillCheckpoint.name], set_={**values, "updated_at": func.now()},
+    ))
+
+
+def run_backfill(db: Session, backfill: Backfill, batch_size: int = None, pause: float = None,
+                 dry_run: bool = False, restart: bool = False, max_batches: Optional[int] = None) -> dict:
+    """Run `backfill` batch by batch, resuming from its checkpoint unless it finished or `restart` is set.
+
+    A dry run applies each batch and rolls it back: it reports what would
+    change and writes nothing, checkpoints included. (Each batch sees none
+    of the earlier ones' writes, so overlapping writes are counted again.) `max_batches` stops
+    early (the checkpoint keeps the position for the next run).
+    Returns rows visited, rows written, batches, seconds, where the run
+    resumed from and whether it reached the end.
+    """
+    batch_size = batch_size or settings.BACKFILL_BATCH_SIZE
+    pause = settings.BACKFILL_PAUSE_SECONDS if pause is None else pause
+    checkpoint = db.get(BackfillCheckpoint, backfill.name)
+    after = rows = changed = batches = 0
+    if checkpoint is not None and checkpoint.status == "running" and not restart:
+        after, rows, changed, batches = checkpoint.last_key, checkpoint.rows, checkpoint.changed, checkpoint.batches
+    db.rollback()  # don't hold the read transaction open across batches
+    resumed_from = after
+    started = time.perf_counter()
+    done = False
+    run_batches = 0
+    while max_batches is None or run_batches < max_batches:
+        query = backfill.query()
+        key = query.selected_columns[0]
+        batch = db.execute(query.where(key > after).order_by(key).limit(batch_size)).all()
+        if not batch:
+            done = True
+            if not dry_run:
+                _save_checkpoint(db, backfill.name, after, rows, changed, batches, "done")
+                db.commit()
+            break
+        changed += backfill.apply(db, batch)
+        after = batch[-1][0]
+        rows += len(batch)
+        batches += 1
+        run_batches += 1
+        if dry_run:
+            db.rollback()
+        else:
+            _save_checkpoint(db, backfill.name, after, rows, changed, batches, "running")
+            db.commit()
+        if pause:
+            time.sleep(pause)  # let other writers in between batches
+    seconds = round(time.perf_counter() - started, 3)
+    return {"name": backfill.name, "rows": rows, "changed": changed, "batches": batches, "seconds": seconds,
+            "resumed_from": resumed_from, "done": done, "dry_run": dry_run}
@@ -0,0 +1,263 @@
+"""Content-addressed document storage.
+
+Every uploaded file is stored once, under a key derived from its SHA-256
+(`ab/cd/abcd...`), so re-uploading the same document costs a row, not
+another copy, and no two uploads can overwrite each other. Two levels of
+256-way sharding keep every directory small. Where the keys live is up to
+the configured `Storage` (app/services/storage.py).
+
+The `blobs` table counts the File rows pointing at each blob. Uploads take a
+reference before the file is moved into place and deleting a File gives it
+back; the collector later removes blobs nobody references, along with files
+on disk that never got a row (an upload that failed after writing).
+
+Ordering keeps the two consistent without a lock: an upload bumps the count
+(and so holds the row's write lock) before it checks whether the blob file
+exists, and the collector deletes the row and the stored file in the same
+transaction, so an upload either sees the blob before collection or writes
+it again afterwards. An upload reusing a stored file touches it, so its
+not-yet-committed row is covered by the grace period, and the collector
+re-checks for a row just before removing a file it thinks is stray.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, func, select, update
+from sqlalchemy import event as sa_event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.core.database import SessionLocal, dialect_insert
+from app.core.downloads import document_response
+from app.models.blob import Blob
+from app.models.file import File
+from app.services.ingest import StagedUpload
+from app.services.storage import Storage, create_storage
+
+logger = logging.getLogger(__name__)
+
+
+def blob_key(sha256: str) -> str:
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+class BlobStore:
+    def __init__(self, storage: Storage):
+        self.storage = storage
+
+    @property
+    def incoming(self) -> str:
+        """Where uploads are staged before they are stored."""
+        return self.storage.staging_dir
+
+    def path_for(self, sha256: str) -> str:
+        """The File.file_path of a blob."""
+        return self.storage.locate(blob_key(sha256))
+
+    def owns(self, path: Optional[str]) -> bool:
+        return self.storage.key_for(path) is not None
+
+    def _acquire(self, db, upload: StagedUpload):
+        insert = dialect_insert(db, Blob).values(sha256=upload.sha256, size=upload.size, ref_count=1)
+        return insert.on_conflict_do_update(
+            index_elements=[Blob.sha256],
+            set_={"ref_count": Blob.ref_count + 1, "updated_at": func.now()},
+        )
+
+    def _place(self, upload: StagedUpload) -> str:
+        key = blob_key(upload.sha256)
+        if self.storage.exists(key):
+            # Already stored: drop the new copy, and refresh the stored one's
+            # mtime so the collector leaves it alone until this row commits
+            self.storage.touch(key)
+            upload.discard()
+        else:
+            self.storage.put(upload, key)
+        return self.storage.locate(key)
+
+    def add(self, db: Session, upload: StagedUpload) -> str:
+        """Take a reference to the upload's blob, storing it if it's new. Returns its path.
+
+        The reference is part of `db`'s transaction; if that rolls back, the
+        stored file is left for the collector.
+        """
+        db.execute(self._acquire(db, upload))
+        return self._place(upload)
+
+    async def add_async(self, db: AsyncSession, upload: StagedUpload) -> str:
+        await db.execute(self._acquire(db, upload))
+        return await run_in_threadpool(self._place, upload)
+
+    def collect(self, db: Session, grace_seconds: int = None) -> dict:
+        """Delete unreferenced blobs and stray files older than `grace_seconds`."""
+        grace = settings.BLOB_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        cutoff = datetime.utcnow() - timedelta(seconds=grace)
+        removed_blobs = 0
+        candidates = db.execute(
+            select(Blob.sha256).where(Blob.ref_count == 0, Blob.updated_at <= cutoff)
+        ).scalars().all()
+        for sha256 in candidates:
+            # Re-checked in the DELETE: an upload may have taken a reference since
+            deleted = db.execute(
+                Blob.__table__.delete().where(Blob.sha256 == sha256, Blob.ref_count == 0)
+            ).rowcount
+            if deleted:
+                self.storage.delete(blob_key(sha256))
+                removed_blobs += 1
+            db.commit()
+
+        removed_files = 0
+        threshold = time.time() - grace
+        # Stored files without a row (an upload that failed after storing)
+        known = None
+        for key, modified in self.storage.list():
+            if modified > threshold:
+                continue
+            if known is None:
+                known = set(db.execute(select(Blob.sha256)).scalars())
+            sha256 = key.rsplit("/", 1)[-1]
+            if sha256 in known:
+                continue
+            # The snapshot may predate an upload's row; look again in a fresh transaction
+            db.rollback()
+            if db.execute(select(Blob.sha256).where(Blob.sha256 == sha256)).first() is None:
+                self.storage.delete(key)
+                removed_files += 1
+        # Staged uploads that were never stored
+        if os.path.isdir(self.incoming):
+            for name in os.listdir(self.incoming):
+                path = os.path.join(self.incoming, name)
+                try:
+                    if os.path.getmtime(path) <= threshold:
+                        os.remove(path)
+                        removed_files += 1
+                except FileNotFoundError:
+                    continue
+        return {"blobs": removed_blobs, "files": removed_files}
+
+    async def download(self, request: Request, location: str, *, filename: str, media_type: str,
+                       content_hash: Optional[str] = None, headers: dict = None) -> Response:
+        """Serve a File's contents from wherever they are stored."""
+        key = self.storage.key_for(location)
+        if key is None:
+            # Uploaded before the blob store: a plain local file
+            return await document_response(request, location, filename=filename, media_type=media_type,
+                                           headers=headers)
+        return await self.storage.download(request, key, filename=filename, media_type=media_type,
+                                           content_hash=content_hash, headers=headers)
+
+
+def release_blobs(db: Session, hashes: Iterable[Optional[str]]):
+    """Give back one reference per hash (repeat a hash to release it more than once)."""
+    for stmt in _release_statements(hashes):
+        db.execute(stmt)
+
+
+async def release_blobs_async(db: AsyncSession, hashes: Iterable[Optional[str]]):
+    for stmt in _release_statements(hashes):
+        await db.execute(stmt)
+
+
+def _release_statements(hashes):
+    counts = {}
+    for sha256 in hashes:
+        if sha256:
+            counts[sha256] = counts.get(sha256, 0) + 1
+    # One UPDATE per distinct count, usually just one
+    by_count = {}
+    for sha256, count in counts.items():
+        by_count.setdefault(count, []).append(sha256)
+    for count, group in by_count.items():
+        yield update(Blob).where(Blob.sha256.in_(group)).values(
+            ref_count=case((Blob.ref_count > count, Blob.ref_count - count), else_=0),
+            updated_at=func.now(),
+        )
+
+
+_PENDING_REMOVALS = "pending_file_removals"
+
+
+def _remove_after_commit(db, path: Optional[str]):
+    if path:
+        session = db.sync_session if isinstance(db, AsyncSession) else db
+        session.info.setdefault(_PENDING_REMOVALS, []).append(path)
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _remove_pending_files(session):
+    for path in session.info.pop(_PENDING_REMOVALS, ()):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.exception("Failed to remove %s", path)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_pending_removals(session):
+    session.info.pop(_PENDING_REMOVALS, None)
+
+
+def release_file(db: Session, file: File):
+    """Release a File's blob, or (once `db` commits) delete its file if it predates the blob store."""
+    if blob_store.owns(file.file_path):
+        release_blobs(db, [file.sha256])
+    else:
+        _remove_after_commit(db, file.file_path)
+
+
+async def release_file_async(db: AsyncSession, file: File):
+    if blob_store.owns(file.file_path):
+        await release_blobs_async(db, [file.sha256])
+    else:
+        _remove_after_commit(db, file.file_path)
+
+
+class BlobCollector:
+    """Runs `BlobStore.collect` every `interval` seconds on a daemon thread."""
+
+    def __init__(self, store: BlobStore, interval: float, session_factory=SessionLocal):
+        self.store = store
+        self.interval = interval
+        self.session_factory = session_factory
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="blob-collector", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def run_once(self) -> Optional[dict]:
+        db = self.session_factory()
+        try:
+            stats = self.store.collect(db)
+            if stats["blobs"] or stats["files"]:
+                logger.info("Blob collector removed %(blobs)s blobs and %(files)s stray files", stats)
+            return stats
+        except Exception:
+            db.rollback()
+            logger.exception("Blob collection failed")
+            return None
+        finally:
+            db.close()
+
+    def stop(self):
+        self._stop.set()
+
+
+blob_store = BlobStore(create_storage())
+blob_collector = BlobCollector(blob_store, interval=settings.BLOB_GC_INTERVAL_SECONDS)
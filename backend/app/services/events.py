@@ -0,0 +1,339 @@
+"""Realtime property events pushed to WebSocket subscribers.
+
+Handlers call `publish_after_commit` while they build a transaction; the
+events go out only once that transaction commits, and are dropped on
+rollback, so a client never hears about a change it can't then read back.
+
+The hub keeps a short replay buffer per property so a client reconnecting
+with the last event ID it saw gets what it missed. Each subscriber has a
+bounded queue; one that falls behind is disconnected rather than letting its
+queue grow, and resumes from its last event ID when it reconnects.
+
+Events travel through an `EventBackend`. The in-memory backend only reaches
+this process; the Redis backend fans events out to every worker.
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Sent instead of a replay when the events after `last_event_id` are gone
+RESYNC = "resync"
+
+_STOP = object()
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    property_id: int
+    type: str
+    data: dict = field(default_factory=dict)
+    # User IDs allowed to see the event; None means every participant
+    audience: Optional[Tuple[int, ...]] = None
+    created_at: str = ""
+
+    def to_message(self) -> dict:
+        return {"id": self.id, "type": self.type, "property_id": self.property_id,
+                "data": self.data, "created_at": self.created_at}
+
+    def to_json(self) -> str:
+        return json.dumps({**self.to_message(), "audience": self.audience})
+
+    @classmethod
+    def from_json(cls, payload) -> "Event":
+        raw = json.loads(payload)
+        audience = raw.get("audience")
+        return cls(id=raw["id"], property_id=raw["property_id"], type=raw["type"], data=raw["data"],
+                   audience=tuple(audience) if audience is not None else None, created_at=raw["created_at"])
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class EventBackend(ABC):
+    """Carries published events to the hub of every worker, this one included."""
+
+    def start(self, deliver: Callable[[Event], None]):
+        self._deliver = deliver
+
+    @abstractmethod
+    def publish(self, property_id: int, type: str, data: dict, audience: Optional[Tuple[int, ...]]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def last_id(self) -> int:
+        """The most recently assigned event ID."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryEventBackend(EventBackend):
+    """Single-process backend.
+
+    IDs start from the current time in microseconds, so they keep increasing
+    across restarts and a client resuming from a previous process's ID is
+    told to resync instead of silently missing events.
+    """
+
+    def __init__(self):
+        self._last_id = time.time_ns() // 1000
+        self._lock = threading.Lock()
+
+    def publish(self, property_id, type, data, audience):
+        with self._lock:
+            self._last_id += 1
+            event = Event(self._last_id, property_id, type, data, audience, _now())
+        self._deliver(event)
+
+    def last_id(self) -> int:
+        with self._lock:
+            return self._last_id
+
+
+class RedisEventBackend(EventBackend):
+    """Shares events between workers over Redis pub/sub.
+
+    IDs come from a Redis counter so they are ordered across workers, and every
+    worker fills its own replay buffer from the channel.
+
+    `publish` runs in a commit hook, sometimes on the event loop's thread, so
+    it only queues the event; a single sender thread makes the Redis round
+    trips, in order. If Redis is slow or down the outbox fills and further
+    events are dropped (clients refetch on reconnect) rather than blocking.
+    """
+
+    def __init__(self, url: str, channel: str = "property-events", outbox_size: int = 10000):
+        import redis  # only needed when running more than one worker
+
+        self._client = redis.Redis.from_url(url)
+        self._channel = channel
+        self._sequence = f"{channel}:seq"
+        self._listener = None
+        self._outbox = queue.Queue(outbox_size)
+        self._sender = None
+        self._sender_lock = threading.Lock()
+
+    def start(self, deliver):
+        super().start(deliver)
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self._channel: self._on_message})
+        self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def _on_message(self, message):
+        try:
+            self._deliver(Event.from_json(message["data"]))
+        except Exception:
+            logger.exception("Dropped malformed event from %s", self._channel)
+
+    def publish(self, property_id, type, data, audience):
+        if self._sender is None:
+            with self._sender_lock:
+                if self._sender is None:
+                    self._sender = threading.Thread(target=self._send, name="events-redis", daemon=True)
+                    self._sender.start()
+        try:
+            self._outbox.put_nowait((property_id, type, data, audience, _now()))
+        except queue.Full:
+            logger.warning("Redis event outbox is full; dropped %s event for property %s", type, property_id)
+
+    def _send(self):
+        while True:
+            item = self._outbox.get()
+            if item is _STOP:
+                return
+            property_id, type, data, audience, created_at = item
+            try:
+                event = Event(self._client.incr(self._sequence), property_id, type, data, audience, created_at)
+                self._client.publish(self._channel, event.to_json())
+            except Exception:
+                logger.exception("Failed to publish %s event for property %s", type, property_id)
+
+    def last_id(self) -> int:
+        return int(self._client.get(self._sequence) or 0)
+
+    def close(self, timeout: float = 10):
+        if self._sender is not None:
+            try:
+                self._outbox.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            self._sender.join(timeout)
+        if self._listener is not None:
+            self._listener.stop()
+        self._client.close()
+
+
+class Subscription:
+    """One WebSocket's view of a property's events.
+
+    `get` returns None once the subscriber has fallen more than `maxsize`
+    events behind; the caller should then disconnect it.
+    """
+
+    def __init__(self, property_id: int, user_id: int, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.property_id = property_id
+        self.user_id = user_id
+        self.loop = loop
+        self.overflowed = False
+        self._queue = asyncio.Queue(maxsize)
+
+    def accepts(self, event: Event) -> bool:
+        return event.audience is None or self.user_id in event.audience
+
+    def _offer(self, event: Optional[Event]):
+        # Runs on the subscriber's event loop
+        if self.overflowed:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(None)
+
+    async def get(self) -> Optional[Event]:
+        return await self._queue.get()
+
+
+class EventHub:
+    """Per-property fan-out with a bounded replay buffer."""
+
+    def __init__(self, backend: EventBackend, replay_size: int = 256, queue_size: int = 100):
+        self.backend = backend
+        self.replay_size = replay_size
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, set] = defaultdict(set)
+        self._history: Dict[int, deque] = defaultdict(lambda: deque(maxlen=self.replay_size))
+        self._evicted: Dict[int, int] = {}  # property_id -> newest event ID dropped from the buffer
+        # Anything before this ID was published before the hub started listening
+        self._horizon = backend.last_id()
+        backend.start(self._deliver)
+
+    def publish(self, property_id: int, type: str, data: dict = None, audience: Iterable[int] = None):
+        self.backend.publish(property_id, type, data or {},
+                             tuple(sorted(set(audience))) if audience is not None else None)
+
+    def _deliver(self, event: Event):
+        # Called by the backend, on whichever thread published or received the event
+        with self._lock:
+            history = self._history[event.property_id]
+            if len(history) == history.maxlen:
+                self._evicted[event.property_id] = history[0].id
+            history.append(event)
+            subscribers = [s for s in self._subscribers.get(event.property_id, ()) if s.accepts(event)]
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._offer, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down without unsubscribing
+                self.unsubscribe(subscription)
+
+    def subscribe(self, property_id: int, user_id: int, last_event_id: Optional[int] = None) -> Subscription:
+        """Register a subscriber; call from the event loop that will read it.
+
+        With `last_event_id`, buffered events after it are queued first. If
+        some of them have already left the buffer, a single 'resync' event is
+        queued instead, telling the client to refetch over HTTP.
+        """
+        subscription = Subscription(property_id, user_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                missed = [e for e in self._history.get(property_id, ()) if e.id > last_event_id]
+                replay = [e for e in missed if subscription.accepts(e)]
+                oldest_kept = max(self._evicted.get(property_id, 0), self._horizon)
+                if last_event_id < oldest_kept or len(replay) >= self.queue_size:
+                    replay = [Event(missed[-1].id if missed else last_event_id, property_id, RESYNC,
+                                    created_at=_now())]
+                for event in replay:
+                    subscription._offer(event)
+            self._subscribers[property_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.property_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.property_id]
+
+    def subscriber_count(self, property_id: int) -> int:
+        with self._lock:
+            return len(self._subscribers.get(property_id, ()))
+
+    def clear(self):
+        """Forget buffered events (subscribers are kept)."""
+        with self._lock:
+            self._history.clear()
+            self._evicted.clear()
+            self._horizon = self.backend.last_id()
+
+    def shutdown(self):
+        self.backend.close()
+
+
+_PENDING_EVENTS = "pending_events"
+
+
+def publish_after_commit(db, property_id: int, type: str, data: dict = None, audience: Iterable[int] = None):
+    """Queue an event to publish once `db`'s current transaction commits."""
+    session = db.sync_session if isinstance(db, AsyncSession) else db
+    session.info.setdefault(_PENDING_EVENTS, []).append(
+        (property_id, type, data, list(audience) if audience is not None else None)
+    )
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _publish_pending_events(session):
+    for args in session.info.pop(_PENDING_EVENTS, ()):
+        try:
+            event_hub.publish(*args)
+        except Exception:
+            # The data is committed; a lost event only costs clients a refetch
+            logger.exception("Failed to publish %s event for property %s", args[1], args[0])
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_pending_events(session):
+    session.info.pop(_PENDING_EVENTS, None)
+
+
+BACKENDS = {
+    "memory": lambda: MemoryEventBackend(),
+    "redis": lambda: RedisEventBackend(settings.EVENTS_REDIS_URL, outbox_size=settings.EVENTS_OUTBOX_SIZE),
+}
+
+
+def create_backend(name: str = None) -> EventBackend:
+    name = (name or settings.EVENTS_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown events backend '{name}'. Must be one of: {list(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+event_hub = EventHub(
+    create_backend(),
+    replay_size=settings.EVENTS_REPLAY_SIZE,
+    queue_size=settings.EVENTS_QUEUE_SIZE,
+)
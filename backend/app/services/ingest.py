@@ -0,0 +1,264 @@
+"""Single-pass upload ingest.
+
+The multipart body is read straight off the request stream and the file part
+is written to a temporary file in its destination directory, hashing it
+(SHA-256), counting its size and sniffing its type from the leading bytes as
+it goes. Parsing, hashing and writing run in the threadpool one chunk at a
+time, so an upload holds at most about CHUNK_SIZE bytes in memory and is
+written to disk once. Saving the upload renames the temporary file into
+place, so a partly written file is never visible under its final name.
+"""
+import hashlib
+import mimetypes
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from multipart.multipart import MultipartParser, parse_options_header
+
+from app.core.config import settings
+from app.models.file import DocumentType
+
+CHUNK_SIZE = 1024 * 1024
+MAX_FIELD_BYTES = 64 * 1024  # for the non-file form fields
+MB = 1024 * 1024
+
+# Caps per document type; anything not listed gets settings.UPLOAD_MAX_BYTES
+DOCUMENT_SIZE_LIMITS = {
+    DocumentType.PROOF_OF_ID: 10 * MB,
+    DocumentType.PROOF_OF_ADDRESS: 10 * MB,
+    DocumentType.SOURCE_OF_FUNDS: 10 * MB,
+    DocumentType.EPC: 10 * MB,
+    DocumentType.ENERGY_CERTIFICATE: 10 * MB,
+    DocumentType.PROPERTY_PHOTOS: 50 * MB,
+    DocumentType.SURVEY_REPORT: 50 * MB,
+    DocumentType.LOCAL_AUTHORITY_SEARCH: 50 * MB,
+}
+
+# Leading bytes -> MIME type, checked in order
+MAGIC_NUMBERS = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"{\\rtf", "application/rtf"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/x-ole-storage"),
+]
+SNIFF_BYTES = 16
+# Office documents are zip/OLE containers; their extension says which kind
+CONTAINER_TYPES = {"application/zip", "application/x-ole-storage"}
+
+
+def sniff_mime(head: bytes) -> Optional[str]:
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for magic, mime in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return mime
+    return None
+
+
+def max_upload_bytes(document_type: Optional[str] = None) -> int:
+    """The size cap for a document type, or the largest cap if it isn't known yet."""
+    if document_type is None:
+        return max(settings.UPLOAD_MAX_BYTES, *DOCUMENT_SIZE_LIMITS.values())
+    try:
+        doc_type = DocumentType(document_type.lower())
+    except ValueError:
+        return settings.UPLOAD_MAX_BYTES
+    return DOCUMENT_SIZE_LIMITS.get(doc_type, settings.UPLOAD_MAX_BYTES)
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large. Maximum size is {limit // MB} MB")
+
+
+class StagedUpload:
+    """An uploaded file sitting in a temporary file until it is saved or discarded."""
+
+    def __init__(self, directory: str, filename: str, max_bytes: int):
+        os.makedirs(directory, exist_ok=True)
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.path = None  # set once saved
+        self._hash = hashlib.sha256()
+        self._head = b""
+        fd, self._temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise _too_large(self.max_bytes)
+        if len(self._head) < SNIFF_BYTES:
+            self._head += data[:SNIFF_BYTES - len(self._head)]
+        self._hash.update(data)
+        self._file.write(data)
+
+    def finish(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    @property
+    def staged_path(self) -> str:
+        return self._temp_path
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def content_type(self) -> str:
+        sniffed = sniff_mime(self._head)
+        guessed = mimetypes.guess_type(self.filename)[0]
+        if sniffed is None or (sniffed in CONTAINER_TYPES and guessed):
+            return guessed or "application/octet-stream"
+        return sniffed
+
+    def check_size(self, max_bytes: int):
+        if self.size > max_bytes:
+            raise _too_large(max_bytes)
+
+    def save(self, path: str):
+        """Atomically move the upload to `path` (in the directory it was staged in)."""
+        os.replace(self._temp_path, path)
+        self.path = path
+
+    def discard(self):
+        if not self._file.closed:
+            self._file.close()
+        if self.path is None and os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+
+@dataclass
+class UploadForm:
+    fields: Dict[str, str] = field(default_factory=dict)
+    file: Optional[StagedUpload] = None
+
+
+class _UploadParser:
+    """multipart callbacks that collect the form fields and stream the file part to disk."""
+
+    def __init__(self, directory: str, file_field: str, document_type: Optional[str], charset: str):
+        self.directory = directory
+        self.file_field = file_field
+        self.document_type = document_type
+        self.charset = charset
+        self.form = UploadForm()
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._name = None
+        self._value = None  # bytearray for a form field, None for the file part
+        self._target = None  # StagedUpload receiving the current part, if any
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self):
+        self._disposition = b""
+        self._name = None
+        self._value = None
+        self._target = None
+
+    def on_header_field(self, data, start, end):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if b"name" not in options:
+            raise HTTPException(status_code=400, detail='Multipart part is missing its "name"')
+        self._name = options[b"name"].decode(self.charset, errors="replace")
+        if b"filename" not in options:
+            self._value = bytearray()
+            return
+        if self._name != self.file_field or self.form.file is not None:
+            raise HTTPException(status_code=400, detail=f"Only one file may be uploaded, as '{self.file_field}'")
+        filename = os.path.basename(options[b"filename"].decode(self.charset, errors="replace"))
+        # The document type may follow the file in the form; until it's seen, allow the largest cap
+        document_type = self.document_type or self.form.fields.get("document_type")
+        self.form.file = self._target = StagedUpload(self.directory, filename, max_upload_bytes(document_type))
+
+    def on_part_data(self, data, start, end):
+        if self._target is not None:
+            self._target.write(data[start:end])
+            return
+        self._value += data[start:end]
+        if len(self._value) > MAX_FIELD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Form field '{self._name}' is too large")
+
+    def on_part_end(self):
+        if self._target is not None:
+            self._target.finish()
+            self._target = None
+        elif self._value is not None:
+            self.form.fields[self._name] = self._value.decode(self.charset, errors="replace")
+
+
+async def receive_upload(request: Request, directory: str, document_type: Optional[str] = None,
+                         file_field: str = "file") -> UploadForm:
+    """Read a multipart upload, staging its file part in `directory`.
+
+    `document_type` is the type from the query string, if the endpoint takes
+    it there; otherwise the form's own document_type field picks the cap. The
+    caller must `save` or `discard` the returned file.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+    # Reject an oversized upload before reading any of it (the form's other
+    # parts are small, so the body length is a close upper bound)
+    limit = max_upload_bytes(document_type)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit + MAX_FIELD_BYTES:
+        raise _too_large(limit)
+
+    charset = options.get(b"charset", b"utf-8").decode("latin-1")
+    upload = _UploadParser(directory, file_field, document_type, charset)
+    parser = MultipartParser(options[b"boundary"], upload.callbacks())
+    buffer = bytearray()
+    try:
+        async for chunk in request.stream():
+            buffer += chunk
+            if len(buffer) >= CHUNK_SIZE:
+                await run_in_threadpool(parser.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await run_in_threadpool(parser.write, bytes(buffer))
+        parser.finalize()
+        if upload.form.file is None:
+            raise HTTPException(status_code=422, detail=f"Missing file field '{file_field}'")
+        # Now that every field has arrived, apply the cap for the actual document type
+        upload.form.file.check_size(max_upload_bytes(document_type or upload.form.fields.get("document_type")))
+    except BaseException:
+        if upload.form.file is not None:
+            await run_in_threadpool(upload.form.file.discard)
+        raise
+    return upload.form
@@ -0,0 +1,236 @@
+"""Background moderation of buyer/seller messages.
+
+`send_message` stores a message with approval_status 'moderating' and hands it
+to the pipeline. A bounded worker pool runs the provider (rephrase + moderation)
+and writes filtered_content back, moving the message to 'pending' so it shows
+up in the estate agent's pending list.
+"""
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.sharding import shard_router
+from app.models.message import Message
+from app.models.property import Property
+from app.services.events import publish_after_commit
+
+logger = logging.getLogger(__name__)
+
+MODERATING = "moderating"
+PENDING = "pending"
+
+
+class ModerationProvider(ABC):
+    """Turns a raw message into the filtered text shown to the estate agent."""
+
+    @abstractmethod
+    def filter(self, text: str) -> str:
+        raise NotImplementedError
+
+
+class OpenAIModerationProvider(ModerationProvider):
+    """Rephrases with a chat completion, then runs the moderation endpoint."""
+
+    def filter(self, text: str) -> str:
+        openai.api_key = os.getenv('OPENAI_API_KEY')
+        try:
+            # Always rephrase the message
+            rephrase_prompt = f"""Please rephrase the following message to be more professional and appropriate for a property transaction context. \
+            Keep the main points but make it more formal and business-like:\n\n        Original message: {text}\n\n        Rephrased message:"""
+            rephrase_response = openai.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": "You are a professional real estate communication assistant. Your task is to rephrase messages to be more professional and appropriate for property transactions."},
+                    {"role": "user", "content": rephrase_prompt}
+                ],
+                max_tokens=500,
+                temperature=0.7
+            )
+            rephrased_text = rephrase_response.choices[0].message.content.strip()
+
+            # Extract only the actual rephrased message (after the last colon)
+            if ":" in rephrased_text:
+                rephrased_text = rephrased_text.split(":")[-1].strip()
+
+            # Optionally, check moderation on the rephrased text
+            try:
+                rephrased_check = openai.moderations.create(input=rephrased_text)
+                if not rephrased_check.results[0].flagged:
+                    return rephrased_text
+                else:
+                    return '[Flagged by AI] ' + rephrased_text
+            except Exception as e:
+                logger.warning("OpenAI moderation error: %s", e)
+                return rephrased_text
+
+        except Exception as e:
+            logger.warning("OpenAI rephrasing error: %s", e)
+            return '[AI moderation unavailable] ' + text
+
+
+class StubModerationProvider(ModerationProvider):
+    """Offline provider for tests and benchmarks.
+
+    `latency` seconds of sleep stand in for the OpenAI round-trips.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def filter(self, text: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return f"[Filtered] {text.strip()}"
+
+
+PROVIDERS = {
+    "openai": OpenAIModerationProvider,
+    "stub": StubModerationProvider,
+}
+
+
+class ModerationPipeline:
+    """Bounded worker pool that filters messages and writes the result back.
+
+    At most `max_pending` messages are queued or running. Past that limit
+    `submit` returns False straight away rather than blocking the request: the
+    message stays 'moderating', and once the backlog has drained to half the
+    limit a worker picks up everything left behind with `requeue_stuck`.
+    """
+
+    def __init__(self, provider: ModerationProvider, max_workers: int = 4, max_pending: int = 100,
+                 session_factory=SessionLocal):
+        self.provider = provider
+        self.session_factory = session_factory
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="moderation")
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._idle = threading.Condition()
+        self._in_flight = 0
+        self._queued = set()
+        self._overflowed = False
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def submit(self, message_id: int, text: str) -> bool:
+        """Queue a message for moderation. False if the pipeline is full (it will be requeued later)."""
+        if not self._slots.acquire(blocking=False):
+            with self._idle:
+                self._overflowed = True
+            logger.warning("Moderation queue full; message %s left for requeue", message_id)
+            return False
+        with self._idle:
+            if message_id in self._queued:
+                self._slots.release()
+                return True
+            self._queued.add(message_id)
+            self._in_flight += 1
+        try:
+            self._executor.submit(self._run, message_id, text)
+        except RuntimeError:
+            self._release(message_id)
+            raise
+        return True
+
+    def _run(self, message_id: int, text: str):
+        try:
+            try:
+                filtered = self.provider.filter(text)
+            except Exception as e:
+                logger.warning("Moderation provider failed for message %s: %s", message_id, e)
+                filtered = '[AI moderation unavailable] ' + text
+            db = self.session_factory()
+            try:
+                updated = db.query(Message).filter(
+                    Message.id == message_id,
+                    Message.approval_status == MODERATING
+                ).update({
+                    Message.filtered_content: filtered,
+                    Message.content: filtered,
+                    Message.approval_status: PENDING,
+                }, synchronize_session=False)
+                if updated:
+                    # Now in the estate agent's approval queue
+                    property_id = db.query(Message.property_id).filter(Message.id == message_id).scalar()
+                    with shard_router.reading(db, property_id) as shard_db:
+                        agent_id = shard_db and shard_db.query(Property.estate_agent_id).filter(
+                            Property.id == property_id
+                        ).scalar()
+                    if property_id is not None:
+                        publish_after_commit(db, property_id, "message.pending", {"message_id": message_id},
+                                             audience=[agent_id] if agent_id else [])
+                db.commit()
+            finally:
+                db.close()
+        except Exception:
+            logger.exception("Failed to store moderation result for message %s", message_id)
+        finally:
+            self._release(message_id, requeue=True)
+
+    def _take_overflow(self) -> bool:
+        with self._idle:
+            if self._overflowed and self._in_flight <= self.max_pending // 2 + 1:
+                self._overflowed = False
+                return True
+            return False
+
+    def _release(self, message_id: int, requeue: bool = False):
+        self._slots.release()
+        # Still counted as in flight, so wait_idle also covers the requeue
+        if requeue and self._take_overflow():
+            try:
+                self.requeue_stuck()
+            except Exception:
+                logger.exception("Failed to requeue messages left by a full moderation queue")
+        with self._idle:
+            self._queued.discard(message_id)
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.notify_all()
+
+    def requeue_stuck(self):
+        """Resubmit messages left in 'moderating' by a previous process or a full queue."""
+        db = self.session_factory()
+        try:
+            stuck = db.query(Message.id, Message.original_content).filter(
+                Message.approval_status == MODERATING
+            ).all()
+        finally:
+            db.close()
+        queued = 0
+        for message_id, text in stuck:
+            if not self.submit(message_id, text or ""):
+                break  # full again; the rest wait for the next drain
+            queued += 1
+        return queued
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Block until every submitted message has been written back."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout=timeout)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+def create_provider(name: str = None) -> ModerationProvider:
+    name = (name or settings.MODERATION_PROVIDER).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown moderation provider '{name}'. Must be one of: {list(PROVIDERS)}")
+    return PROVIDERS[name]()
+
+
+moderation_pipeline = ModerationPipeline(
+    create_provider(),
+    max_workers=settings.MODERATION_WORKERS,
+    max_pending=settings.MODERATION_MAX_PENDING,
+)
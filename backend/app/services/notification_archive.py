@@ -0,0 +1,157 @@
+"""Notification retention: move old notifications out of the live table.
+
+Two kinds of notification are archived:
+
+- 'expired': read (by flag or watermark) and older than the retention period,
+- 'closed': every notification of a sold (completed) or withdrawn property.
+
+Each batch of at most `batch_size` rows is copied into `notification_archive`
+as zlib-compressed JSON, one archive row per property, and deleted from
+`notifications` in its own short transaction, so the job never holds
+SQLite's write lock for long. Unread notifications archived with a closed
+property are uncounted from the unread badges in the same transaction.
+Properties live on their shards (app/core/sharding.py), so the closed ones
+are collected from every shard up front rather than joined.
+"""
+import json
+import logging
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
+
+from sqlalchemy import and_, delete, false, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.sharding import shard_router
+from app.models.notification import Notification, NotificationArchive, NotificationReadMark
+from app.models.property import Property, PropertyStatus
+from app.services.unread_counts import is_unread, remove_unread, with_read_marks
+
+logger = logging.getLogger(__name__)
+
+CLOSED_STATUSES = (PropertyStatus.SOLD, PropertyStatus.WITHDRAWN)
+
+
+def _closed_property_ids() -> set:
+    def closed(shard_db):
+        return shard_db.execute(select(Property.id).where(Property.status.in_(CLOSED_STATUSES))).scalars().all()
+    return {property_id for ids in shard_router.fan_out(closed) for property_id in ids}
+
+
+def _archivable(retention_days: int, closed_ids):
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=retention_days)
+    expired = and_(
+        or_(Notification.read == True, Notification.id <= func.coalesce(NotificationReadMark.last_read_id, 0)),
+        Notification.created_at < cutoff,
+    )
+    closed = Notification.property_id.in_(closed_ids) if closed_ids else false()
+    return or_(expired, closed), closed
+
+
+def _serialize(row) -> dict:
+    return {
+        "id": row.id,
+        "user_id": row.user_id,
+        "property_id": row.property_id,
+        "type": row.type,
+        "message": row.message,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "read": not row.unread,
+    }
+
+
+def archive_notifications(db: Session, retention_days: int = None, batch_size: int = None,
+                          pause: float = 0.0) -> dict:
+    """Archive everything eligible, batch by batch. Returns rows moved, batches and seconds taken."""
+    retention_days = settings.NOTIFICATION_RETENTION_DAYS if retention_days is None else retention_days
+    batch_size = batch_size or settings.NOTIFICATION_ARCHIVE_BATCH_SIZE
+    eligible, closed = _archivable(retention_days, _closed_property_ids())
+    started = time.perf_counter()
+    moved = batches = 0
+    after = 0  # keyset: rows that weren't eligible aren't looked at again
+    while True:
+        rows = db.execute(
+            with_read_marks(select(
+                Notification.id, Notification.user_id, Notification.property_id, Notification.type,
+                Notification.message, Notification.created_at,
+                is_unread().label("unread"), closed.label("closed"),
+            )).where(Notification.id > after, eligible)
+            .order_by(Notification.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        groups = {}
+        for row in rows:
+            groups.setdefault((row.property_id, "closed" if row.closed else "expired"), []).append(row)
+        for (property_id, reason), group in groups.items():
+            db.add(NotificationArchive(
+                property_id=property_id,
+                reason=reason,
+                row_count=len(group),
+                first_notification_id=group[0].id,
+                last_notification_id=group[-1].id,
+                payload=zlib.compress(json.dumps([_serialize(row) for row in group]).encode()),
+            ))
+        db.execute(delete(Notification).where(Notification.id.in_([row.id for row in rows])))
+        remove_unread(db, [(row.user_id, row.property_id) for row in rows if row.unread])
+        db.commit()
+        moved += len(rows)
+        batches += 1
+        after = rows[-1].id
+        if pause:
+            time.sleep(pause)  # let other writers in between batches
+    seconds = round(time.perf_counter() - started, 3)
+    return {"moved": moved, "batches": batches, "seconds": seconds}
+
+
+def archived_notifications(db: Session, property_id: int) -> Iterator[dict]:
+    """Every archived notification of a property, oldest batch first."""
+    payloads = db.execute(select(NotificationArchive.payload).where(
+        NotificationArchive.property_id == property_id
+    ).order_by(NotificationArchive.id)).scalars()
+    for payload in payloads:
+        yield from json.loads(zlib.decompress(payload))
+
+
+class NotificationArchiver:
+    """Runs `archive_notifications` every `interval` seconds on a daemon thread."""
+
+    def __init__(self, interval: float, session_factory=SessionLocal):
+        self.interval = interval
+        self.session_factory = session_factory
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="notification-archiver", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def run_once(self) -> Optional[dict]:
+        db = self.session_factory()
+        try:
+            stats = archive_notifications(db, pause=0.05)
+            if stats["moved"]:
+                logger.info("Archived %(moved)s notifications in %(batches)s batches (%(seconds)ss)", stats)
+            return stats
+        except Exception:
+            db.rollback()
+            logger.exception("Notification archiving failed")
+            return None
+        finally:
+            db.close()
+
+    def stop(self):
+        self._stop.set()
+
+
+notification_archiver = NotificationArchiver(interval=settings.NOTIFICATION_ARCHIVE_INTERVAL_SECONDS)
@@ -0,0 +1,242 @@
+"""Notification fan-out, off the request path.
+
+Endpoints describe what happened with `notify_after_commit` and return; once
+their transaction commits the notification goes to a single worker thread,
+which writes every recipient's row in one bulk INSERT, bumps their unread
+counters (app/services/unread_counts.py) in the same transaction and then
+pushes a `notification.created` event. A request's latency no longer depends on how
+many participants a property has.
+
+Notifications given a `summary` are coalesced. The first one is written
+straight away like any other; repeats with the same property, type and
+summary that follow it (e.g. one person uploading ten documents) are held
+until the burst goes quiet for `quiet_seconds`, or for at most
+`coalesce_seconds`, and each recipient then gets a single notification for
+them ("9 documents have been uploaded by ..."). So a lone upload is not
+delayed, and only a burst's repeats wait. Everything else is written on the
+worker's next pass.
+
+Queued and held notifications are in memory, so a crash loses at most those
+not yet written; they are notices, and the underlying change is committed.
+"""
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event as sa_event, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.notification import Notification
+from app.services.events import publish_after_commit
+from app.services.unread_counts import add_unread
+
+logger = logging.getLogger(__name__)
+
+_PENDING_NOTIFICATIONS = "pending_notifications"
+_FLUSH = object()
+_STOP = object()
+
+
+@dataclass(frozen=True)
+class NotificationEvent:
+    property_id: Optional[int]
+    type: str
+    message: str
+    recipients: Tuple[int, ...]
+    # Message for a coalesced burst, with {count}; None to send every notification as it comes
+    summary: Optional[str] = None
+
+
+@dataclass
+class _Burst:
+    first: Optional[NotificationEvent]  # the first held repeat; None until one arrives
+    started: float
+    last: float
+    counts: Dict[int, int] = field(default_factory=dict)  # recipient -> notifications coalesced
+    events: int = 0
+
+    def add(self, event: NotificationEvent, now: float):
+        self.last = now
+        self.events += 1
+        for user_id in event.recipients:
+            self.counts[user_id] = self.counts.get(user_id, 0) + 1
+
+
+def property_recipients(prop, exclude: int = None) -> List[int]:
+    """Everyone on a property's transaction, less `exclude` (usually whoever acted)."""
+    user_ids = [prop.buyer_id, prop.buyer_solicitor_id, prop.seller_solicitor_id, prop.estate_agent_id, prop.seller_id]
+    return list(dict.fromkeys(user_id for user_id in user_ids if user_id and user_id != exclude))
+
+
+class NotificationService:
+    """Single worker that batches notifications into bulk inserts."""
+
+    def __init__(self, session_factory=SessionLocal, coalesce_seconds: float = 60.0, quiet_seconds: float = 10.0,
+                 batch_size: int = 500):
+        self.session_factory = session_factory
+        self.coalesce_seconds = coalesce_seconds
+        self.quiet_seconds = quiet_seconds
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._bursts: Dict[tuple, _Burst] = {}
+        self._idle = threading.Condition()
+        self._depth = 0
+        self._written = 0
+        self._coalesced = 0
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        """Notifications submitted but not yet written, including held bursts."""
+        return self._depth
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._depth,
+            "held_bursts": sum(1 for burst in self._bursts.values() if burst.events),
+            "written": self._written,
+            "coalesced": self._coalesced,
+        }
+
+    def submit(self, event: NotificationEvent):
+        if not event.recipients:
+            return
+        with self._idle:
+            self._depth += 1
+        self._start()
+        self._queue.put(event)
+
+    def _start(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="notifications", daemon=True)
+                    self._thread.start()
+
+    def _deadline(self) -> Optional[float]:
+        if not self._bursts:
+            return None
+        return min(min(b.last + self.quiet_seconds, b.started + self.coalesce_seconds) for b in self._bursts.values())
+
+    def _run(self):
+        while True:
+            deadline = self._deadline()
+            try:
+                item = self._queue.get(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = None
+            items = [] if item is None else [item]
+            # Take whatever else is already queued, so a burst becomes one INSERT
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            now = time.monotonic()
+            ready, done = [], 0
+            force = stop = False
+            for item in items:
+                if item is _FLUSH:
+                    force = True
+                elif item is _STOP:
+                    force = stop = True
+                elif item.summary is None:
+                    ready.append((item, None))
+                else:
+                    key = (item.property_id, item.type, item.summary)
+                    burst = self._bursts.get(key)
+                    if burst is None:
+                        # The first goes out now; only the repeats that follow it are held
+                        self._bursts[key] = _Burst(None, now, now)
+                        ready.append((item, None))
+                    else:
+                        burst.first = burst.first or item
+                        burst.add(item, now)
+            for key, burst in list(self._bursts.items()):
+                if force or now >= min(burst.last + self.quiet_seconds, burst.started + self.coalesce_seconds):
+                    del self._bursts[key]
+                    if burst.events:
+                        ready.append((burst.first, burst))
+            if ready:
+                self._write(ready)
+                done = sum(burst.events if burst else 1 for _, burst in ready)
+            with self._idle:
+                self._depth -= done
+                self._idle.notify_all()
+            if stop:
+                return
+
+    def _write(self, ready: List[Tuple[NotificationEvent, Optional[_Burst]]]):
+        rows = []
+        db = self.session_factory()
+        try:
+            for event, burst in ready:
+                counts = burst.counts if burst else dict.fromkeys(event.recipients, 1)
+                for user_id, count in counts.items():
+                    rows.append({
+                        "user_id": user_id,
+                        "property_id": event.property_id,
+                        "type": event.type,
+                        "message": event.message if count == 1 else event.summary.replace("{count}", str(count)),
+                    })
+                publish_after_commit(db, event.property_id, "notification.created",
+                                     {"type": event.type, **({"count": burst.events} if burst else {})},
+                                     audience=list(counts))
+            db.execute(insert(Notification), rows)
+            add_unread(db, [(row["user_id"], row["property_id"]) for row in rows])
+            db.commit()
+            self._written += len(rows)
+            self._coalesced += sum(burst.events - 1 for _, burst in ready if burst)
+        except Exception:
+            db.rollback()
+            logger.exception("Failed to write %s notifications", len(rows))
+        finally:
+            db.close()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Write everything queued or held now, and wait until it is written."""
+        if self._thread is None:
+            return True
+        self._queue.put(_FLUSH)
+        with self._idle:
+            return self._idle.wait_for(lambda: self._depth == 0, timeout=timeout)
+
+    def shutdown(self, timeout: float = 10):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+
+def notify_after_commit(db, property_id: Optional[int], type: str, message: str, recipients: Iterable[int],
+                        summary: str = None):
+    """Send a notification to `recipients` once `db`'s current transaction commits."""
+    session = db.sync_session if isinstance(db, AsyncSession) else db
+    session.info.setdefault(_PENDING_NOTIFICATIONS, []).append(
+        NotificationEvent(property_id, type, message, tuple(dict.fromkeys(filter(None, recipients))), summary)
+    )
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _submit_pending_notifications(session):
+    for event in session.info.pop(_PENDING_NOTIFICATIONS, ()):
+        notifier.submit(event)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_pending_notifications(session):
+    session.info.pop(_PENDING_NOTIFICATIONS, None)
+
+
+notifier = NotificationService(
+    coalesce_seconds=settings.NOTIFICATION_COALESCE_SECONDS,
+    quiet_seconds=settings.NOTIFICATION_QUIET_SECONDS,
+    batch_size=settings.NOTIFICATION_BATCH_SIZE,
+)
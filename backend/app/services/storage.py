@@ -0,0 +1,249 @@
+"""Where blob contents live.
+
+The blob store (app/services/blobs.py) decides *what* is stored, keyed by
+content hash; a `Storage` decides *where*:
+
+- `LocalStorage`: a directory on this machine, served by the app itself.
+- `OffloadStorage`: the same directory, but downloads are handed to the
+  fronting web server with X-Accel-Redirect (nginx) or X-Sendfile
+  (Apache/lighttpd), so no bytes pass through Python.
+- `S3Storage`: an S3-compatible bucket (AWS, MinIO, ...); downloads redirect
+  to a short-lived presigned URL. Lets several API instances share one store.
+
+Uploads are always staged on local disk first (see app/services/ingest.py);
+`put` then moves or copies the staged file into storage.
+"""
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import RedirectResponse, Response
+
+from app.core.config import settings
+from app.core.downloads import CACHE_CONTROL, document_response
+from app.services.ingest import StagedUpload
+
+INCOMING = "incoming"
+
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+class Storage(ABC):
+    """Interface for blob storage. Keys look like 'ab/cd/abcd...'."""
+
+    #: Local directory uploads are staged in before `put`
+    staging_dir: str
+
+    @abstractmethod
+    def locate(self, key: str) -> str:
+        """The location recorded in File.file_path for a key."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def key_for(self, location: Optional[str]) -> Optional[str]:
+        """The key for a location in this storage, or None if it lies elsewhere."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def touch(self, key: str):
+        """Bump a stored key's modified time, as reported by `list`."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def put(self, upload: StagedUpload, key: str):
+        """Store a staged upload under `key`, consuming it."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def list(self) -> Iterator[Tuple[str, float]]:
+        """Every stored (key, modified time) pair."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def download(self, request: Request, key: str, *, filename: str, media_type: str,
+                       content_hash: Optional[str] = None, headers: dict = None) -> Response:
+        raise NotImplementedError
+
+
+class LocalStorage(Storage):
+    def __init__(self, root: str):
+        self.root = root
+        self.staging_dir = os.path.join(root, INCOMING)
+
+    def locate(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def key_for(self, location):
+        if not location:
+            return None
+        root = os.path.abspath(self.root)
+        path = os.path.abspath(location)
+        if not path.startswith(root + os.sep) or path.startswith(os.path.abspath(self.staging_dir) + os.sep):
+            return None
+        return os.path.relpath(path, root).replace(os.sep, "/")
+
+    def exists(self, key):
+        return os.path.exists(self.locate(key))
+
+    def touch(self, key):
+        try:
+            os.utime(self.locate(key))
+        except FileNotFoundError:
+            pass
+
+    def put(self, upload, key):
+        path = self.locate(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        upload.save(path)
+
+    def delete(self, key):
+        try:
+            os.remove(self.locate(key))
+        except FileNotFoundError:
+            pass
+
+    def list(self):
+        staging = os.path.abspath(self.staging_dir)
+        for directory, _, names in os.walk(self.root):
+            if os.path.abspath(directory) == staging:
+                continue
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    yield self.key_for(path), os.path.getmtime(path)
+                except FileNotFoundError:
+                    continue
+
+    async def download(self, request, key, *, filename, media_type, content_hash=None, headers=None):
+        return await document_response(request, self.locate(key), filename=filename, media_type=media_type,
+                                       content_hash=content_hash, headers=headers)
+
+
+class OffloadStorage(LocalStorage):
+    """Local storage whose downloads are sent by the web server in front of the app.
+
+    nginx needs an `internal` location mapping `internal_prefix` to the store's
+    root; with X-Sendfile the server is given the absolute path instead.
+    """
+
+    HEADERS = {"accel": "X-Accel-Redirect", "sendfile": "X-Sendfile"}
+
+    def __init__(self, root: str, mode: str = "accel", internal_prefix: str = "/protected/"):
+        super().__init__(root)
+        if mode not in self.HEADERS:
+            raise ValueError(f"Unknown offload mode '{mode}'. Must be one of: {list(self.HEADERS)}")
+        self.mode = mode
+        self.internal_prefix = internal_prefix.rstrip("/") + "/"
+
+    async def download(self, request, key, *, filename, media_type, content_hash=None, headers=None):
+        if self.mode == "accel":
+            target = self.internal_prefix + key
+        else:
+            target = os.path.abspath(self.locate(key))
+        # The server adds Content-Length, ranges and conditional handling itself
+        return Response(media_type=media_type, headers={
+            **(headers or {}),
+            self.HEADERS[self.mode]: target,
+            "Content-Disposition": content_disposition(filename),
+            "Cache-Control": CACHE_CONTROL,
+            **({"ETag": f'"{content_hash}"'} if content_hash else {}),
+        })
+
+
+class S3Storage(Storage):
+    """An S3-compatible bucket. Pass `client` to use a preconfigured (or fake) client."""
+
+    def __init__(self, bucket: str, prefix: str = "", client=None, endpoint_url: Optional[str] = None,
+                 presign_seconds: int = 300, staging_dir: Optional[str] = None):
+        if client is None:
+            import boto3  # only needed for the S3 backend
+
+            client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.presign_seconds = presign_seconds
+        self.staging_dir = staging_dir or os.path.join(tempfile.gettempdir(), "blob-staging")
+        self._scheme = f"s3://{bucket}/"
+
+    def _object(self, key):
+        return self.prefix + key
+
+    def locate(self, key):
+        return self._scheme + self._object(key)
+
+    def key_for(self, location):
+        if not location or not location.startswith(self._scheme + self.prefix):
+            return None
+        return location[len(self._scheme + self.prefix):]
+
+    def exists(self, key):
+        listing = self.client.list_objects_v2(Bucket=self.bucket, Prefix=self._object(key), MaxKeys=1)
+        return any(item["Key"] == self._object(key) for item in listing.get("Contents", ()))
+
+    def touch(self, key):
+        # Copying an object onto itself is how S3 refreshes LastModified; the
+        # stored content type doesn't matter, downloads set their own
+        self.client.copy_object(Bucket=self.bucket, Key=self._object(key), MetadataDirective="REPLACE",
+                                CopySource={"Bucket": self.bucket, "Key": self._object(key)})
+
+    def put(self, upload, key):
+        try:
+            # upload_file switches to a multipart upload for large files
+            self.client.upload_file(upload.staged_path, self.bucket, self._object(key),
+                                    ExtraArgs={"ContentType": upload.content_type})
+        finally:
+            upload.discard()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object(key))
+
+    def list(self):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", ()):
+                modified = item["LastModified"]
+                if isinstance(modified, datetime):
+                    modified = modified.replace(tzinfo=modified.tzinfo or timezone.utc).timestamp()
+                yield item["Key"][len(self.prefix):], modified
+
+    async def download(self, request, key, *, filename, media_type, content_hash=None, headers=None):
+        # The bucket serves the bytes (ranges and conditionals included)
+        url = await run_in_threadpool(
+            self.client.generate_presigned_url, "get_object",
+            Params={"Bucket": self.bucket, "Key": self._object(key),
+                    "ResponseContentType": media_type,
+                    "ResponseContentDisposition": content_disposition(filename)},
+            ExpiresIn=self.presign_seconds,
+        )
+        return RedirectResponse(url, status_code=307, headers=headers)
+
+
+def create_storage(name: str = None) -> Storage:
+    name = (name or settings.STORAGE_BACKEND).lower()
+    if name == "local":
+        return LocalStorage(settings.BLOB_STORE_DIR)
+    if name in OffloadStorage.HEADERS:
+        return OffloadStorage(settings.BLOB_STORE_DIR, mode=name, internal_prefix=settings.STORAGE_OFFLOAD_PREFIX)
+    if name == "s3":
+        return S3Storage(settings.S3_BUCKET, prefix=settings.S3_PREFIX, endpoint_url=settings.S3_ENDPOINT_URL,
+                         presign_seconds=settings.DOWNLOAD_URL_TTL_SECONDS)
+    raise ValueError(f"Unknown storage backend '{name}'. Must be one of: ['local', 'accel', 'sendfile', 's3']")
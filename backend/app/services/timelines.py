@@ -0,0 +1,328 @@
+"""Property timelines cloned from stored templates.
+
+A new property's stages are copied from `timeline_template_stages` with one
+INSERT ... SELECT, and the matching StageInfo placeholders are added with one
+INSERT ... SELECT ... ON CONFLICT DO NOTHING. Either way it is a fixed number
+of statements, however many stages the template has. A property on a shard
+gets the same stages from `clone_template_stages`, which reads the template
+in the catalog and writes only the stages to the shard.
+
+The lists below are the seed data. A template is written to the database the
+first time it is cloned, so fresh databases need no separate seeding step.
+
+Stages are ordered by a lexicographic `rank` (app.core.ranking): inserting or
+moving a stage writes only that stage, and a whole new ordering is applied
+with a single UPDATE.
+"""
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import Integer, String, case, cast, false, func, insert, literal, select, true, tuple_, union_all, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.core.database import SessionLocal, dialect_insert
+from app.core.ranking import key_between, spread_keys
+from app.models.property import PropertyStage
+from app.models.stage_info import StageInfo
+from app.models.timeline_template import TimelineTemplate, TimelineTemplateStage
+from app.models.user import UserRole
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE = "standard"
+
+# Ranks longer than this get the property's stages rebalanced in the background
+MAX_RANK_LENGTH = 12
+
+# Preset stages for property conveyancing
+PRESET_STAGES = [
+    {"stage": "Offer Accepted", "responsible_role": "estate_agent", "description": "Initial acceptance of offer by the estate agent"},
+    {"stage": "Buyer ID Verification", "responsible_role": "buyer", "description": "Buyer provides proof of ID and address"},
+    {"stage": "Seller ID Verification", "responsible_role": "seller", "description": "Seller provides proof of ID and address"},
+    {"stage": "Draft Contract Issued", "responsible_role": "seller_solicitor", "description": "Seller's solicitor prepares and issues draft contract"},
+    {"stage": "Searches Ordered", "responsible_role": "buyer_solicitor", "description": "Buyer's solicitor orders property searches"},
+    {"stage": "Searches Received & Reviewed", "responsible_role": "buyer_solicitor", "description": "Buyer's solicitor reviews search results"},
+    {"stage": "Survey Booked", "responsible_role": "buyer", "description": "Buyer arranges property survey"},
+    {"stage": "Survey Completed", "responsible_role": "surveyor", "description": "Surveyor completes property survey"},
+    {"stage": "Mortgage Offer Received", "responsible_role": "buyer", "description": "Buyer receives mortgage offer from lender"},
+    {"stage": "Proof of Funds Verified", "responsible_role": "buyer", "description": "Buyer provides proof of funds"},
+    {"stage": "Enquiries Raised by Buyer's Solicitor", "responsible_role": "buyer_solicitor", "description": "Buyer's solicitor raises enquiries"},
+    {"stage": "Enquiries Answered by Seller's Solicitor", "responsible_role": "seller_solicitor", "description": "Seller's solicitor answers enquiries"},
+    {"stage": "Final Contract Approved", "responsible_role": "both_solicitors", "description": "Both solicitors approve final contract"},
+    {"stage": "Contracts Signed by Buyer & Seller", "responsible_role": "both_parties", "description": "Buyer and seller sign contracts"},
+    {"stage": "Completion Date Agreed", "responsible_role": "both_solicitors", "description": "Both solicitors agree on completion date"},
+    {"stage": "Deposit Paid by Buyer", "responsible_role": "buyer", "description": "Buyer pays deposit to solicitor"},
+    {"stage": "Contracts Exchanged", "responsible_role": "both_solicitors", "description": "Solicitors exchange contracts"},
+    {"stage": "Final Checks & Funds Requested", "responsible_role": "buyer_solicitor", "description": "Buyer's solicitor requests final funds"},
+    {"stage": "Completion Day", "responsible_role": "buyer_solicitor", "description": "Property ownership transfers to buyer"},
+    {"stage": "Keys Released & Registration", "responsible_role": "estate_agent", "description": "Keys released and property registered"}
+]
+
+# Client-facing stage names, as shown by the frontend dashboards
+CLIENT_STAGES = [
+    {"stage": "Offer Accepted", "description": "Initial acceptance of offer (managed by agent)", "responsible": "Agent"},
+    {"stage": "Instruct Solicitor", "description": "Client chooses and formally instructs their solicitor", "responsible": "Client"},
+    {"stage": "Client ID Verification", "description": "Upload proof of ID/address (KYC/AML)", "responsible": "Client"},
+    {"stage": "Draft Contract Issued", "description": "Seller's solicitor issues draft contract", "responsible": "Seller Solicitor"},
+    {"stage": "Searches Ordered", "description": "Solicitor orders property searches", "responsible": "Solicitor"},
+    {"stage": "Searches Received & Reviewed", "description": "Results reviewed, issues flagged", "responsible": "Solicitor"},
+    {"stage": "Survey Booked", "description": "Buyer arranges HomeBuyers or Building Survey (Level 2 / 3)", "responsible": "Client"},
+    {"stage": "Survey Completed", "description": "Report uploaded, issues discussed", "responsible": "Surveyor"},
+    {"stage": "Mortgage Offer Received", "description": "Official mortgage offer from lender, subject to conditions", "responsible": "Client"},
+    {"stage": "Enquiries Raised", "description": "Solicitor queries anything unclear or concerning", "responsible": "Solicitor"},
+    {"stage": "Enquiries Answered", "description": "Seller's solicitor provides responses", "responsible": "Seller Solicitor"},
+    {"stage": "Contract Approved", "description": "Final contract approved by all parties", "responsible": "Solicitor"},
+    {"stage": "Deposit Paid", "description": "Buyer pays deposit to solicitor", "responsible": "Client"},
+    {"stage": "Exchange of Contracts", "description": "Contracts exchanged between solicitors, deal becomes legally binding", "responsible": "Solicitor"},
+    {"stage": "Final Arrangements", "description": "Final arrangements before completion", "responsible": "Client"},
+    {"stage": "Completion", "description": "Full funds transferred, keys released", "responsible": "Solicitor"},
+    {"stage": "Stamp Duty Payment", "description": "Solicitor pays SDLT to HMRC", "responsible": "Solicitor"},
+    {"stage": "Land Registry Submission", "description": "Register buyer as new owner", "responsible": "Solicitor"},
+    {"stage": "Handover Materials Provided", "description": "Manuals, guarantees, alarm codes, Wi-Fi, etc.", "responsible": "Seller"},
+    {"stage": "Final Report to Client", "description": "Summary pack of title, registration, SDLT, warranties etc", "responsible": "Solicitor"},
+]
+
+TEMPLATES = {
+    DEFAULT_TEMPLATE: PRESET_STAGES,
+    "client": CLIENT_STAGES,
+}
+
+
+def seed_template(db: Session, name: str) -> bool:
+    """Write a built-in template to the database unless it is already there.
+
+    Returns True if this call created it.
+    """
+    if name not in TEMPLATES:
+        raise ValueError(f"Unknown timeline template '{name}'. Must be one of: {list(TEMPLATES)}")
+    # Only the session that creates the template row adds its stages; a
+    # concurrent seeder's insert waits on the row and then does nothing
+    template_id = db.execute(
+        dialect_insert(db, TimelineTemplate)
+        .values(name=name)
+        .on_conflict_do_nothing(index_elements=["name"])
+        .returning(TimelineTemplate.id)
+    ).scalar()
+    if template_id is None:
+        return False
+    stages = TEMPLATES[name]
+    db.execute(dialect_insert(db, TimelineTemplateStage), [
+        {
+            "template_id": template_id,
+            "position": position,
+            "rank": rank,
+            "stage": stage["stage"],
+            "description": stage.get("description"),
+            "responsible_role": stage.get("responsible_role"),
+            "responsible": stage.get("responsible"),
+        }
+        for position, (stage, rank) in enumerate(zip(stages, spread_keys(len(stages))))
+    ])
+    return True
+
+
+def _roles():
+    return union_all(*(select(literal(role.value, String).label("role")) for role in UserRole)).subquery()
+
+
+def ensure_stage_info(db: Session, stage_names) -> int:
+    """Add placeholder StageInfo rows for every role of the given stages, keeping existing ones.
+
+    Returns the number of rows added.
+    """
+    stage_names = list(stage_names)
+    if not stage_names:
+        return 0
+    return db.execute(
+        dialect_insert(db, StageInfo).values([
+            {"stage": stage, "role": role.value, "explanation": f"Explain the {stage}"}
+            for stage in stage_names
+            for role in UserRole
+        ]).on_conflict_do_nothing(index_elements=["stage", "role"])
+    ).rowcount
+
+
+def _template_stages(name: str):
+    return (
+        select(TimelineTemplateStage)
+        .join(TimelineTemplate, TimelineTemplate.id == TimelineTemplateStage.template_id)
+        .where(TimelineTemplate.name == name)
+        .subquery()
+    )
+
+
+def clone_template(db: Session, property_id: int, name: str = DEFAULT_TEMPLATE) -> int:
+    """Copy a template's stages onto a property and ensure their StageInfo rows.
+
+    Returns the number of stages created. Does not commit.
+    """
+    stages = _template_stages(name)
+    clone_stmt = (
+        dialect_insert(db, PropertyStage).from_select(
+            ["property_id", "stage", "status", "description", "responsible_role", "responsible", "rank", "is_draft"],
+            select(
+                cast(literal(property_id), Integer),
+                stages.c.stage,
+                literal("pending"),
+                stages.c.description,
+                stages.c.responsible_role,
+                stages.c.responsible,
+                stages.c.rank,
+                false(),
+            ).order_by(stages.c.position),
+        )
+    )
+    clone = db.execute(clone_stmt)
+    if clone.rowcount == 0 and name in TEMPLATES and seed_template(db, name):
+        clone = db.execute(clone_stmt)
+
+    # Placeholder explanations for every (stage, role) pair not cached yet
+    roles = _roles()
+    db.execute(
+        dialect_insert(db, StageInfo).from_select(
+            ["stage", "role", "explanation"],
+            # SQLite needs a WHERE here to tell the upsert's ON CONFLICT from a join's ON
+            select(stages.c.stage, roles.c.role, literal("Explain the ", String) + stages.c.stage)
+            .join(roles, true())
+            .where(true()),
+        ).on_conflict_do_nothing(index_elements=["stage", "role"])
+    )
+    return clone.rowcount
+
+
+def clone_template_stages(db: Session, catalog: Session, property_id: int, name: str = DEFAULT_TEMPLATE) -> int:
+    """Copy a template's stages from the `catalog` onto a property stored in `db` (a shard).
+
+    Templates and StageInfo live only in the catalog, so the template is read
+    (and seeded) there and its StageInfo rows are ensured there; `db` gets
+    just the stages, in one multi-row INSERT. Returns the number of stages
+    created. Commits neither session.
+    """
+    stages = _template_stages(name)
+    query = select(
+        stages.c.stage, stages.c.description, stages.c.responsible_role, stages.c.responsible, stages.c.rank,
+    ).order_by(stages.c.position)
+    rows = catalog.execute(query).all()
+    if not rows and name in TEMPLATES and seed_template(catalog, name):
+        rows = catalog.execute(query).all()
+    if not rows:
+        return 0
+    db.execute(insert(PropertyStage).values([
+        {"property_id": property_id, "status": "pending", "is_draft": False, **row._mapping} for row in rows
+    ]))
+    ensure_stage_info(catalog, {row.stage for row in rows})
+    return len(rows)
+
+
+def _ordered(db: Session, property_id: int, *columns):
+    return (
+        db.query(*columns)
+        .filter(PropertyStage.property_id == property_id)
+        .order_by(PropertyStage.rank, PropertyStage.id)
+    )
+
+
+def rank_for_position(db: Session, property_id: int, position: Optional[int] = None,
+                      exclude_id: Optional[int] = None) -> str:
+    """Rank that puts a stage at `position` (0-based, None for last) among a property's stages.
+
+    Reads at most two neighbouring ranks. `exclude_id` leaves the stage being
+    moved out of the count.
+    """
+    query = _ordered(db, property_id, PropertyStage.rank)
+    if exclude_id is not None:
+        query = query.filter(PropertyStage.id != exclude_id)
+
+    if position is not None and position <= 0:
+        before, after = None, query.limit(1).scalar()
+    else:
+        neighbours = [] if position is None else [r for r, in query.offset(position - 1).limit(2)]
+        if neighbours:
+            before, after = neighbours[0], (neighbours[1] if len(neighbours) > 1 else None)
+        else:
+            # Append: after the current last stage
+            before = query.order_by(None).order_by(PropertyStage.rank.desc(), PropertyStage.id.desc()).limit(1).scalar()
+            after = None
+
+    if before is not None and after is not None and before >= after:
+        # Two stages share a rank (concurrent inserts into the same gap)
+        rebalance_stages(db, property_id)
+        return rank_for_position(db, property_id, position, exclude_id)
+    return key_between(before, after)
+
+
+def stage_position(db: Session, stage: PropertyStage) -> int:
+    """0-based position of a stage in its property's timeline."""
+    return db.query(func.count(PropertyStage.id)).filter(
+        PropertyStage.property_id == stage.property_id,
+        tuple_(PropertyStage.rank, PropertyStage.id) < tuple_(literal(stage.rank, String), stage.id),
+    ).scalar()
+
+
+def apply_order(db: Session, property_id: int, stage_ids: List[int], versions: Optional[Dict[int, int]] = None) -> None:
+    """Give the listed stages fresh, evenly spaced ranks in the listed order, in one UPDATE.
+
+    Every stage's version is bumped, so a request that loaded one before the
+    new ordering gets a 409 when it writes it. With `versions` ({stage id:
+    version}) the UPDATE only applies to stages still at that version. If
+    any listed stage isn't updated, raises StaleDataError.
+    """
+    if not stage_ids:
+        return
+    ranks = dict(zip(stage_ids, spread_keys(len(stage_ids))))
+    stmt = (
+        update(PropertyStage)
+        .where(PropertyStage.property_id == property_id, PropertyStage.id.in_(stage_ids))
+        .values(rank=case(ranks, value=PropertyStage.id), version=PropertyStage.version + 1)
+    )
+    if versions is not None:
+        stmt = stmt.where(PropertyStage.version == case(versions, value=PropertyStage.id))
+    if db.execute(stmt.execution_options(synchronize_session=False)).rowcount != len(stage_ids):
+        raise StaleDataError(f"The stages of property {property_id} were changed by another request")
+    # Stages this session already loaded move with the UPDATE, so its own later writes don't conflict;
+    # one loaded before someone else's change still does
+    for (cls, (stage_id, *_), *_), stage in list(db.identity_map.items()):
+        if cls is PropertyStage and stage_id in ranks and "version" in stage.__dict__:
+            set_committed_value(stage, "rank", ranks[stage_id])
+            set_committed_value(stage, "version", stage.version + 1)
+
+
+def rebalance_stages(db: Session, property_id: int) -> None:
+    """Respace a property's ranks, keeping the current order. Does not commit.
+
+    Conditional on the stage versions it read, like any other stage write:
+    if a stage is moved, added or removed in the meantime this raises
+    StaleDataError instead of writing back the old order over it.
+    """
+    stages = _ordered(db, property_id, PropertyStage.id, PropertyStage.version).with_for_update().all()
+    apply_order(db, property_id, [stage_id for stage_id, _ in stages], versions=dict(stages))
+    count = db.query(func.count(PropertyStage.id)).filter(PropertyStage.property_id == property_id).scalar()
+    if count != len(stages):
+        raise StaleDataError(f"A stage was added to property {property_id} during the rebalance")
+
+
+def rebalance_stages_task(property_id: int, session_factory=SessionLocal, attempts: int = 3) -> None:
+    """Background task: rebalance in a session of its own, starting over if a stage write races it."""
+    for attempt in range(1, attempts + 1):
+        db = session_factory()
+        try:
+            rebalance_stages(db, property_id)
+            db.commit()
+            return
+        except StaleDataError:
+            db.rollback()
+            if attempt == attempts:
+                # The next write that leaves a long rank schedules another
+                logger.info("Gave up rebalancing stages for property %s after %s conflicts", property_id, attempts)
+        except Exception:
+            logger.exception("Failed to rebalance stages for property %s", property_id)
+            db.rollback()
+            return
+        finally:
+            db.close()
+
+
+def needs_rebalance(rank: str) -> bool:
+    return len(rank) > MAX_RANK_LENGTH
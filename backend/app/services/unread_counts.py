@@ -0,0 +1,156 @@
+"""Per-(user, property) unread notification counters and read watermarks.
+
+A notification is unread while its `read` flag is false and its id is above
+the user's watermark for the property (`notification_read_marks`). "Mark all
+read" moves the watermark, one row, so old notifications never need per-row
+writes; `read` is only set for notifications marked one at a time or in bulk.
+
+Every change to a notification's unread state goes through here, in the
+same transaction as the change, so `notification_counters` always matches
+the `notifications` table and badges never need to count rows. Notifications
+without a property aren't counted. `reconcile_unread_counts` recomputes the
+counters from scratch to repair any drift (e.g. rows written by hand).
+"""
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app.core.database import dialect_insert
+from app.models.notification import Notification, NotificationCounter, NotificationReadMark
+
+BATCH_SIZE = 300  # counters per multi-row upsert, well inside SQLite's bound-parameter limit
+
+
+def _set_counters(db: Session, counts: dict, increment: bool):
+    items = list(counts.items())
+    for start in range(0, len(items), BATCH_SIZE):
+        insert = dialect_insert(db, NotificationCounter).values([
+            {"user_id": user_id, "property_id": property_id, "unread": count}
+            for (user_id, property_id), count in items[start:start + BATCH_SIZE]
+        ])
+        unread = NotificationCounter.unread + insert.excluded.unread if increment else insert.excluded.unread
+        db.execute(insert.on_conflict_do_update(
+            index_elements=[NotificationCounter.user_id, NotificationCounter.property_id],
+            set_={"unread": unread},
+        ))
+
+
+def add_unread(db: Session, keys: Iterable[Tuple[int, Optional[int]]]):
+    """Count newly inserted unread notifications, given their (user_id, property_id)."""
+    counts = Counter((user_id, property_id) for user_id, property_id in keys if property_id is not None)
+    _set_counters(db, counts, increment=True)
+
+
+def remove_unread(db: Session, keys: Iterable[Tuple[int, Optional[int]]]):
+    """Uncount notifications that were just marked read, given their (user_id, property_id)."""
+    counts = Counter((user_id, property_id) for user_id, property_id in keys if property_id is not None)
+    for (user_id, property_id), count in counts.items():
+        db.execute(update(NotificationCounter).where(
+            NotificationCounter.user_id == user_id,
+            NotificationCounter.property_id == property_id,
+        ).values(unread=case((NotificationCounter.unread > count, NotificationCounter.unread - count), else_=0)))
+
+
+def read_watermark(db: Session, user_id: int, property_id: int) -> int:
+    """The id up to which the user has read the property's notifications (0 if none)."""
+    return db.execute(select(NotificationReadMark.last_read_id).where(
+        NotificationReadMark.user_id == user_id, NotificationReadMark.property_id == property_id
+    )).scalar() or 0
+
+
+def is_unread():
+    """Whether a notification is unread; needs `with_read_marks`."""
+    return and_(Notification.read == False, Notification.id > func.coalesce(NotificationReadMark.last_read_id, 0))
+
+
+def with_read_marks(stmt):
+    """Outer-join each notification to its recipient's watermark for the property."""
+    return stmt.outerjoin(NotificationReadMark, and_(
+        NotificationReadMark.user_id == Notification.user_id,
+        NotificationReadMark.property_id == Notification.property_id,
+    ))
+
+
+def mark_read(db: Session, user_id: int, notification_ids: Iterable[int]) -> int:
+    """Mark some of a user's notifications read; ids that aren't theirs are ignored.
+
+    Returns how many were unread. The UPDATEs are conditional on `read`, so
+    two requests marking the same notification only uncount it once.
+    """
+    unread = db.execute(with_read_marks(select(Notification.id, Notification.property_id)).where(
+        Notification.id.in_(set(notification_ids)), Notification.user_id == user_id, is_unread()
+    )).all()
+    by_property = {}
+    for notification_id, property_id in unread:
+        by_property.setdefault(property_id, []).append(notification_id)
+    marked = 0
+    for property_id, ids in by_property.items():
+        changed = db.execute(update(Notification).where(
+            Notification.id.in_(ids), Notification.read == False
+        ).values(read=True)).rowcount
+        remove_unread(db, [(user_id, property_id)] * changed)
+        marked += changed
+    return marked
+
+
+def mark_read_up_to(db: Session, user_id: int, property_id: int, notification_id: int) -> int:
+    """Mark everything on a property up to `notification_id` read by moving the watermark.
+
+    Never moves it backwards. The counter is decremented by the unread rows
+    newly covered, like `mark_read`, rather than recounted, so a notification
+    counted by a concurrent fan-out isn't lost. Returns the number of
+    notifications left unread.
+    """
+    db.execute(dialect_insert(db, NotificationReadMark).values(
+        user_id=user_id, property_id=property_id, last_read_id=0
+    ).on_conflict_do_nothing(index_elements=[NotificationReadMark.user_id, NotificationReadMark.property_id]))
+    # Lock the watermark so concurrent moves each uncount their own range once
+    old = db.execute(select(NotificationReadMark.last_read_id).where(
+        NotificationReadMark.user_id == user_id, NotificationReadMark.property_id == property_id
+    ).with_for_update()).scalar()
+    if notification_id > old:
+        db.execute(update(NotificationReadMark).where(
+            NotificationReadMark.user_id == user_id, NotificationReadMark.property_id == property_id
+        ).values(last_read_id=notification_id))
+        covered = db.execute(select(func.count()).select_from(Notification).where(
+            Notification.property_id == property_id,
+            Notification.user_id == user_id,
+            Notification.read == False,
+            Notification.id > old,
+            Notification.id <= notification_id,
+        )).scalar()
+        remove_unread(db, [(user_id, property_id)] * covered)
+    return db.execute(select(NotificationCounter.unread).where(
+        NotificationCounter.user_id == user_id, NotificationCounter.property_id == property_id
+    )).scalar() or 0
+
+
+def forget_property(db: Session, property_id: int):
+    db.execute(delete(NotificationCounter).where(NotificationCounter.property_id == property_id))
+    db.execute(delete(NotificationReadMark).where(NotificationReadMark.property_id == property_id))
+
+
+def unread_counts(db: Session, user_id: int) -> dict:
+    """{property_id: unread} for every property with unread notifications."""
+    rows = db.execute(select(NotificationCounter.property_id, NotificationCounter.unread).where(
+        NotificationCounter.user_id == user_id, NotificationCounter.unread > 0
+    ))
+    return dict(rows.all())
+
+
+def reconcile_unread_counts(db: Session) -> dict:
+    """Rewrite every counter that disagrees with the notifications table."""
+    actual = dict(((user_id, property_id), count) for user_id, property_id, count in db.execute(
+        with_read_marks(select(Notification.user_id, Notification.property_id, func.count()))
+        .where(is_unread(), Notification.property_id.is_not(None))
+        .group_by(Notification.user_id, Notification.property_id)
+    ))
+    stored = dict(((user_id, property_id), unread) for user_id, property_id, unread in db.execute(
+        select(NotificationCounter.user_id, NotificationCounter.property_id, NotificationCounter.unread)
+    ))
+    wrong = {key: actual.get(key, 0) for key in actual.keys() | stored.keys() if actual.get(key, 0) != stored.get(key)}
+    _set_counters(db, wrong, increment=False)
+    db.commit()
+    return {"counters": len(actual.keys() | stored.keys()), "repaired": len(wrong)}
@@ -0,0 +1,132 @@
+"""Concurrent-request latency: sync Session vs AsyncSession inside `async def` routes.
+
+Fires a burst of requests that each run a slow SQLite query while a probe
+keeps hitting a cheap /ping route, and reports latencies for both the old
+pattern (sync `Session` called from an `async def` handler, which blocks the
+event loop) and the new one (`AsyncSession` via aiosqlite).
+
+Keep --requests below 15: with the sync pattern the default QueuePool
+(5 + 10 overflow) runs dry, and the next checkout blocks the event loop that
+would have returned a connection, so the burst stalls for the 30s pool timeout.
+
+Usage (from backend/):
+    python -m benchmarks.bench_async_db [--requests 10] [--rows 300000]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+
+SLOW_QUERY = text(
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < :n) "
+    "SELECT count(*) FROM c"
+)
+
+
+def build_app(db_path: str, rows: int) -> FastAPI:
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool)
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/before")
+    async def before(db: Session = Depends(get_db)):
+        return {"count": db.execute(SLOW_QUERY, {"n": rows}).scalar()}
+
+    @app.get("/after")
+    async def after(db: AsyncSession = Depends(get_async_db)):
+        return {"count": (await db.execute(SLOW_QUERY, {"n": rows})).scalar()}
+
+    return app
+
+
+async def timed_get(client: httpx.AsyncClient, path: str) -> float:
+    start = time.perf_counter()
+    response = await client.get(path)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def probe(client: httpx.AsyncClient, done: asyncio.Event, interval: float = 0.01):
+    # Latency is measured from when the ping was due, so time spent waiting
+    # for a blocked event loop to wake the probe up is counted too.
+    latencies = []
+    while not done.is_set():
+        due = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        response = await client.get("/ping")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - due)
+    return latencies
+
+
+async def run_burst(app: FastAPI, path: str, requests: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await timed_get(client, path)  # warm up
+
+        done = asyncio.Event()
+        pings = asyncio.create_task(probe(client, done))
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(timed_get(client, path) for _ in range(requests)))
+        wall = time.perf_counter() - start
+        done.set()
+        ping_latencies = await pings
+    return latencies, ping_latencies, wall
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def report(label: str, latencies, ping_latencies, wall: float):
+    print(
+        f"{label:<22} wall={wall * 1000:7.1f}ms  "
+        f"slow p50={statistics.median(latencies) * 1000:7.1f}ms  "
+        f"slow p95={percentile(latencies, 0.95) * 1000:7.1f}ms  "
+        f"/ping p50={statistics.median(ping_latencies) * 1000:7.1f}ms  "
+        f"/ping max={max(ping_latencies) * 1000:7.1f}ms"
+    )
+
+
+async def main(requests: int, rows: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(os.path.join(tmp, "bench.db"), rows)
+        print(f"{requests} concurrent requests, recursive CTE over {rows} rows each\n")
+        report("before (sync Session)", *await run_burst(app, "/before", requests))
+        report("after (AsyncSession)", *await run_burst(app, "/after", requests))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=300000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.rows))
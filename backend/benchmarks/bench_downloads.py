@@ -0,0 +1,84 @@
+"""Document download throughput: the old line-iterating generator vs DocumentResponse.
+
+Each response is driven directly through ASGI with a `send` that only counts
+bytes and messages, so the numbers are the app's own cost of producing the
+body, not the network's. The file is random bytes, like a compressed PDF.
+
+Usage (from backend/):
+    python -m benchmarks.bench_downloads [--size-mb 50] [--repeat 3]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from starlette.responses import StreamingResponse
+
+from app.core.downloads import DocumentResponse
+
+
+def old_response(path):
+    def iterfile():
+        with open(path, mode="rb") as f:
+            yield from f
+    return StreamingResponse(iterfile(), media_type="application/pdf")
+
+
+def new_response(path, byte_range=None):
+    return DocumentResponse(path, os.stat(path), byte_range, media_type="application/pdf")
+
+
+async def drive(response, extensions=None):
+    sent = {"bytes": 0, "messages": 0}
+
+    async def receive():
+        await asyncio.sleep(3600)  # never disconnects
+
+    async def send(message):
+        sent["messages"] += 1
+        if message["type"] == "http.response.body":
+            sent["bytes"] += len(message.get("body", b""))
+        elif message["type"] == "http.response.zerocopysend":
+            sent["bytes"] += message["count"]
+
+    scope = {"type": "http", "method": "GET", "extensions": extensions or {}}
+    start = time.perf_counter()
+    await response(scope, receive, send)
+    return time.perf_counter() - start, sent
+
+
+def report(label, seconds, sent):
+    mb = sent["bytes"] / (1024 * 1024)
+    print(f"{label:<28} {mb:7.1f} MB  {seconds * 1000:9.1f}ms  {mb / seconds:9.1f} MB/s  "
+          f"{sent['messages']:>8} ASGI messages")
+
+
+def main(size_mb, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "survey.pdf")
+        with open(path, "wb") as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+        size = os.path.getsize(path)
+        middle = size // 2
+
+        cases = [
+            ("generator (yield from f)", lambda: old_response(path), None),
+            ("DocumentResponse", lambda: new_response(path), None),
+            ("DocumentResponse 1 MB range", lambda: new_response(path, (middle, middle + 1024 * 1024 - 1)), None),
+            ("zerocopysend (server copies)", lambda: new_response(path), {"http.response.zerocopysend": {}}),
+        ]
+        print(f"{size_mb} MB file, best of {repeat}\n")
+        for label, make, extensions in cases:
+            runs = [asyncio.run(drive(make(), extensions)) for _ in range(repeat)]
+            seconds, sent = min(runs, key=lambda run: run[0])
+            report(label, seconds, sent)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.size_mb, args.repeat)
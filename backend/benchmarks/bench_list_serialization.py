@@ -0,0 +1,143 @@
+"""List endpoint reads: ORM objects copied into dicts vs column projections.
+
+Fills a throwaway SQLite database and times, for each list, the old path
+(load ORM objects, copy them into dicts or response models) against the
+projection path (select just the columns, as dicts), both through to JSON
+the way FastAPI serializes them. Also times decoding `files.document_type`
+with the old member-scanning CaseInsensitiveEnum against the lookup table.
+Reported as rows serialized per second; best of --repeat runs.
+
+Usage (from backend/):
+    python -m benchmarks.bench_list_serialization [--rows 20000] [--repeat 5]
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import String, TypeDecorator, create_engine, insert, select, type_coerce
+from sqlalchemy.orm import Session
+
+from app.api.message import MESSAGE_COLUMNS
+from app.api.property import STAGE_COLUMNS, PropertyStageResponse
+from app.core.database import Base
+from app.models.file import DocumentType, File
+from app.models.message import Message
+from app.models.property import PropertyStage
+
+DOCUMENT_TYPES = list(DocumentType)
+
+
+class ScanningEnum(TypeDecorator):
+    """CaseInsensitiveEnum as it was: a linear scan of the members per row."""
+    impl = String
+    cache_ok = True
+
+    def __init__(self, enum_class):
+        self.enum_class = enum_class
+        super().__init__()
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = value.lower()
+            for member in self.enum_class:
+                if member.value == value:
+                    return member
+        return value
+
+
+def fill(engine, rows: int):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Message), [
+            {"sender_id": 1, "recipient_id": 2, "property_id": 1, "stage_id": n % 20, "content": f"message {n}",
+             "approval_status": "approved", "status": "approved"} for n in range(rows)
+        ])
+        conn.execute(insert(PropertyStage), [
+            {"property_id": 1, "stage": f"Stage {n}", "status": "pending", "rank": f"{n:08d}",
+             "responsible": "Solicitor"} for n in range(rows)
+        ])
+        conn.execute(insert(File.__table__), [
+            {"filename": f"doc{n}.pdf", "file_path": f"/tmp/doc{n}.pdf", "file_type": "application/pdf",
+             "file_size": 1, "document_type": DOCUMENT_TYPES[n % len(DOCUMENT_TYPES)],
+             "uploaded_by": 1} for n in range(rows)
+        ])
+
+
+def messages_orm(db):
+    return jsonable_encoder([
+        {"id": m.id, "sender_id": m.sender_id, "recipient_id": m.recipient_id, "property_id": m.property_id,
+         "stage_id": m.stage_id, "content": m.content, "timestamp": m.timestamp, "status": m.status}
+        for m in db.query(Message).order_by(Message.timestamp).all()
+    ])
+
+
+def messages_projection(db):
+    return jsonable_encoder(db.query(MESSAGE_COLUMNS).order_by(Message.timestamp).all())
+
+
+STAGES = TypeAdapter(List[PropertyStageResponse])
+
+
+def stages_orm(db):
+    result = []
+    for position, s in enumerate(db.query(PropertyStage).order_by(PropertyStage.rank, PropertyStage.id).all()):
+        d = s.__dict__.copy()
+        d['order'] = position
+        d['responsible_role'] = getattr(s, 'responsible_role', None) or getattr(s, 'responsible', None)
+        d.pop('_sa_instance_state', None)
+        result.append(PropertyStageResponse(**d))
+    return STAGES.dump_json(STAGES.validate_python(result))
+
+
+def stages_projection(db):
+    stages = db.query(STAGE_COLUMNS).order_by(PropertyStage.rank, PropertyStage.id).all()
+    for position, stage in enumerate(stages):
+        stage['order'] = position
+        stage['responsible_role'] = stage['responsible_role'] or stage['responsible']
+    return STAGES.dump_json(STAGES.validate_python(stages))
+
+
+def document_types_scanning(db):
+    return db.execute(select(type_coerce(File.__table__.c.document_type, ScanningEnum(DocumentType)))).scalars().all()
+
+
+def document_types_lookup(db):
+    return db.execute(select(File.document_type)).scalars().all()
+
+
+def best_rate(engine, read, rows: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        with Session(engine) as db:
+            start = time.perf_counter()
+            read(db)
+            best = min(best, time.perf_counter() - start)
+    return rows / best
+
+
+def main(rows: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        fill(engine, rows)
+        print(f"{rows} rows per list, best of {repeat}\n")
+        for label, before, after in [
+            ("messages", messages_orm, messages_projection),
+            ("stages", stages_orm, stages_projection),
+            ("document_type decode", document_types_scanning, document_types_lookup),
+        ]:
+            old, new = best_rate(engine, before, rows, repeat), best_rate(engine, after, rows, repeat)
+            print(f"{label:<22} before={old:>10,.0f} rows/s  after={new:>10,.0f} rows/s  ({new / old:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
@@ -0,0 +1,100 @@
+"""send_message latency: inline AI filtering vs the background moderation pipeline.
+
+Uses StubModerationProvider with a fixed latency standing in for the two
+OpenAI round-trips, against a throwaway SQLite database, so it runs offline.
+
+Usage (from backend/):
+    python -m benchmarks.bench_moderation [--messages 50] [--latency 0.4] [--senders 10]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.message import Message
+from app.services.moderation import MODERATING, ModerationPipeline, StubModerationProvider
+
+
+def send_inline(SessionLocal, provider, text):
+    filtered = provider.filter(text)
+    db = SessionLocal()
+    try:
+        msg = Message(sender_id=1, recipient_id=2, property_id=1, stage_id=1, content=filtered,
+                      original_content=text, filtered_content=filtered,
+                      approval_status="pending", status="pending")
+        db.add(msg)
+        db.commit()
+    finally:
+        db.close()
+
+
+def send_queued(SessionLocal, pipeline, text):
+    db = SessionLocal()
+    try:
+        msg = Message(sender_id=1, recipient_id=2, property_id=1, stage_id=1,
+                      original_content=text, approval_status=MODERATING, status="pending")
+        db.add(msg)
+        db.commit()
+        message_id = msg.id
+    finally:
+        db.close()
+    pipeline.submit(message_id, text)
+
+
+def run(label, send, messages, senders):
+    def timed(i):
+        start = time.perf_counter()
+        send(f"message {i}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=senders) as pool:
+        latencies = list(pool.map(timed, range(messages)))
+    return label, latencies, time.perf_counter() - start
+
+
+def report(label, latencies, responded, filtered):
+    print(f"{label:<10} response p50={statistics.median(latencies) * 1000:8.1f}ms  "
+          f"max={max(latencies) * 1000:8.1f}ms  all responded={responded:6.2f}s  "
+          f"all filtered={filtered:6.2f}s")
+
+
+def main(messages, latency, senders, workers):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                               connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        provider = StubModerationProvider(latency=latency)
+
+        print(f"{messages} messages from {senders} concurrent senders, "
+              f"{latency * 1000:.0f}ms provider latency, {workers} moderation workers\n")
+
+        label, latencies, wall = run("inline", lambda t: send_inline(SessionLocal, provider, t),
+                                     messages, senders)
+        report(label, latencies, wall, wall)
+
+        pipeline = ModerationPipeline(provider, max_workers=workers, max_pending=messages,
+                                      session_factory=SessionLocal)
+        start = time.perf_counter()
+        label, latencies, wall = run("pipeline", lambda t: send_queued(SessionLocal, pipeline, t),
+                                     messages, senders)
+        pipeline.wait_idle()
+        report(label, latencies, wall, time.perf_counter() - start)
+        pipeline.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.4)
+    parser.add_argument("--senders", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    main(args.messages, args.latency, args.senders, args.workers)
@@ -0,0 +1,125 @@
+import os
+import tempfile
+
+# Point the app at a throwaway database and log directory before anything imports app.core
+_test_dir = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_test_dir, 'test.db')}")
+os.environ.setdefault("SLOW_QUERY_LOG_FILE", os.path.join(_test_dir, "slow_queries.log"))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from app.main import app
+from app.core.database import Base, engine
+from app.core.security import get_password_hash
+from app.models.user import User
+from app.services.notifications import notifier
+
+client = TestClient(app)
+
+PASSWORD = "testpass123"
+
+# Every test that asks for `test_users` gets all of these, keyed by name
+TEST_USERS = {
+    "buyer": {
+        "email": "buyer@test.com",
+        "first_name": "Test",
+        "last_name": "Buyer",
+        "role": "BUYER",
+        "phone_number": "+441234567890"
+    },
+    "seller": {
+        "email": "seller@test.com",
+        "first_name": "Test",
+        "last_name": "Seller",
+        "role": "SELLER",
+        "phone_number": "+441234567891"
+    },
+    "solicitor": {
+        "email": "solicitor@test.com",
+        "first_name": "Test",
+        "last_name": "Solicitor",
+        "role": "SOLICITOR",
+        "phone_number": "+441234567891"
+    },
+    "seller_solicitor": {
+        "email": "seller.solicitor@test.com",
+        "first_name": "Seller",
+        "last_name": "Solicitor",
+        "role": "SOLICITOR",
+        "phone_number": "+441234567893"
+    },
+    "agent": {
+        "email": "agent@test.com",
+        "first_name": "Test",
+        "last_name": "Agent",
+        "role": "ESTATE_AGENT",
+        "phone_number": "+441234567892"
+    },
+    "north_agent": {
+        "email": "north@test.com",
+        "first_name": "North",
+        "last_name": "Agent",
+        "role": "ESTATE_AGENT",
+        "phone_number": "+441234567892",
+        "company_name": "North Lettings"
+    },
+    "south_agent": {
+        "email": "south@test.com",
+        "first_name": "South",
+        "last_name": "Agent",
+        "role": "ESTATE_AGENT",
+        "phone_number": "+441234567893",
+        "company_name": "South Homes"
+    },
+    "other": {
+        "email": "other@test.com",
+        "first_name": "Test",
+        "last_name": "Other",
+        "role": "BUYER",
+        "phone_number": "+441234567892"
+    },
+    "outsider": {
+        "email": "outsider@test.com",
+        "first_name": "Test",
+        "last_name": "Outsider",
+        "role": "SELLER",
+        "phone_number": "+441234567893"
+    }
+}
+
+@pytest.fixture(scope="session")
+def password_hash():
+    # bcrypt is slow on purpose; every test user shares one password
+    return get_password_hash(PASSWORD)
+
+@pytest.fixture(scope="function")
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = Session(engine)
+    try:
+        yield db
+    finally:
+        db.close()
+        # Let after-commit notification work finish before its tables go
+        notifier.flush(timeout=10)
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(scope="function")
+def test_users(db, password_hash):
+    users = {role: User(hashed_password=password_hash, **user_data) for role, user_data in TEST_USERS.items()}
+    db.add_all(users.values())
+    db.commit()
+    for user in users.values():
+        db.refresh(user)
+    return users
+
+@pytest.fixture(scope="function")
+def auth_headers(test_users):
+    """`auth_headers(role)` logs in as that test user and returns the Authorization header."""
+    def login(role):
+        token = client.post(
+            "/login", json={"email": TEST_USERS[role]["email"], "password": PASSWORD}
+        ).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+    return login
@@ -0,0 +1,72 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models.property import Property, PropertyStatus, PropertyParticipant, PropertyStage
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def test_property(db, test_users):
+    property = Property(
+        address="123 Test St",
+        postcode="AB12 3CD",
+        price=100000.0,
+        status=PropertyStatus.AVAILABLE,
+        seller_id=test_users["seller"].id,
+        buyer_id=test_users["buyer"].id
+    )
+    db.add(property)
+    db.commit()
+    db.refresh(property)
+    return property
+
+def participants(db, property_id):
+    return set(db.query(PropertyParticipant.user_id, PropertyParticipant.role)
+               .filter(PropertyParticipant.property_id == property_id).all())
+
+def test_participants_follow_property_columns(db, test_users, test_property):
+    assert participants(db, test_property.id) == {
+        (test_users["seller"].id, "seller"),
+        (test_users["buyer"].id, "buyer"),
+    }
+
+    test_property.buyer_id = test_users["other"].id
+    db.commit()
+    assert participants(db, test_property.id) == {
+        (test_users["seller"].id, "seller"),
+        (test_users["other"].id, "buyer"),
+    }
+
+    db.delete(test_property)
+    db.commit()
+    assert participants(db, test_property.id) == set()
+
+def test_property_access_limited_to_participants(db, test_property, auth_headers):
+    response = client.get(f"/properties/{test_property.id}", headers=auth_headers("buyer"))
+    assert response.status_code == 200
+
+    response = client.get(f"/properties/{test_property.id}", headers=auth_headers("other"))
+    assert response.status_code == 404
+
+    response = client.get("/properties", headers=auth_headers("seller"))
+    assert [p["id"] for p in response.json()] == [test_property.id]
+
+def test_complete_stage_scoped_to_property(db, test_users, test_property, auth_headers):
+    other_property = Property(
+        address="9 Other Rd",
+        postcode="ZZ9 9ZZ",
+        price=200000.0,
+        status=PropertyStatus.AVAILABLE,
+        seller_id=test_users["other"].id
+    )
+    db.add(other_property)
+    db.flush()
+    stage = PropertyStage(property_id=other_property.id, stage="Offer Accepted", rank="m")
+    db.add(stage)
+    db.commit()
+
+    response = client.post(f"/properties/{test_property.id}/stages/{stage.id}/complete",
+                           headers=auth_headers("buyer"))
+    assert response.status_code == 404
+    db.refresh(stage)
+    assert stage.status == "pending"
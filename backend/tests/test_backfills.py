@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import delete, func, select
+from app.models.backfill import BackfillCheckpoint
+from app.models.property import Property, PropertyParticipant, PropertyStage
+from app.models.stage_info import StageInfo
+from app.models.user import UserRole
+from app.services.backfills import BACKFILLS, run_backfill
+
+@pytest.fixture(scope="function")
+def properties(db, test_users):
+    props = [Property(address=f"{n} Backfill Road", postcode="AB12 3CD", price=100000.0,
+                      buyer_id=test_users["buyer"].id, estate_agent_id=test_users["agent"].id) for n in range(7)]
+    db.add_all(props)
+    db.flush()
+    db.add_all(PropertyStage(property_id=prop.id, stage=f"Stage {n % 3}", status="pending", rank="m")
+               for n, prop in enumerate(props))
+    db.commit()
+    return props
+
+def count(db, model):
+    return db.execute(select(func.count()).select_from(model)).scalar()
+
+def test_stage_info_backfill_in_batches(db, properties):
+    stats = run_backfill(db, BACKFILLS["stage_info"], batch_size=3, pause=0)
+    assert stats["done"] and stats["rows"] == 7 and stats["batches"] == 3
+    assert stats["changed"] == count(db, StageInfo) == 3 * len(UserRole)
+    checkpoint = db.get(BackfillCheckpoint, "stage_info")
+    assert (checkpoint.status, checkpoint.rows, checkpoint.last_key) == ("done", 7, max(
+        stage.id for prop in properties for stage in prop.stages))
+
+    # Finished runs start over; nothing is left to write
+    again = run_backfill(db, BACKFILLS["stage_info"], batch_size=3, pause=0)
+    assert again["resumed_from"] == 0 and again["changed"] == 0
+
+def test_interrupted_run_resumes_from_checkpoint(db, properties):
+    db.execute(delete(PropertyParticipant))
+    db.commit()
+    first = run_backfill(db, BACKFILLS["property_participants"], batch_size=2, pause=0, max_batches=2)
+    assert not first["done"] and first["rows"] == 4
+    assert count(db, PropertyParticipant) == 8
+    checkpoint = db.get(BackfillCheckpoint, "property_participants")
+    assert (checkpoint.status, checkpoint.last_key) == ("running", properties[3].id)
+    db.rollback()
+
+    rest = run_backfill(db, BACKFILLS["property_participants"], batch_size=2, pause=0)
+    assert rest["done"] and rest["resumed_from"] == properties[3].id
+    assert rest["rows"] == 7 and rest["batches"] == 4
+    assert count(db, PropertyParticipant) == 14
+
+def test_restart_ignores_checkpoint(db, properties):
+    run_backfill(db, BACKFILLS["property_participants"], batch_size=2, pause=0, max_batches=1)
+    stats = run_backfill(db, BACKFILLS["property_participants"], batch_size=2, pause=0, restart=True)
+    assert stats["resumed_from"] == 0 and stats["rows"] == 7
+
+def test_dry_run_writes_nothing(db, properties):
+    stats = run_backfill(db, BACKFILLS["stage_info"], batch_size=10, pause=0, dry_run=True)
+    assert stats["done"] and stats["changed"] == 3 * len(UserRole)
+    assert count(db, StageInfo) == 0
+    assert db.get(BackfillCheckpoint, "stage_info") is None
@@ -0,0 +1,160 @@
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models.property import Property, PropertyStage
+from app.services.timelines import rebalance_stages_task
+
+client = TestClient(app)
+
+THREADS = 8
+
+@pytest.fixture(scope="function")
+def prop(test_users, auth_headers):
+    response = client.post("/properties", headers=auth_headers("agent"), json={
+        "address": "1 Contention Close",
+        "postcode": "AB12 3CD",
+        "price": 0.0,
+        "buyer_id": test_users["buyer"].id,
+        "buyer_solicitor_id": test_users["solicitor"].id,
+        "seller_solicitor_id": test_users["seller_solicitor"].id,
+        "estate_agent_id": test_users["agent"].id
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def run_together(work, count=THREADS):
+    """Run `work(n)` on `count` threads released at the same moment; returns their results in order."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(n):
+        barrier.wait()
+        results[n] = work(n)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    return results
+
+def test_etag_and_if_match(db, prop, auth_headers):
+    headers = auth_headers("agent")
+    response = client.get(f"/properties/{prop['id']}", headers=headers)
+    assert response.headers["ETag"] == '"1"' and response.json()["version"] == 1
+
+    stale = client.patch(f"/properties/{prop['id']}", headers={**headers, "If-Match": '"7"'}, json={"price": 1.0})
+    assert stale.status_code == 412
+    response = client.patch(f"/properties/{prop['id']}", headers={**headers, "If-Match": 'W/"1"'}, json={"price": 1.0})
+    assert response.status_code == 200 and response.headers["ETag"] == '"2"'
+    assert client.patch(f"/properties/{prop['id']}", headers={**headers, "If-Match": "*"}, json={"price": 2.0}).status_code == 200
+    # Without If-Match the last writer still wins, as before
+    assert client.patch(f"/properties/{prop['id']}", headers=headers, json={"price": 3.0}).json()["version"] == 4
+
+def test_stage_if_match_and_reorder(db, prop, auth_headers):
+    headers = auth_headers("solicitor")
+    stages = client.get(f"/properties/{prop['id']}/stages", headers=headers).json()
+    stage = stages[0]
+    assert stage["version"] == 1
+    url = f"/properties/{prop['id']}/stages/{stage['id']}"
+    response = client.patch(url, headers={**headers, "If-Match": '"1"'}, json={"stage": stage["stage"], "status": "in-progress"})
+    assert response.status_code == 200 and response.headers["ETag"] == '"2"'
+    stale = client.patch(url, headers={**headers, "If-Match": '"1"'}, json={"stage": stage["stage"], "status": "pending"})
+    assert stale.status_code == 412
+
+    order = [s["id"] for s in reversed(stages)]
+    response = client.patch(f"/properties/{prop['id']}/stages/reorder", headers={**headers, "If-Match": '"1"'},
+                            json={"stage_ids": order})
+    assert response.status_code == 200 and response.headers["ETag"] == '"2"'
+    again = client.patch(f"/properties/{prop['id']}/stages/reorder", headers={**headers, "If-Match": '"1"'},
+                         json={"stage_ids": list(reversed(order))})
+    assert again.status_code == 412
+    assert [s["id"] for s in client.get(f"/properties/{prop['id']}/stages", headers=headers).json()] == order
+
+def test_no_lost_updates_under_contention(db, prop, auth_headers):
+    headers = auth_headers("agent")
+    increments = 3
+    url = f"/properties/{prop['id']}"
+
+    def increment(n):
+        statuses = []
+        done = 0
+        while done < increments:
+            current = client.get(url, headers=headers)
+            response = client.patch(url, headers={**headers, "If-Match": current.headers["ETag"]},
+                                    json={"price": current.json()["price"] + 1})
+            statuses.append(response.status_code)
+            if response.status_code == 200:
+                done += 1
+        return statuses
+
+    statuses = [status for result in run_together(increment) for status in result]
+    assert set(statuses) <= {200, 409, 412}
+    assert statuses.count(200) == THREADS * increments
+    final = client.get(url, headers=headers).json()
+    # Every increment landed exactly once
+    assert final["price"] == THREADS * increments
+    assert final["version"] == 1 + THREADS * increments
+
+def test_concurrent_completion_advances_next_stage_once(db, prop, auth_headers):
+    headers = auth_headers("solicitor")
+    stages = client.get(f"/properties/{prop['id']}/stages", headers=headers).json()
+    first, second, third = stages[:3]
+
+    def complete(n):
+        return client.patch(f"/properties/{prop['id']}/stages/{first['id']}", headers=headers,
+                            json={"stage": first["stage"], "status": "completed"}).status_code
+
+    statuses = run_together(complete)
+    assert set(statuses) <= {200, 409} and 200 in statuses
+    db.expire_all()
+    assert db.get(PropertyStage, first["id"]).status == "completed"
+    advanced = db.get(PropertyStage, second["id"])
+    assert (advanced.status, advanced.version) == ("in-progress", 2)
+    assert db.get(PropertyStage, third["id"]).status == "pending"
+
+def test_approvals_bump_the_property_version(db, prop, auth_headers):
+    url = f"/properties/{prop['id']}/timeline-approval"
+    first = client.post(url, headers=auth_headers("solicitor"), json={})
+    assert first.status_code == 200 and first.json()["version"] == 2
+    second = client.post(url, headers=auth_headers("seller_solicitor"), json={})
+    assert second.status_code == 200 and second.json()["version"] == 3
+    db.expire_all()
+    assert db.get(Property, prop["id"]).timeline_locked
+
+def test_moves_are_not_lost_to_a_background_rebalance(db, prop, auth_headers):
+    headers = auth_headers("solicitor")
+    url = f"/properties/{prop['id']}/stages"
+    stages = client.get(url, headers=headers).json()
+    moving = stages[-1]
+    others = [s["id"] for s in stages if s["id"] != moving["id"]]
+    moves = 20
+    done = threading.Event()
+
+    def work(n):
+        if n:
+            # Respace the ranks over and over while the first thread keeps moving its stage
+            while not done.is_set():
+                rebalance_stages_task(prop["id"])
+            return None
+        statuses, placed = [], None
+        try:
+            for move in range(moves):
+                target = 1 + move % (len(others) - 1)
+                response = client.patch(f"{url}/{moving['id']}", headers=headers,
+                                        json={"stage": moving["stage"], "status": "pending", "order": target})
+                statuses.append(response.status_code)
+                if response.status_code == 200:
+                    assert response.json()["order"] == target
+                    placed = target
+        finally:
+            done.set()
+        return statuses, placed
+
+    statuses, placed = run_together(work, count=4)[0]
+    assert set(statuses) <= {200, 409} and placed is not None
+    # The last move that succeeded is where the stage is, and nothing else changed places
+    order = [s["id"] for s in client.get(url, headers=headers).json()]
+    assert order.index(moving["id"]) == placed
+    assert [stage_id for stage_id in order if stage_id != moving["id"]] == others
@@ -8,6 +8,18 @@ from app.models.file import File, DocumentType
 from sqlalchemy.orm import Session
 from app.core.security import get_password_hash
 import io
+import os
+import hashlib
+import time
+from app.models.blob import Blob
+from app.services.ingest import DOCUMENT_SIZE_LIMITS
+from app.services.blobs import blob_store, release_file
+from app.services.storage import LocalStorage, OffloadStorage, S3Storage
+from app.core.database import async_engine
+from app.core.signed_urls import sign_download
+from app.services.notifications import notifier
+from sqlalchemy import event
+from urllib.parse import urlsplit
 
 client = TestClient(app)
 
@@ -38,8 +50,14 @@ def db():
         yield db
     finally:
         db.close()
+        notifier.flush(timeout=10)
         Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "storage", LocalStorage(str(tmp_path / "blobs")))
+    return tmp_path / "blobs"
+
 @pytest.fixture(scope="function")
 def test_users(db):
     users = {}
@@ -225,4 +243,324 @@ def test_file_deletion(db, test_users, test_property):
         f"/files/{file_id}/download",
         headers={"Authorization": f"Bearer {buyer_token}"}
     )
-    assert response.status_code == 404 
\ No newline at end of file
+    assert response.status_code == 404
+
+
+def login(role):
+    return client.post(
+        "/login",
+        json={"email": TEST_USERS[role]["email"], "password": TEST_USERS[role]["password"]}
+    ).json()["access_token"]
+
+def stored_files(store):
+    return sorted(p.relative_to(store).as_posix() for p in store.rglob("*") if p.is_file())
+
+def upload(token, property_id, name, content, document_type=DocumentType.TITLE_DEEDS.value):
+    return client.post(
+        "/upload",
+        headers={"Authorization": f"Bearer {token}"},
+        files={"file": (name, io.BytesIO(content), "application/pdf")},
+        data={"property_id": str(property_id), "document_type": document_type}
+    )
+
+def test_upload_is_hashed_and_sniffed_in_one_pass(db, test_users, test_property, store):
+    """The stored record carries the size, SHA-256 and sniffed type of what was written."""
+    # A PNG under a misleading name: the content decides the type
+    file_content = b"\x89PNG\r\n\x1a\n" + b"\x00" * 3000
+    response = upload(login("buyer"), test_property.id, "photo one.pdf", file_content,
+                      DocumentType.PROPERTY_PHOTOS.value)
+    assert response.status_code == 200
+    body = response.json()
+    sha256 = hashlib.sha256(file_content).hexdigest()
+    assert body["filename"] == "photo_one.pdf"
+    assert body["file_size"] == len(file_content)
+    assert body["sha256"] == sha256
+    assert body["file_type"] == "image/png"
+    assert stored_files(store) == [f"{sha256[:2]}/{sha256[2:4]}/{sha256}"]
+    assert open(body["file_path"], "rb").read() == file_content
+
+def test_upload_over_document_type_cap_is_rejected(db, test_users, test_property, store, monkeypatch):
+    monkeypatch.setitem(DOCUMENT_SIZE_LIMITS, DocumentType.TITLE_DEEDS, 1024)
+    # document_type arrives after the file, so the cap is applied once the form is read
+    response = upload(login("buyer"), test_property.id, "deeds.pdf", b"x" * 4096)
+    assert response.status_code == 413
+    assert stored_files(store) == []
+    assert db.query(File).count() == 0
+
+def test_property_document_upload(db, test_users, test_property, store, monkeypatch):
+    headers = {"Authorization": f"Bearer {login('seller')}"}
+    file_content = b"%PDF-1.7 survey"
+    response = client.post(
+        f"/properties/{test_property.id}/documents?document_type=survey_report",
+        headers=headers,
+        files={"file": ("survey.pdf", io.BytesIO(file_content), "application/pdf")}
+    )
+    assert response.status_code == 200
+    document = db.get(File, response.json()["document_id"])
+    assert document.filename == "survey.pdf"
+    assert document.file_type == "application/pdf"
+    assert document.sha256 == hashlib.sha256(file_content).hexdigest()
+    assert open(document.file_path, "rb").read() == file_content
+
+    # The query-string document type is known up front, so an oversized body is refused unread
+    monkeypatch.setitem(DOCUMENT_SIZE_LIMITS, DocumentType.SURVEY_REPORT, 1024)
+    response = client.post(
+        f"/properties/{test_property.id}/documents?document_type=survey_report",
+        headers=headers,
+        files={"file": ("big.pdf", io.BytesIO(b"x" * 200_000), "application/pdf")}
+    )
+    assert response.status_code == 413
+    assert len(stored_files(store)) == 1
+
+def test_duplicate_uploads_share_one_blob(db, test_users, test_property, store):
+    buyer_token = login("buyer")
+    content = b"%PDF-1.4 passport scan"
+    first = upload(buyer_token, test_property.id, "id.pdf", content).json()
+    # Same name, different content: stored separately, nothing overwritten
+    other = upload(buyer_token, test_property.id, "id.pdf", b"%PDF-1.4 another scan").json()
+    second = upload(buyer_token, test_property.id, "id (1).pdf", content).json()
+
+    assert first["file_path"] == second["file_path"] != other["file_path"]
+    assert len(stored_files(store)) == 2
+    blob = db.get(Blob, first["sha256"])
+    assert blob.ref_count == 2
+
+    headers = {"Authorization": f"Bearer {buyer_token}"}
+    assert client.delete(f"/files/{first['id']}", headers=headers).status_code == 204
+    db.refresh(blob)
+    assert blob.ref_count == 1
+    # The other reference still downloads
+    assert client.get(f"/files/{second['id']}/download", headers=headers).content == content
+
+    assert client.delete(f"/files/{second['id']}", headers=headers).status_code == 204
+    db.refresh(blob)
+    assert blob.ref_count == 0
+
+def test_collector_reclaims_unreferenced_blobs_and_strays(db, test_users, test_property, store):
+    buyer_token = login("buyer")
+    kept = upload(buyer_token, test_property.id, "keep.pdf", b"keep").json()
+    released = upload(buyer_token, test_property.id, "drop.pdf", b"drop").json()
+    client.delete(f"/files/{released['id']}", headers={"Authorization": f"Bearer {buyer_token}"})
+    # A blob file whose row never committed, and an abandoned staged upload
+    stray = store / "ab" / "cd" / ("abcd" + "0" * 60)
+    stray.parent.mkdir(parents=True)
+    stray.write_bytes(b"orphan")
+    (store / "incoming" / ".upload-abandoned").write_bytes(b"partial")
+
+    # Within the grace period nothing is touched
+    assert blob_store.collect(db) == {"blobs": 0, "files": 0}
+
+    assert blob_store.collect(db, grace_seconds=-60) == {"blobs": 1, "files": 2}
+    assert stored_files(store) == [os.path.relpath(kept["file_path"], store).replace(os.sep, "/")]
+    assert db.get(Blob, released["sha256"]) is None
+    assert db.get(Blob, kept["sha256"]).ref_count == 1
+
+def test_reused_stray_survives_collection(db, test_users, test_property, store):
+    content = b"%PDF-1.4 stored before its row"
+    sha256 = hashlib.sha256(content).hexdigest()
+    # Left by an upload whose row never committed, long ago
+    stray = store / sha256[:2] / sha256[2:4] / sha256
+    stray.parent.mkdir(parents=True)
+    stray.write_bytes(content)
+    os.utime(stray, (0, 0))
+
+    # Reusing it refreshes its mtime, so the grace period covers the new row
+    response = upload(login("buyer"), test_property.id, "late.pdf", content)
+    assert response.status_code == 200
+    assert time.time() - stray.stat().st_mtime < 60
+    assert blob_store.collect(db, grace_seconds=60) == {"blobs": 0, "files": 0}
+    assert stray.read_bytes() == content
+
+def test_legacy_file_removed_only_on_commit(db, store, tmp_path):
+    legacy = tmp_path / "legacy.pdf"
+    legacy.write_bytes(b"uploaded before the blob store")
+    release_file(db, File(file_path=str(legacy)))
+    db.rollback()
+    assert legacy.exists()
+
+    release_file(db, File(file_path=str(legacy)))
+    db.commit()
+    assert not legacy.exists()
+
+def test_delete_property_releases_its_blobs(db, test_users, test_property):
+    seller_token = login("seller")
+    content = b"%PDF-1.4 contract"
+    for _ in range(2):
+        response = client.post(
+            f"/properties/{test_property.id}/documents?document_type=draft_contract",
+            headers={"Authorization": f"Bearer {seller_token}"},
+            files={"file": ("contract.pdf", io.BytesIO(content), "application/pdf")}
+        )
+        assert response.status_code == 200
+    sha256 = hashlib.sha256(content).hexdigest()
+    assert db.get(Blob, sha256).ref_count == 2
+
+    # Only the estate agent may delete; attach one
+    agent = User(email="agent@test.com", hashed_password=get_password_hash("agentpass"), first_name="Test",
+                 last_name="Agent", role="ESTATE_AGENT", phone_number="+441234567898")
+    db.add(agent)
+    db.commit()
+    test_property.estate_agent_id = agent.id
+    db.commit()
+    agent_token = client.post("/login", json={"email": "agent@test.com", "password": "agentpass"}).json()["access_token"]
+    response = client.delete(f"/properties/{test_property.id}", headers={"Authorization": f"Bearer {agent_token}"})
+    assert response.status_code == 200
+    db.expire_all()
+    assert db.get(Blob, sha256).ref_count == 0
+
+def test_download_ranges_and_revalidation(db, test_users, test_property):
+    buyer_token = login("buyer")
+    headers = {"Authorization": f"Bearer {buyer_token}"}
+    content = bytes(range(256)) * 40
+    file = upload(buyer_token, test_property.id, "survey.pdf", content).json()
+    url = f"/files/{file['id']}/download"
+
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["accept-ranges"] == "bytes"
+    etag = response.headers["etag"]
+    assert etag == f'"{file["sha256"]}"'
+
+    # Cached copy is still current
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    response = client.get(url, headers={**headers, "If-Modified-Since": response.headers["last-modified"]})
+    assert response.status_code == 304
+
+    response = client.get(url, headers={**headers, "Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == content[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(content)}"
+    assert response.headers["content-length"] == "100"
+
+    response = client.get(url, headers={**headers, "Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.content == content[-10:]
+
+    # A changed file (different ETag) means the whole thing is sent again
+    response = client.get(url, headers={**headers, "Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == content
+
+    response = client.get(url, headers={**headers, "Range": f"bytes={len(content)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(content)}"
+
+def signed_path(token, file_id):
+    url = client.get(f"/files/{file_id}", headers={"Authorization": f"Bearer {token}"}).json()["download_url"]
+    return urlsplit(url).path
+
+def test_signed_download_url_needs_no_auth_or_database(db, test_users, test_property):
+    content = b"%PDF-1.4 signed"
+    file = upload(login("buyer"), test_property.id, "deeds.pdf", content).json()
+    path = signed_path(login("buyer"), file["id"])
+
+    queries = []
+    record = lambda *args: queries.append(args[2])
+    event.listen(engine, "before_cursor_execute", record)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["etag"] == f'"{file["sha256"]}"'
+    assert 'filename="deeds.pdf"' in response.headers["content-disposition"]
+    assert queries == []
+
+    response = client.get(path, headers={"Range": "bytes=0-3"})
+    assert response.status_code == 206
+    assert response.content == content[:4]
+
+def test_signed_download_url_rejects_tampering_and_expiry(db, test_users, test_property):
+    file = upload(login("buyer"), test_property.id, "deeds.pdf", b"%PDF-1.4 x").json()
+    path = signed_path(login("buyer"), file["id"])
+    payload, signature = path.rsplit("/", 1)[1].split(".")
+
+    forged = sign_download("/etc/passwd", "passwd", "text/plain").split(".")[0]
+    assert client.get(f"/downloads/{forged}.{signature}").status_code == 403
+    assert client.get(f"/downloads/{payload}").status_code == 403
+    expired = sign_download(file["file_path"], "deeds.pdf", "application/pdf", ttl=-1)
+    assert client.get(f"/downloads/{expired}").status_code == 403
+
+def test_offload_storage_hands_download_to_web_server(db, test_users, test_property, store, monkeypatch):
+    monkeypatch.setattr(blob_store, "storage", OffloadStorage(str(store), "accel", "/protected/"))
+    buyer_token = login("buyer")
+    file = upload(buyer_token, test_property.id, "deeds.pdf", b"%PDF-1.4 offload").json()
+    sha = file["sha256"]
+
+    response = client.get(f"/files/{file['id']}/download", headers={"Authorization": f"Bearer {buyer_token}"})
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["x-accel-redirect"] == f"/protected/{sha[:2]}/{sha[2:4]}/{sha}"
+    assert response.headers["etag"] == f'"{sha}"'
+
+    monkeypatch.setattr(blob_store.storage, "mode", "sendfile")
+    response = client.get(signed_path(buyer_token, file["id"]))
+    assert response.headers["x-sendfile"] == os.path.abspath(store / sha[:2] / sha[2:4] / sha)
+
+
+class FakeS3:
+    """The slice of the boto3 S3 client S3Storage uses, kept in memory."""
+
+    class Paginator:
+        def __init__(self, s3):
+            self.s3 = s3
+
+        def paginate(self, Bucket, Prefix):
+            yield self.s3.list_objects_v2(Bucket, Prefix)
+
+    def __init__(self):
+        self.objects = {}
+
+    def list_objects_v2(self, Bucket, Prefix, MaxKeys=1000):
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        return {"Contents": [{"Key": key, "LastModified": self.objects[Bucket, key][1]} for key in keys[:MaxKeys]]}
+
+    def upload_file(self, filename, Bucket, Key, ExtraArgs=None):
+        with open(filename, "rb") as f:
+            self.objects[Bucket, Key] = (f.read(), 0.0)
+
+    def copy_object(self, Bucket, Key, CopySource, MetadataDirective):
+        self.objects[Bucket, Key] = (self.objects[CopySource["Bucket"], CopySource["Key"]][0], time.time())
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def get_paginator(self, operation):
+        return self.Paginator(self)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3.test/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+def test_s3_storage(db, test_users, test_property, tmp_path, monkeypatch):
+    s3 = FakeS3()
+    monkeypatch.setattr(blob_store, "storage", S3Storage("docs", "blobs/", client=s3, staging_dir=str(tmp_path)))
+    buyer_token = login("buyer")
+    content = b"%PDF-1.4 in a bucket"
+    first = upload(buyer_token, test_property.id, "a.pdf", content).json()
+    second = upload(buyer_token, test_property.id, "b.pdf", content).json()
+    sha = first["sha256"]
+    key = f"blobs/{sha[:2]}/{sha[2:4]}/{sha}"
+    assert first["file_path"] == second["file_path"] == f"s3://docs/{key}"
+    assert list(s3.objects) == [("docs", key)]
+    assert s3.objects["docs", key][0] == content
+    assert os.listdir(tmp_path) == []  # nothing left staged
+
+    response = client.get(signed_path(buyer_token, first["id"]), follow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers["location"].startswith(f"https://s3.test/docs/{key}?")
+
+    # The bucket copy goes once nothing refers to it
+    headers = {"Authorization": f"Bearer {buyer_token}"}
+    assert client.delete(f"/files/{first['id']}", headers=headers).status_code == 204
+    assert client.delete(f"/files/{second['id']}", headers=headers).status_code == 204
+    s3.objects["docs", "blobs/ff/ff/stray"] = (b"", 0.0)
+    db.expire_all()
+    assert blob_store.collect(db, grace_seconds=0) == {"blobs": 1, "files": 1}
+    assert s3.objects == {}
@@ -0,0 +1,144 @@
+import asyncio
+import time
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from app.main import app
+from app.models.property import PropertyStage
+from app.services.events import EventHub, MemoryEventBackend, RESYNC, event_hub, publish_after_commit
+from app.services.notifications import notifier
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def hub():
+    event_hub.clear()
+
+@pytest.fixture(scope="function")
+def token_for(auth_headers):
+    """The bare access token, as the WebSocket query string takes it."""
+    return lambda role: auth_headers(role)["Authorization"].removeprefix("Bearer ")
+
+def create_property(test_users, token):
+    response = client.post("/properties", headers={"Authorization": f"Bearer {token}"}, json={
+        "address": "123 Test St",
+        "postcode": "AB12 3CD",
+        "price": 100000.0,
+        "buyer_id": test_users["buyer"].id,
+        "buyer_solicitor_id": test_users["solicitor"].id,
+        "estate_agent_id": test_users["agent"].id,
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+def complete(property_id, stage, token):
+    response = client.patch(f"/properties/{property_id}/stages/{stage.id}",
+                            headers={"Authorization": f"Bearer {token}"},
+                            json={"stage": stage.stage, "status": "completed"})
+    assert response.status_code == 200
+
+def test_stage_completion_is_pushed(db, test_users, token_for):
+    agent_token = token_for("agent")
+    property_id = create_property(test_users, agent_token)
+    first, second = db.query(PropertyStage).filter(
+        PropertyStage.property_id == property_id
+    ).order_by(PropertyStage.rank).limit(2).all()
+
+    with client.websocket_connect(f"/ws/properties/{property_id}?token={token_for('buyer')}") as ws:
+        complete(property_id, first, agent_token)
+        events = [ws.receive_json() for _ in range(3)]
+
+    # Notifications are written after the request, so their event comes last
+    assert [e["type"] for e in events] == ["stage.updated", "stage.updated", "notification.created"]
+    assert events[0]["data"] == {"stage_id": second.id, "status": "in-progress"}
+    assert events[1]["data"] == {"stage_id": first.id, "status": "completed"}
+    assert events[2]["data"] == {"type": "stage_completed"}
+    assert all(e["property_id"] == property_id for e in events)
+    assert events[0]["id"] < events[1]["id"] < events[2]["id"]
+    assert event_hub.subscriber_count(property_id) == 0
+
+def test_only_participants_can_subscribe(db, test_users, token_for):
+    property_id = create_property(test_users, token_for("agent"))
+
+    for token in (token_for("outsider"), "not-a-token"):
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with client.websocket_connect(f"/ws/properties/{property_id}?token={token}"):
+                pass
+        assert exc.value.code == 1008
+
+def test_resume_from_last_event_id(db, test_users, token_for):
+    agent_token = token_for("agent")
+    buyer_token = token_for("buyer")
+    property_id = create_property(test_users, agent_token)
+    stages = db.query(PropertyStage).filter(
+        PropertyStage.property_id == property_id
+    ).order_by(PropertyStage.rank).limit(2).all()
+
+    with client.websocket_connect(f"/ws/properties/{property_id}?token={buyer_token}") as ws:
+        complete(property_id, stages[0], agent_token)
+        seen = [ws.receive_json() for _ in range(3)]
+
+    # Missed while disconnected
+    complete(property_id, stages[1], agent_token)
+    assert notifier.flush(timeout=10)
+
+    last_event_id = seen[-1]["id"]
+    with client.websocket_connect(
+        f"/ws/properties/{property_id}?token={buyer_token}&last_event_id={last_event_id}"
+    ) as ws:
+        missed = [ws.receive_json() for _ in range(3)]
+    assert all(e["id"] > last_event_id for e in missed)
+    assert missed[1]["data"] == {"stage_id": stages[1].id, "status": "completed"}
+    assert missed[2]["type"] == "notification.created"
+
+    # Resuming from before anything this process buffered asks for a refetch
+    with client.websocket_connect(
+        f"/ws/properties/{property_id}?token={buyer_token}&last_event_id=1"
+    ) as ws:
+        assert ws.receive_json()["type"] == RESYNC
+
+def test_audience_and_slow_subscribers():
+    async def scenario():
+        hub = EventHub(MemoryEventBackend(), queue_size=3)
+        buyer = hub.subscribe(1, user_id=10)
+        agent = hub.subscribe(1, user_id=20)
+        hub.publish(1, "message.pending", {"message_id": 1}, audience=[20])
+        await asyncio.sleep(0)
+        assert (await agent.get()).type == "message.pending"
+        assert buyer._queue.empty()
+
+        # The buyer never reads, so it is cut off instead of buffering forever
+        for _ in range(5):
+            hub.publish(1, "stage.updated")
+        await asyncio.sleep(0)
+        assert buyer.overflowed
+        assert await buyer.get() is None
+
+    asyncio.run(scenario())
+
+def test_rolled_back_events_are_not_published(db, test_users, token_for):
+    property_id = create_property(test_users, token_for("agent"))
+
+    async def scenario():
+        subscription = event_hub.subscribe(property_id, test_users["buyer"].id)
+        publish_after_commit(db, property_id, "stage.updated", {"stage_id": 1})
+        db.rollback()
+        publish_after_commit(db, property_id, "stage.updated", {"stage_id": 2})
+        db.commit()
+        await asyncio.sleep(0)
+        event_hub.unsubscribe(subscription)
+        return await subscription.get()
+
+    assert asyncio.run(scenario()).data == {"stage_id": 2}
+
+def test_redis_publish_does_not_wait_for_redis():
+    pytest.importorskip("redis")
+    from app.services.events import RedisEventBackend
+
+    # Nothing listens on port 1, so every send fails; publishing must not notice
+    backend = RedisEventBackend("redis://127.0.0.1:1/0", outbox_size=2)
+    started = time.monotonic()
+    for n in range(5):
+        backend.publish(1, "stage.updated", {"n": n}, None)
+    assert time.monotonic() - started < 0.5
+    backend.close(timeout=5)
@@ -9,6 +9,9 @@ from sqlalchemy.orm import Session
 import os
 from datetime import datetime
 from app.core.security import get_password_hash
+from app.services.moderation import ModerationPipeline, moderation_pipeline, StubModerationProvider
+from app.services.notifications import notifier
+import threading
 
 client = TestClient(app)
 
@@ -56,7 +59,9 @@ def db():
     try:
         yield db
     finally:
+        moderation_pipeline.wait_idle(timeout=10)
         db.close()
+        notifier.flush(timeout=10)
         Base.metadata.drop_all(bind=engine)
 
 @pytest.fixture(scope="function")
@@ -137,6 +142,7 @@ def test_message_flow(db, test_users, test_property):
     )
     assert response.status_code == 200
     message_id = response.json()["id"]
+    assert moderation_pipeline.wait_idle(timeout=10)
     
     # 2. Check message was stored with both original and filtered content
     message = db.query(Message).filter(Message.id == message_id).first()
@@ -256,4 +262,106 @@ def test_message_stages(db, test_users, test_property):
         # Verify message was created for correct stage
         message_id = response.json()["id"]
         message = db.query(Message).filter(Message.id == message_id).first()
-        assert message.stage_id == stage 
\ No newline at end of file
+        assert message.stage_id == stage
+
+class GatedProvider(StubModerationProvider):
+    """Stub provider that holds every message until the test releases it."""
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def filter(self, text):
+        self.release.wait(timeout=10)
+        return super().filter(text)
+
+def test_message_held_until_moderated(db, test_users, test_property, monkeypatch):
+    """Messages are stored immediately but only reach the agent once filtered"""
+    provider = GatedProvider()
+    monkeypatch.setattr(moderation_pipeline, "provider", provider)
+
+    buyer_token = client.post(
+        "/login",
+        json={
+            "email": TEST_USERS["buyer"]["email"],
+            "password": TEST_USERS["buyer"]["password"]
+        }
+    ).json()["access_token"]
+    agent_token = client.post(
+        "/login",
+        json={
+            "email": TEST_USERS["agent"]["email"],
+            "password": TEST_USERS["agent"]["password"]
+        }
+    ).json()["access_token"]
+
+    response = client.post(
+        f"/properties/{test_property.id}/stages/1/messages",
+        headers={"Authorization": f"Bearer {buyer_token}"},
+        json={"content": "Can we move the completion date?"}
+    )
+    assert response.status_code == 200
+    message_id = response.json()["id"]
+
+    # Still moderating: stored, but hidden from the agent's pending list
+    message = db.query(Message).filter(Message.id == message_id).first()
+    assert message.approval_status == "moderating"
+    assert message.filtered_content is None
+    response = client.get(
+        f"/properties/{test_property.id}/pending-messages",
+        headers={"Authorization": f"Bearer {agent_token}"}
+    )
+    assert response.status_code == 200
+    assert response.json() == []
+    response = client.get(
+        f"/messages/pending/{test_property.id}",
+        headers={"Authorization": f"Bearer {agent_token}"}
+    )
+    assert response.status_code == 200
+    assert response.json() == []
+
+    provider.release.set()
+    assert moderation_pipeline.wait_idle(timeout=10)
+
+    response = client.get(
+        f"/properties/{test_property.id}/pending-messages",
+        headers={"Authorization": f"Bearer {agent_token}"}
+    )
+    assert [m["id"] for m in response.json()] == [message_id]
+    assert response.json()[0]["filtered_content"] == "[Filtered] Can we move the completion date?"
+    response = client.get(
+        f"/messages/pending/{test_property.id}",
+        headers={"Authorization": f"Bearer {agent_token}"}
+    )
+    assert [m["id"] for m in response.json()] == [message_id]
+
+def test_full_moderation_queue_does_not_block_senders(db, test_users, test_property, monkeypatch):
+    """Past max_pending a message is left 'moderating' and picked up once the queue drains"""
+    provider = GatedProvider()
+    pipeline = ModerationPipeline(provider, max_workers=1, max_pending=1)
+    monkeypatch.setattr("app.api.property.moderation_pipeline", pipeline)
+
+    buyer_token = client.post(
+        "/login",
+        json={
+            "email": TEST_USERS["buyer"]["email"],
+            "password": TEST_USERS["buyer"]["password"]
+        }
+    ).json()["access_token"]
+
+    ids = []
+    for content in ("First message", "Second message"):
+        response = client.post(
+            f"/properties/{test_property.id}/stages/1/messages",
+            headers={"Authorization": f"Bearer {buyer_token}"},
+            json={"content": content}
+        )
+        assert response.status_code == 200
+        ids.append(response.json()["id"])
+    assert pipeline.in_flight == 1
+
+    provider.release.set()
+    assert pipeline.wait_idle(timeout=10)
+    db.expire_all()
+    statuses = {m.id: m.approval_status for m in db.query(Message).filter(Message.id.in_(ids))}
+    assert statuses == {ids[0]: "pending", ids[1]: "pending"}
+    pipeline.shutdown()
@@ -0,0 +1,305 @@
+import threading
+import time
+import pytest
+from contextlib import contextmanager
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app.main import app
+from app.core.database import engine, SessionLocal
+from app.models.notification import Notification, NotificationCounter, NotificationArchive
+from app.models.property import Property, PropertyStatus
+from app.models.property import PropertyStage
+from app.services.notifications import NotificationEvent, NotificationService, notifier, notify_after_commit
+from app.services.unread_counts import mark_read_up_to, reconcile_unread_counts
+from app.services.notification_archive import archive_notifications, archived_notifications
+from datetime import datetime, timedelta
+
+client = TestClient(app)
+
+@contextmanager
+def recording():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((threading.current_thread().name, statement))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+def notification_inserts(statements, on_worker):
+    return [s for thread, s in statements
+            if s.startswith("INSERT INTO notifications") and (thread == "notifications") == on_worker]
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def create_property(test_users, headers):
+    response = client.post("/properties", headers=headers, json={
+        "address": "123 Test St",
+        "postcode": "AB12 3CD",
+        "price": 100000.0,
+        "buyer_id": test_users["buyer"].id,
+        "buyer_solicitor_id": test_users["solicitor"].id,
+        "estate_agent_id": test_users["agent"].id,
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+def test_stage_completion_fans_out_after_the_request(db, test_users, auth_headers):
+    headers = auth_headers("agent")
+    property_id = create_property(test_users, headers)
+    stage = db.query(PropertyStage).filter(PropertyStage.property_id == property_id).first()
+
+    with recording() as statements:
+        response = client.post(f"/properties/{property_id}/stages/{stage.id}/complete", headers=headers)
+        assert response.status_code == 200
+        assert notifier.flush(timeout=10)
+
+    assert notification_inserts(statements, on_worker=False) == []
+    assert len(notification_inserts(statements, on_worker=True)) == 1
+    notified = db.query(Notification.user_id, Notification.type).order_by(Notification.user_id).all()
+    assert notified == [(test_users["buyer"].id, "stage_completed"), (test_users["solicitor"].id, "stage_completed")]
+    assert notifier.queue_depth == 0
+
+def test_burst_is_coalesced_per_recipient(db, test_users):
+    service = NotificationService(session_factory=SessionLocal, coalesce_seconds=60, quiet_seconds=60)
+    recipients = (test_users["buyer"].id, test_users["solicitor"].id)
+    for i in range(10):
+        service.submit(NotificationEvent(None, "document_uploaded", f"Document {i} has been uploaded by Agent.",
+                                         recipients, summary="{count} documents have been uploaded by Agent."))
+    service.submit(NotificationEvent(None, "message", "A message has been approved.", recipients[:1]))
+
+    # The first upload and the one-off are written straight away; the repeats are held until it goes quiet
+    wait_until(lambda: service.stats()["written"] == 3)
+    assert service.queue_depth == 9
+    assert service.stats()["held_bursts"] == 1
+
+    assert service.flush(timeout=10)
+    rows = db.query(Notification.user_id, Notification.message).filter(
+        Notification.type == "document_uploaded"
+    ).order_by(Notification.user_id, Notification.id).all()
+    assert rows == [row for user_id in recipients for row in [
+        (user_id, "Document 0 has been uploaded by Agent."), (user_id, "9 documents have been uploaded by Agent.")
+    ]]
+    assert service.stats() == {"queue_depth": 0, "held_bursts": 0, "written": 5, "coalesced": 8}
+    service.shutdown()
+
+def test_single_upload_is_not_held(db, test_users):
+    # A long quiet period only delays repeats, never the first notification
+    service = NotificationService(session_factory=SessionLocal, quiet_seconds=60)
+    service.submit(NotificationEvent(None, "document_uploaded", "Survey Report has been uploaded by Agent.",
+                                     (test_users["buyer"].id,), summary="{count} documents have been uploaded."))
+    wait_until(lambda: service.queue_depth == 0)
+    assert db.query(Notification.message).scalar() == "Survey Report has been uploaded by Agent."
+    assert service.stats()["held_bursts"] == 0
+    service.shutdown()
+
+def test_rolled_back_notifications_are_dropped(db, test_users):
+    depth = notifier.queue_depth
+    session = SessionLocal()
+    try:
+        session.add(Notification(user_id=test_users["buyer"].id, message="also rolled back", type="system"))
+        notify_after_commit(session, None, "system", "never sent", [test_users["buyer"].id])
+        session.rollback()
+        session.commit()
+    finally:
+        session.close()
+    assert notifier.queue_depth == depth
+    assert notifier.flush(timeout=10)
+    assert db.query(Notification).count() == 0
+
+def test_queue_depth_is_exposed(db, test_users, auth_headers):
+    response = client.get("/metrics/notifications", headers=auth_headers("agent"))
+    assert response.status_code == 200
+    assert {"queue_depth", "held_bursts", "written", "coalesced"} <= set(response.json())
+
+@pytest.fixture(scope="function")
+def unread(auth_headers):
+    def counts(role):
+        response = client.get("/me/unread-counts", headers=auth_headers(role))
+        assert response.status_code == 200
+        return response.json()
+    return counts
+
+def test_unread_counts_follow_inserts_and_reads(db, test_users, auth_headers, unread):
+    headers = auth_headers("agent")
+    first = create_property(test_users, headers)
+    second = create_property(test_users, headers)
+    for property_id in (first, first, second):
+        stage = db.query(PropertyStage).filter(
+            PropertyStage.property_id == property_id, PropertyStage.status != "completed"
+        ).first()
+        client.post(f"/properties/{property_id}/stages/{stage.id}/complete", headers=headers)
+    assert notifier.flush(timeout=10)
+
+    with recording() as statements:
+        counts = unread("buyer")
+    assert counts == {"total": 3, "properties": [{"property_id": first, "unread": 2},
+                                                 {"property_id": second, "unread": 1}]}
+    # Served from the counters alone
+    assert not any("FROM notifications" in statement for _, statement in statements)
+
+    buyer = auth_headers("buyer")
+    notification_id = db.query(Notification.id).filter(
+        Notification.user_id == test_users["buyer"].id, Notification.property_id == second
+    ).scalar()
+    for _ in range(2):
+        assert client.post(f"/notifications/{notification_id}/read", headers=buyer).status_code == 200
+    assert unread("buyer") == {"total": 2, "properties": [{"property_id": first, "unread": 2}]}
+    assert client.post(f"/notifications/{notification_id}/read", headers=auth_headers("solicitor")).status_code == 404
+
+def test_reconcile_repairs_drifted_counters(db, test_users, auth_headers, unread):
+    headers = auth_headers("agent")
+    property_id = create_property(test_users, headers)
+    buyer_id = test_users["buyer"].id
+    # Rows written behind the counters' back, and a counter for nothing
+    db.add_all([Notification(user_id=buyer_id, property_id=property_id, message=f"n{i}", type="system")
+                for i in range(3)])
+    db.add(NotificationCounter(user_id=test_users["solicitor"].id, property_id=property_id, unread=5))
+    db.commit()
+
+    assert reconcile_unread_counts(db) == {"counters": 2, "repaired": 2}
+    assert unread("buyer")["total"] == 3
+    assert unread("solicitor")["total"] == 0
+    assert reconcile_unread_counts(db)["repaired"] == 0
+
+def complete_stages(db, property_id, headers, count):
+    stages = db.query(PropertyStage).filter(PropertyStage.property_id == property_id).limit(count).all()
+    for stage in stages:
+        client.post(f"/properties/{property_id}/stages/{stage.id}/complete", headers=headers)
+    assert notifier.flush(timeout=10)
+
+def buyer_notification_ids(db, test_users, property_id):
+    return [n for n, in db.query(Notification.id).filter(
+        Notification.user_id == test_users["buyer"].id, Notification.property_id == property_id
+    ).order_by(Notification.id)]
+
+def test_bulk_mark_read(db, test_users, auth_headers, unread):
+    property_id = create_property(test_users, auth_headers("agent"))
+    complete_stages(db, property_id, auth_headers("agent"), 4)
+    ids = buyer_notification_ids(db, test_users, property_id)
+    solicitor_ids = [n for n, in db.query(Notification.id).filter(Notification.user_id == test_users["solicitor"].id)]
+
+    buyer = auth_headers("buyer")
+    with recording() as statements:
+        response = client.post("/notifications/read", headers=buyer, json={"ids": ids[:3] + solicitor_ids})
+    assert response.json() == {"success": True, "marked": 3}
+    assert len([s for _, s in statements if s.startswith("UPDATE notifications ")]) == 1
+    # Already read, so nothing more to uncount
+    assert client.post("/notifications/read", headers=buyer, json={"ids": ids}).json()["marked"] == 1
+    assert unread("buyer")["total"] == 0
+    assert unread("solicitor")["total"] == 4
+
+def test_mark_read_up_to_moves_one_watermark(db, test_users, auth_headers, unread):
+    agent = auth_headers("agent")
+    property_id = create_property(test_users, agent)
+    complete_stages(db, property_id, agent, 3)
+    ids = buyer_notification_ids(db, test_users, property_id)
+    buyer = auth_headers("buyer")
+    url = f"/properties/{property_id}/notifications/read-up-to"
+
+    with recording() as statements:
+        response = client.post(url, headers=buyer, json={"notification_id": ids[1]})
+    assert response.json() == {"success": True, "unread": 1}
+    assert not any(s.startswith("UPDATE notifications ") for _, s in statements)
+    assert unread("buyer") == {"total": 1, "properties": [{"property_id": property_id, "unread": 1}]}
+
+    unread_list = client.get(f"/properties/{property_id}/notifications", headers=buyer).json()
+    assert [n["id"] for n in unread_list] == [ids[2]]
+    everything = client.get(f"/properties/{property_id}/notifications/all", headers=buyer).json()
+    assert {n["id"]: n["read"] for n in everything} == {ids[0]: True, ids[1]: True, ids[2]: False}
+    assert db.query(Notification).filter(Notification.read == True).count() == 0
+
+    # Never moves backwards; marking an already-covered notification is a no-op
+    assert client.post(url, headers=buyer, json={"notification_id": ids[0]}).json()["unread"] == 1
+    assert client.post("/notifications/read", headers=buyer, json={"ids": ids[:2]}).json()["marked"] == 0
+    assert reconcile_unread_counts(db)["repaired"] == 0
+
+    # Each user has their own watermark
+    latest = db.query(Notification.id).filter(Notification.user_id == test_users["solicitor"].id,
+                                              Notification.property_id == property_id
+                                              ).order_by(Notification.id.desc()).first()[0]
+    assert client.post(url, headers=auth_headers("solicitor"), json={"notification_id": latest}).json()["unread"] == 0
+    assert unread("buyer")["total"] == 1
+
+def test_mark_read_up_to_rejects_unknown_ids(db, test_users, auth_headers, unread):
+    agent = auth_headers("agent")
+    property_id = create_property(test_users, agent)
+    complete_stages(db, property_id, agent, 2)
+    buyer = auth_headers("buyer")
+    url = f"/properties/{property_id}/notifications/read-up-to"
+
+    # Another user's notification on the same property
+    foreign = db.query(Notification.id).filter(Notification.property_id == property_id,
+                                              Notification.user_id != test_users["buyer"].id).first()[0]
+    assert client.post(url, headers=buyer, json={"notification_id": foreign}).status_code == 404
+    # An id past every notification would hide the ones still to come
+    assert client.post(url, headers=buyer, json={"notification_id": 10**9}).status_code == 404
+    assert unread("buyer")["total"] == 2
+    assert len(client.get(f"/properties/{property_id}/notifications", headers=buyer).json()) == 2
+
+def test_mark_read_up_to_keeps_concurrent_increments(db, test_users, auth_headers, unread):
+    agent = auth_headers("agent")
+    property_id = create_property(test_users, agent)
+    complete_stages(db, property_id, agent, 3)
+    ids = buyer_notification_ids(db, test_users, property_id)
+    buyer_id = test_users["buyer"].id
+
+    # A fan-out counted but not yet visible to this transaction: only the
+    # newly covered rows are uncounted, so its increment survives
+    db.query(NotificationCounter).filter(NotificationCounter.user_id == buyer_id,
+                                         NotificationCounter.property_id == property_id).update({"unread": 4})
+    assert mark_read_up_to(db, buyer_id, property_id, ids[1]) == 2
+    assert mark_read_up_to(db, buyer_id, property_id, ids[0]) == 2
+    db.commit()
+    assert unread("buyer")["total"] == 2
+
+def test_retention_archives_old_read_and_closed_notifications(db, test_users, auth_headers, unread):
+    agent = auth_headers("agent")
+    live = create_property(test_users, agent)
+    sold = create_property(test_users, agent)
+    buyer_id = test_users["buyer"].id
+    old = datetime.utcnow() - timedelta(days=100)
+    recent = datetime.utcnow() - timedelta(days=1)
+
+    def add(property_id, created_at, read=False):
+        n = Notification(user_id=buyer_id, property_id=property_id, message="m", type="system",
+                         created_at=created_at, read=read)
+        db.add(n)
+        db.flush()
+        return n.id
+
+    old_read = add(live, old, read=True)
+    old_watermarked = add(live, old)
+    old_unread = add(live, old)
+    recent_read = add(live, recent, read=True)
+    closed = [add(sold, recent), add(sold, old, read=True), add(sold, recent)]
+    db.commit()
+    reconcile_unread_counts(db)
+    client.post(f"/properties/{live}/notifications/read-up-to", headers=auth_headers("buyer"),
+                json={"notification_id": old_watermarked})
+    db.query(Property).filter(Property.id == sold).update({Property.status: PropertyStatus.SOLD})
+    db.commit()
+    assert unread("buyer")["total"] == 3
+
+    stats = archive_notifications(db, retention_days=90, batch_size=2)
+    assert stats["moved"] == 5
+    assert stats["batches"] == 3
+    assert stats["seconds"] >= 0
+
+    remaining = {n for n, in db.query(Notification.id)}
+    assert remaining == {old_unread, recent_read}
+    assert [n["id"] for n in archived_notifications(db, sold)] == closed
+    assert [(n["id"], n["read"]) for n in archived_notifications(db, live)] == [(old_read, True), (old_watermarked, True)]
+    assert {reason for reason, in db.query(NotificationArchive.reason)} == {"expired", "closed"}
+    # The archived unread ones no longer count
+    assert unread("buyer") == {"total": 1, "properties": [{"property_id": live, "unread": 1}]}
+    assert reconcile_unread_counts(db)["repaired"] == 0
+
+    assert archive_notifications(db, retention_days=90)["moved"] == 0
@@ -0,0 +1,96 @@
+import pytest
+from datetime import datetime
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import DateTime, select
+from sqlalchemy.dialects import postgresql
+from app.main import app
+from app.core.pagination import PageParams, _keyset, encode_cursor
+from app.models.property import Property, PropertyStatus
+from app.models.message import Message
+from app.models.notification import Notification
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def test_property(db, test_users):
+    property = Property(
+        address="123 Test St",
+        postcode="AB12 3CD",
+        price=100000.0,
+        status=PropertyStatus.AVAILABLE,
+        seller_id=test_users["seller"].id,
+        buyer_id=test_users["buyer"].id
+    )
+    db.add(property)
+    db.commit()
+    db.refresh(property)
+    return property
+
+def walk(url, headers, limit):
+    """Follow next_cursor until the last page, returning the ids seen."""
+    ids, params = [], {"limit": limit}
+    while True:
+        response = client.get(url, params=params, headers=headers)
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body["items"]) <= limit
+        ids.extend(item["id"] for item in body["items"])
+        if body["next_cursor"] is None:
+            return ids
+        params = {"limit": limit, "cursor": body["next_cursor"]}
+
+def test_message_pages_cover_every_message_once(db, test_users, test_property, auth_headers):
+    # One commit, so most rows share the same server-side second
+    db.add_all([
+        Message(sender_id=test_users["buyer"].id, recipient_id=test_users["seller"].id,
+                property_id=test_property.id, stage_id=1, content=f"message {i}",
+                approval_status="approved", status="approved")
+        for i in range(7)
+    ])
+    db.commit()
+    expected = [m.id for m in db.query(Message).order_by(Message.timestamp, Message.id)]
+
+    headers = auth_headers("buyer")
+    assert walk(f"/properties/{test_property.id}/messages", headers, limit=3) == expected
+    assert walk(f"/messages/property/{test_property.id}", headers, limit=2) == expected
+
+def test_notification_pages_newest_first(db, test_users, test_property, auth_headers):
+    buyer = test_users["buyer"]
+    db.add_all([
+        Notification(user_id=buyer.id, property_id=test_property.id, message=f"n{i}", type="system")
+        for i in range(5)
+    ])
+    db.commit()
+    expected = [n.id for n in db.query(Notification).order_by(Notification.created_at.desc(), Notification.id.desc())]
+
+    ids = walk(f"/properties/{test_property.id}/notifications/all", auth_headers("buyer"), limit=2)
+    assert ids == expected
+
+def test_unpaginated_lists_are_deprecated(db, test_users, test_property, auth_headers):
+    response = client.get("/properties", headers=auth_headers("buyer"))
+    assert response.status_code == 200
+    assert response.headers["Deprecation"] == "true"
+    assert [p["id"] for p in response.json()] == [test_property.id]
+
+    response = client.get("/properties", params={"limit": 10}, headers=auth_headers("buyer"))
+    assert "Deprecation" not in response.headers
+    assert response.json()["next_cursor"] is None
+
+def test_invalid_cursor_rejected(db, test_users):
+    response = client.get("/users", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_typed_backends_bind_the_cursor_with_the_column_type():
+    created = datetime(2026, 3, 1, 12, 30, 0, 250000)
+    params = PageParams(limit=10, cursor=encode_cursor([created.isoformat(), 7]))
+    stmt = _keyset(select(Notification), params, Notification.id, Notification.created_at,
+                   descending=True, as_text=False)
+    compiled = stmt.compile(dialect=postgresql.dialect())
+    assert "CAST" not in str(compiled)
+    sort_param = next(p for p in compiled.binds.values() if p.value == created)
+    assert isinstance(sort_param.type, DateTime)
+
+    with pytest.raises(HTTPException):
+        _keyset(select(Notification), PageParams(cursor=encode_cursor(["yesterday", 7])),
+                Notification.id, Notification.created_at, descending=True, as_text=False)
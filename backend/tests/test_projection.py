@@ -0,0 +1,37 @@
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import Session
+from app.core.database import Base
+from app.core.pagination import PageParams, paginate
+from app.core.projection import projection
+from app.models.file import DocumentType, File
+from app.models.message import Message
+
+def make_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'projection.db'}")
+    Base.metadata.create_all(bind=engine)
+    return Session(engine)
+
+def test_projection_rows_are_dicts(tmp_path):
+    db = make_db(tmp_path)
+    db.execute(insert(Message), [
+        {"sender_id": 1, "recipient_id": 2, "property_id": 1, "stage_id": 1, "content": f"m{n}"} for n in range(5)
+    ])
+    rows = db.query(projection(Message.id, Message.content)).order_by(Message.id).all()
+    assert rows == [{"id": n + 1, "content": f"m{n}"} for n in range(5)]
+
+    first, cursor = paginate(db.query(projection(Message.id, Message.content)), PageParams(limit=3), Message.id)
+    assert [row["id"] for row in first] == [1, 2, 3]
+    rest, cursor = paginate(db.query(projection(Message.id, Message.content)), PageParams(limit=3, cursor=cursor), Message.id)
+    assert [row["id"] for row in rest] == [4, 5] and cursor is None
+
+def test_document_type_is_case_insensitive(tmp_path):
+    db = make_db(tmp_path)
+    db.execute(insert(File), [{"filename": "a.pdf", "file_path": "/tmp/a.pdf", "uploaded_by": 1, "document_type": value}
+                              for value in ("EPC", DocumentType.SURVEY_REPORT, "Mortgage_Offer")])
+    assert db.execute(text("SELECT document_type FROM files ORDER BY id")).scalars().all() == [
+        "epc", "survey_report", "mortgage_offer"]
+    # Rows written before the column lowercased its input still decode
+    db.execute(text("UPDATE files SET document_type = 'TITLE_DEEDS' WHERE id = 1"))
+    db.execute(text("UPDATE files SET document_type = 'unknown_type' WHERE id = 2"))
+    assert db.execute(select(File.document_type).order_by(File.id)).scalars().all() == [
+        DocumentType.TITLE_DEEDS, "unknown_type", DocumentType.MORTGAGE_OFFER]
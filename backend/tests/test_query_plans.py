@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import create_engine, select, text
+from app.core.database import Base
+from app.models.file import File
+from app.models.message import Message
+from app.models.notification import Notification, NotificationCounter
+from app.models.property import PropertyStage, PropertyParticipant
+from app.models.stage_info import StageInfo
+
+# The query shapes behind the polled endpoints, as the handlers issue them
+HOT_QUERIES = {
+    "unread notifications": select(Notification).where(
+        Notification.property_id == 1,
+        Notification.user_id == 1,
+        Notification.read == False,
+        Notification.id > 5
+    ).order_by(Notification.created_at.desc()),
+    "unread counts": select(NotificationCounter.property_id, NotificationCounter.unread).where(
+        NotificationCounter.user_id == 1,
+        NotificationCounter.unread > 0
+    ),
+    "all notifications": select(Notification).where(
+        Notification.property_id == 1,
+        Notification.user_id == 1
+    ).order_by(Notification.created_at.desc()),
+    "property messages": select(Message).where(
+        Message.property_id == 1
+    ).order_by(Message.timestamp),
+    "pending messages": select(Message).where(
+        Message.property_id == 1,
+        Message.approval_status == 'pending'
+    ).order_by(Message.timestamp),
+    "property stages": select(PropertyStage).where(
+        PropertyStage.property_id == 1
+    ).order_by(PropertyStage.rank, PropertyStage.id),
+    "property files": select(File).where(File.property_id == 1),
+    "stage info": select(StageInfo).where(
+        StageInfo.stage == "Offer Accepted",
+        StageInfo.role == "buyer"
+    ),
+    "user properties": select(PropertyParticipant.property_id).where(
+        PropertyParticipant.user_id == 1
+    ),
+}
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+def query_plan(engine, stmt):
+    sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return [row[3] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_index(engine, name):
+    plan = query_plan(engine, HOT_QUERIES[name])
+    table_scans = [step for step in plan if step.startswith("SCAN") and "INDEX" not in step]
+    assert not table_scans, f"{name}: {plan}"
+    # The ORDER BY should come straight off the index, not a sort
+    assert not any("TEMP B-TREE" in step for step in plan), f"{name}: {plan}"
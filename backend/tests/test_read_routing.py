@@ -0,0 +1,143 @@
+import threading
+import pytest
+from contextlib import contextmanager
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from app.main import app
+from app.core.config import settings
+from app.core.database import (
+    ReadOnlySessionError, ReadSessionLocal, create_db_engine, engine, read_only_url,
+)
+from app.core import read_routing
+from app.core.read_routing import RecentWriters, recent_writers
+from app.models.user import User
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def writers():
+    recent_writers.clear()
+    yield
+    recent_writers.clear()
+
+@pytest.fixture(scope="function")
+def replica(monkeypatch):
+    # The test database opened read-only stands in for a replica
+    replica_engine = create_db_engine(settings.DATABASE_URL, read_only=True)
+    monkeypatch.setattr(read_routing, "ReadSessionLocal", sessionmaker(
+        autocommit=False, autoflush=False, bind=replica_engine, info={"read_only": True}
+    ))
+    yield replica_engine
+    replica_engine.dispose()
+
+@contextmanager
+def stage_reads(target, table="property_stages"):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if f"FROM {table}" in statement:
+            statements.append(statement)
+
+    event.listen(target, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(target, "before_cursor_execute", record)
+
+def create_property(test_users, headers):
+    response = client.post("/properties", headers=headers, json={
+        "address": "123 Test St",
+        "postcode": "AB12 3CD",
+        "price": 100000.0,
+        "buyer_id": test_users["buyer"].id,
+        "estate_agent_id": test_users["agent"].id,
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+def test_read_sessions_refuse_writes(db, test_users):
+    read_db = ReadSessionLocal()
+    try:
+        read_db.add(User(email="new@test.com", hashed_password="x", first_name="N", last_name="U",
+                         role="BUYER", phone_number="+440000000000"))
+        with pytest.raises(ReadOnlySessionError):
+            read_db.flush()
+        read_db.rollback()
+
+        user = read_db.get(User, test_users["buyer"].id)
+        user.first_name = "Changed"
+        with pytest.raises(ReadOnlySessionError):
+            read_db.flush()
+        read_db.rollback()
+
+        with pytest.raises(ReadOnlySessionError):
+            read_db.execute(update(User).values(first_name="Changed"))
+        # Reads are fine
+        assert read_db.get(User, test_users["buyer"].id).first_name == "Test"
+    finally:
+        read_db.close()
+
+def test_sqlite_replica_is_opened_read_only(tmp_path):
+    url = f"sqlite:///{tmp_path / 'primary.db'}"
+    assert read_only_url(url) == f"sqlite:///file:{tmp_path / 'primary.db'}?mode=ro&uri=true"
+    assert read_only_url("postgresql://replica.example.com/app") == "postgresql://replica.example.com/app"
+
+    primary = create_db_engine(url)
+    with primary.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+    replica_engine = create_db_engine(url, read_only=True)
+    with replica_engine.connect() as conn:
+        assert conn.execute(text("PRAGMA query_only")).scalar() == 1
+        assert conn.execute(text("SELECT count(*) FROM t")).scalar() == 0
+        with pytest.raises(OperationalError):
+            conn.execute(text("INSERT INTO t VALUES (1)"))
+    replica_engine.dispose()
+    primary.dispose()
+
+def test_recent_writers_expire():
+    writers = RecentWriters(window=0.05)
+    writers.mark(1)
+    assert writers.wrote_recently(1)
+    assert not writers.wrote_recently(2)
+    threading.Event().wait(0.1)
+    assert not writers.wrote_recently(1)
+
+def test_reads_go_to_the_replica_until_the_user_writes(db, test_users, replica, auth_headers):
+    property_id = create_property(test_users, auth_headers("agent"))
+    buyer = auth_headers("buyer")
+    recent_writers.clear()
+
+    with stage_reads(replica) as on_replica, stage_reads(engine) as on_primary:
+        assert client.get(f"/properties/{property_id}/stages", headers=buyer).status_code == 200
+    assert on_replica and not on_primary
+
+    # A successful write sends the buyer's reads to the primary, so they see it straight away
+    assert client.post("/notifications/read", headers=buyer, json={"ids": []}).status_code == 200
+    assert recent_writers.wrote_recently(test_users["buyer"].id)
+    with stage_reads(replica) as on_replica, stage_reads(engine) as on_primary:
+        assert client.get(f"/properties/{property_id}/stages", headers=buyer).status_code == 200
+    assert on_primary and not on_replica
+
+    # Other users are unaffected
+    with stage_reads(replica) as on_replica, stage_reads(engine) as on_primary:
+        assert client.get(f"/properties/{property_id}/stages", headers=auth_headers("agent")).status_code == 200
+    assert on_replica and not on_primary
+
+def test_failed_writes_and_reads_do_not_count_as_writes(db, test_users, auth_headers):
+    buyer = auth_headers("buyer")
+    recent_writers.clear()
+    assert client.get("/me/unread-counts", headers=buyer).status_code == 200
+    assert client.post("/notifications/999/read", headers=buyer).status_code == 404
+    assert not recent_writers.wrote_recently(test_users["buyer"].id)
+
+def test_notification_reads_check_access_on_the_replica(db, test_users, replica, auth_headers):
+    property_id = create_property(test_users, auth_headers("agent"))
+    buyer = auth_headers("buyer")
+    recent_writers.clear()
+
+    for path in (f"/properties/{property_id}/notifications", f"/properties/{property_id}/notifications/all"):
+        with stage_reads(replica, "properties") as on_replica, stage_reads(engine, "properties") as on_primary:
+            assert client.get(path, headers=buyer).status_code == 200
+        assert on_replica and not on_primary
@@ -0,0 +1,81 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.database import Base, engine
+from app.models.user import User
+from sqlalchemy.orm import Session
+from app.core.security import get_password_hash, principal_cache
+
+client = TestClient(app)
+
+TEST_USER = {
+    "email": "buyer@test.com",
+    "password": "testpass123",
+    "first_name": "Test",
+    "last_name": "Buyer",
+    "role": "BUYER",
+    "phone_number": "+441234567890"
+}
+
+@pytest.fixture(scope="function")
+def db():
+    Base.metadata.create_all(bind=engine)
+    db = Session(engine)
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(scope="function")
+def test_user(db):
+    user = User(
+        email=TEST_USER["email"],
+        hashed_password=get_password_hash(TEST_USER["password"]),
+        first_name=TEST_USER["first_name"],
+        last_name=TEST_USER["last_name"],
+        role=TEST_USER["role"],
+        phone_number=TEST_USER["phone_number"]
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+def login():
+    return client.post(
+        "/login",
+        json={"email": TEST_USER["email"], "password": TEST_USER["password"]}
+    ).json()["access_token"]
+
+def test_repeat_requests_hit_principal_cache(db, test_user):
+    """Polling with the same token decodes it and loads the user only once."""
+    principal_cache.clear()
+    headers = {"Authorization": f"Bearer {login()}"}
+
+    for _ in range(5):
+        response = client.get("/protected", headers=headers)
+        assert response.status_code == 200
+
+    stats = principal_cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 4
+
+def test_principal_cache_invalidated_on_user_change(db, test_user):
+    """Updating the user row drops the cached principal."""
+    principal_cache.clear()
+    headers = {"Authorization": f"Bearer {login()}"}
+    assert "Test" in client.get("/protected", headers=headers).json()["message"]
+
+    test_user.first_name = "Renamed"
+    db.commit()
+
+    response = client.get("/protected", headers=headers)
+    assert "Renamed" in response.json()["message"]
+    assert principal_cache.stats()["misses"] == 2
+
+def test_invalid_token_is_not_cached(db, test_user):
+    principal_cache.clear()
+    response = client.get("/protected", headers={"Authorization": "Bearer not-a-jwt"})
+    assert response.status_code == 401
+    assert principal_cache.stats()["size"] == 0
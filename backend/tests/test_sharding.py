@@ -0,0 +1,169 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from app.main import app
+from app.core.database import Base
+from app.core.sharding import shard_router
+from app.models.message import Message
+from app.models.notification import Notification
+from app.models.property import Property, PropertyParticipant, PropertyStage, PropertyStatus
+from app.models.shard import FirmShard, PropertyShard
+from app.models.stage_info import StageInfo
+from app.models.timeline_template import TimelineTemplate, TimelineTemplateStage
+from app.scripts.rebalance_shards import backfill, distribution, move_firm
+from app.services.notification_archive import archive_notifications
+from app.services.notifications import notifier
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def shards(db, tmp_path):
+    shard_router.configure([f"sqlite:///{tmp_path / 'shard0.db'}", f"sqlite:///{tmp_path / 'shard1.db'}"])
+    for shard_engine in shard_router.engines:
+        Base.metadata.create_all(bind=shard_engine)
+    db.add_all([FirmShard(firm="North Lettings", shard=0), FirmShard(firm="South Homes", shard=1)])
+    db.commit()
+    try:
+        yield shard_router
+    finally:
+        notifier.flush(timeout=10)
+        shard_router.configure([])
+
+@pytest.fixture(scope="function")
+def create_property(test_users, auth_headers):
+    def create(agent, address):
+        response = client.post("/properties", headers=auth_headers(agent), json={
+            "address": address,
+            "postcode": "AB12 3CD",
+            "price": 100000.0,
+            "buyer_id": test_users["buyer"].id,
+            "buyer_solicitor_id": test_users["solicitor"].id,
+            "estate_agent_id": test_users[agent].id
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+    return create
+
+def shard_count(shard, model):
+    shard_db = shard_router.session(shard)
+    try:
+        return shard_db.execute(select(func.count()).select_from(model)).scalar()
+    finally:
+        shard_db.close()
+
+def test_unsharded_places_nothing(db, test_users, create_property):
+    assert not shard_router.sharded
+    prop = create_property("north_agent", "1 Catalog Road")
+    assert db.get(Property, prop["id"]) is not None
+    assert db.execute(select(func.count()).select_from(PropertyShard)).scalar() == 0
+
+def test_properties_are_placed_by_firm(db, shards, test_users, create_property):
+    north = create_property("north_agent", "1 North Road")
+    south = create_property("south_agent", "1 South Road")
+    assert north["id"] != south["id"]
+    assert shards.locate(db, north["id"]) == 0
+    assert shards.locate(db, south["id"]) == 1
+    # Nothing transactional is left in the catalog
+    assert db.execute(select(func.count()).select_from(Property)).scalar() == 0
+    assert shard_count(0, Property) == 1 and shard_count(1, Property) == 1
+    assert shard_count(1, PropertyStage) > 0 and shard_count(1, PropertyParticipant) == 3
+    # Templates and stage explanations stay in the catalog
+    for model in (TimelineTemplate, TimelineTemplateStage, StageInfo):
+        assert shard_count(0, model) == shard_count(1, model) == 0
+        assert db.execute(select(func.count()).select_from(model)).scalar() > 0
+
+def test_hashed_placement_is_stable(db, shards):
+    assert shards.placement(db, 7, "Unpinned Agency") == shards.placement(db, 8, "Unpinned Agency")
+    assert shards.placement(db, 7, None) == 1
+
+def test_list_fans_out_across_shards(db, shards, test_users, auth_headers, create_property):
+    ids = [create_property(agent, f"{n} Fan Road")["id"]
+           for n, agent in enumerate(["north_agent", "south_agent", "north_agent", "south_agent"])]
+    response = client.get("/properties", headers=auth_headers("buyer"))
+    assert response.status_code == 200
+    assert [prop["id"] for prop in response.json()] == sorted(ids)
+
+    first = client.get("/properties", headers=auth_headers("buyer"), params={"limit": 3}).json()
+    assert [prop["id"] for prop in first["items"]] == sorted(ids)[:3]
+    second = client.get("/properties", headers=auth_headers("buyer"),
+                        params={"limit": 3, "cursor": first["next_cursor"]}).json()
+    assert [prop["id"] for prop in second["items"]] == sorted(ids)[3:]
+    assert second["next_cursor"] is None
+
+    # Each agent only sees their own firm's properties
+    south = client.get("/properties", headers=auth_headers("south_agent")).json()
+    assert [prop["id"] for prop in south] == ids[1::2]
+
+def test_property_endpoints_use_the_owning_shard(db, shards, test_users, auth_headers, create_property):
+    prop = create_property("south_agent", "2 South Road")
+    headers = auth_headers("solicitor")
+
+    assert client.get(f"/properties/{prop['id']}", headers=headers).json()["address"] == "2 South Road"
+    response = client.patch(f"/properties/{prop['id']}", headers=auth_headers("south_agent"), json={"price": 250000.0})
+    assert response.status_code == 200 and response.json()["price"] == 250000.0
+
+    stages = client.get(f"/properties/{prop['id']}/stages", headers=headers).json()
+    response = client.post(f"/properties/{prop['id']}/stages", headers=headers, json={
+        "stage": "Shard Check", "status": "pending", "order": len(stages)
+    })
+    assert response.status_code == 200, response.text
+    new_stage = response.json()["id"]
+    response = client.patch(f"/properties/{prop['id']}/stages/{new_stage}", headers=headers, json={"stage": "Shard Check", "status": "completed"})
+    assert response.status_code == 200
+    assert len(client.get(f"/properties/{prop['id']}/stages", headers=headers).json()) == len(stages) + 1
+    assert shard_count(1, PropertyStage) == len(stages) + 1
+    assert shard_count(0, PropertyStage) == 0
+
+    assert client.get("/properties/999999/stages", headers=headers).status_code == 404
+
+    response = client.delete(f"/properties/{prop['id']}", headers=auth_headers("south_agent"))
+    assert response.status_code == 200
+    assert shard_count(1, Property) == 0 and shard_count(1, PropertyStage) == 0
+    assert shards.locate(db, prop["id"]) is None
+
+def test_move_firm_to_another_shard(db, shards, test_users, auth_headers, create_property):
+    prop = create_property("north_agent", "3 North Road")
+    stages = client.get(f"/properties/{prop['id']}/stages", headers=auth_headers("buyer")).json()
+    db.add(Message(sender_id=test_users["buyer"].id, recipient_id=test_users["north_agent"].id,
+                   property_id=prop["id"], stage_id=stages[0]["id"], content="hello", approval_status="approved"))
+    db.commit()
+
+    assert move_firm(db, "North Lettings", 1) == 1
+    assert shards.locate(db, prop["id"]) == 1
+    assert db.get(FirmShard, "North Lettings").shard == 1
+    assert shard_count(0, Property) == 0 and shard_count(0, PropertyParticipant) == 0
+
+    moved = client.get(f"/properties/{prop['id']}/stages", headers=auth_headers("buyer")).json()
+    assert [stage["stage"] for stage in moved] == [stage["stage"] for stage in stages]
+    message = db.execute(select(Message)).scalar_one()
+    assert message.stage_id == moved[0]["id"]
+    assert [p["id"] for p in client.get("/properties", headers=auth_headers("buyer")).json()] == [prop["id"]]
+
+    # New properties for the firm follow the pin
+    assert shards.locate(db, create_property("north_agent", "4 North Road")["id"]) == 1
+    assert distribution(db) == {1: 2}
+
+def test_backfill_directory(db, test_users, create_property):
+    prop = create_property("south_agent", "5 South Road")
+    assert backfill(db) == 1
+    assert backfill(db) == 0
+    entry = db.get(PropertyShard, prop["id"])
+    assert (entry.shard, entry.firm) == (0, "South Homes")
+
+def test_archiver_finds_closed_properties_on_their_shards(db, shards, test_users, create_property):
+    live = create_property("north_agent", "6 North Road")["id"]
+    sold = create_property("south_agent", "6 South Road")["id"]
+    shard_db = shard_router.session(1)
+    try:
+        shard_db.query(Property).filter(Property.id == sold).update({Property.status: PropertyStatus.SOLD})
+        shard_db.commit()
+    finally:
+        shard_db.close()
+    assert notifier.flush(timeout=10)
+    db.add_all([Notification(user_id=test_users["buyer"].id, property_id=property_id, message="m", type="system")
+                for property_id in (live, sold)])
+    db.commit()
+
+    archive_notifications(db, retention_days=90)
+    remaining = {property_id for property_id, in db.query(Notification.property_id)}
+    assert live in remaining and sold not in remaining
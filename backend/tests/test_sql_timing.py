@@ -0,0 +1,122 @@
+import logging
+import re
+import threading
+from contextlib import contextmanager
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app.main import app
+from app.core.config import settings
+from app.core.database import Base, engine
+from app.core.sharding import shard_router
+from app.core.sql_timing import configure_slow_query_log, normalize_sql, slow_query_log
+from app.services.notifications import notifier
+
+client = TestClient(app)
+
+@contextmanager
+def recording():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if threading.current_thread().name != "notifications":
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+def create_property(test_users, headers):
+    response = client.post("/properties", headers=headers, json={
+        "address": "123 Test St",
+        "postcode": "AB12 3CD",
+        "price": 100000.0,
+        "buyer_id": test_users["buyer"].id,
+        "estate_agent_id": test_users["agent"].id,
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+def server_timing(response):
+    match = re.fullmatch(r'db;dur=([\d.]+);desc="(\d+) queries", db-slowest;dur=([\d.]+)',
+                         response.headers["server-timing"])
+    assert match
+    return float(match.group(1)), int(match.group(2)), float(match.group(3))
+
+def test_server_timing_counts_the_requests_queries(db, test_users, auth_headers):
+    headers = auth_headers("agent")
+    property_id = create_property(test_users, headers)
+    notifier.flush(timeout=10)
+
+    with recording() as statements:
+        response = client.get(f"/properties/{property_id}/stages", headers=headers)
+    assert response.status_code == 200
+    total, count, slowest = server_timing(response)
+    assert count == len(statements) > 0
+    assert 0 < slowest <= total
+
+def test_sharded_fan_out_queries_are_counted(db, test_users, auth_headers, tmp_path):
+    shard_router.configure([f"sqlite:///{tmp_path / 'shard0.db'}", f"sqlite:///{tmp_path / 'shard1.db'}"])
+    try:
+        for shard_engine in shard_router.engines:
+            Base.metadata.create_all(bind=shard_engine)
+        headers = auth_headers("agent")
+        create_property(test_users, headers)
+        notifier.flush(timeout=10)
+
+        shard_statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            shard_statements.append(statement)
+
+        for shard_engine in shard_router.engines:
+            event.listen(shard_engine, "before_cursor_execute", record)
+        try:
+            with recording() as statements:
+                response = client.get("/properties", headers=headers)
+        finally:
+            for shard_engine in shard_router.engines:
+                event.remove(shard_engine, "before_cursor_execute", record)
+        assert response.status_code == 200
+        # Queries run on the fan-out's worker threads count towards the request too
+        assert len(shard_statements) >= 2
+        assert server_timing(response)[1] == len(statements) + len(shard_statements)
+    finally:
+        notifier.flush(timeout=10)
+        shard_router.configure([])
+
+def test_async_handlers_are_counted(db, test_users, auth_headers):
+    headers = auth_headers("agent")
+    property_id = create_property(test_users, headers)
+    response = client.get(f"/files?property_id={property_id}", headers=headers)
+    assert response.status_code == 200
+    assert server_timing(response)[1] > 0
+
+def test_requests_without_queries_report_zero():
+    assert server_timing(client.get("/ping"))[1] == 0
+
+def test_normalize_sql():
+    assert normalize_sql(
+        "SELECT * FROM files\n  WHERE files.property_id IN (?, ?, ?) AND name = 'o''brien' LIMIT 20"
+    ) == "SELECT * FROM files WHERE files.property_id IN (?...) AND name = ? LIMIT ?"
+    assert normalize_sql("SELECT a FROM t WHERE id = %(id_1)s AND b = $2") == "SELECT a FROM t WHERE id = ? AND b = ?"
+
+def test_slow_statements_are_logged_with_their_route(db, test_users, monkeypatch, caplog, tmp_path, auth_headers):
+    headers = auth_headers("agent")
+    property_id = create_property(test_users, headers)
+    monkeypatch.setattr(settings, "SLOW_QUERY_THRESHOLD_MS", 0)
+    configure_slow_query_log(str(tmp_path / "slow.log"))
+    try:
+        with caplog.at_level(logging.WARNING, logger=slow_query_log.name):
+            client.get(f"/properties/{property_id}/stages", headers=headers)
+        for handler in slow_query_log.handlers:
+            handler.flush()
+    finally:
+        for handler in list(slow_query_log.handlers):
+            slow_query_log.removeHandler(handler)
+            handler.close()
+
+    messages = [r.getMessage() for r in caplog.records if r.name == slow_query_log.name]
+    assert any("GET /properties/{property_id}/stages SELECT" in m and "FROM property_stages" in m for m in messages)
+    assert "GET /properties/{property_id}/stages" in (tmp_path / "slow.log").read_text()
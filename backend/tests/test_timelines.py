@@ -0,0 +1,114 @@
+from contextlib import contextmanager
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app.main import app
+from app.core.database import engine
+from app.models.property import PropertyStage
+from app.models.stage_info import StageInfo
+from app.services.timelines import PRESET_STAGES, MAX_RANK_LENGTH, rank_for_position, rebalance_stages
+
+client = TestClient(app)
+
+@contextmanager
+def recording():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+def create_property(test_users, headers):
+    response = client.post("/properties", headers=headers, json={
+        "address": "123 Test St",
+        "postcode": "AB12 3CD",
+        "price": 100000.0,
+        "buyer_id": test_users["buyer"].id,
+        "buyer_solicitor_id": test_users["solicitor"].id,
+        "estate_agent_id": test_users["agent"].id,
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+def stage_names(property_id, headers):
+    stages = client.get(f"/properties/{property_id}/stages", headers=headers).json()
+    assert [s["order"] for s in stages] == list(range(len(stages)))
+    return [s["stage"] for s in stages]
+
+def stage_updates(statements):
+    return [s for s in statements if s.startswith("UPDATE property_stages")]
+
+def test_create_property_clones_template(db, test_users, auth_headers):
+    headers = auth_headers("agent")
+
+    # The first property also seeds the template; later ones only clone it
+    create_property(test_users, headers)
+    with recording() as statements:
+        property_id = create_property(test_users, headers)
+
+    assert stage_names(property_id, headers) == [s["stage"] for s in PRESET_STAGES]
+    assert db.query(StageInfo).count() == len(PRESET_STAGES) * 4
+
+    stage_inserts = [s for s in statements if s.startswith("INSERT INTO property_stages")]
+    stage_info_selects = [s for s in statements if s.startswith("SELECT") and "FROM stage_info" in s]
+    assert len(stage_inserts) == 1
+    assert not stage_info_selects
+    assert len(statements) <= 8
+
+def test_insert_and_move_write_one_row(db, test_users, auth_headers):
+    headers = auth_headers("agent")
+    property_id = create_property(test_users, headers)
+    names = [s["stage"] for s in PRESET_STAGES]
+
+    with recording() as statements:
+        response = client.post(f"/properties/{property_id}/stages", headers=headers, json={
+            "stage": "Extra Check", "status": "pending", "order": 1
+        })
+    assert response.status_code == 200
+    assert response.json()["order"] == 1
+    assert not stage_updates(statements)
+    names.insert(1, "Extra Check")
+    assert stage_names(property_id, headers) == names
+
+    stage_id = response.json()["id"]
+    with recording() as statements:
+        response = client.patch(f"/properties/{property_id}/stages/{stage_id}", headers=headers, json={
+            "stage": "Extra Check", "status": "pending", "order": 5
+        })
+    assert response.json()["order"] == 5
+    assert len(stage_updates(statements)) == 1
+    names.insert(5, names.pop(1))
+    assert stage_names(property_id, headers) == names
+
+def test_reorder_is_one_update(db, test_users, auth_headers):
+    property_id = create_property(test_users, auth_headers("agent"))
+    headers = auth_headers("solicitor")
+    stages = client.get(f"/properties/{property_id}/stages", headers=headers).json()
+
+    with recording() as statements:
+        response = client.patch(f"/properties/{property_id}/stages/reorder", headers=headers,
+                                json={"stage_ids": [s["id"] for s in reversed(stages)]})
+    assert response.status_code == 200
+    assert len(stage_updates(statements)) == 1
+    assert stage_names(property_id, headers) == [s["stage"] for s in reversed(stages)]
+
+def test_rebalance_keeps_order(db, test_users, auth_headers):
+    property_id = create_property(test_users, auth_headers("agent"))
+    # Keep inserting into the same gap until ranks get long
+    for i in range(80):
+        db.add(PropertyStage(property_id=property_id, stage=f"Inserted {i}", status="pending",
+                             rank=rank_for_position(db, property_id, 1)))
+        db.flush()
+    before = [s.id for s in db.query(PropertyStage).order_by(PropertyStage.rank, PropertyStage.id)]
+    assert max(len(s.rank) for s in db.query(PropertyStage)) > MAX_RANK_LENGTH
+
+    rebalance_stages(db, property_id)
+    db.commit()
+    db.expire_all()
+    stages = db.query(PropertyStage).order_by(PropertyStage.rank, PropertyStage.id).all()
+    assert [s.id for s in stages] == before
+    assert max(len(s.rank) for s in stages) <= 3
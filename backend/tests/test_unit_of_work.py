@@ -0,0 +1,91 @@
+from contextlib import contextmanager
+from fastapi.testclient import TestClient
+from app.main import app
+from app.api import property as property_api
+from app.core.database import request_commits
+from app.models.property import Property, PropertyStage
+
+client = TestClient(app)
+
+@contextmanager
+def commits():
+    counted = {"before": request_commits.count}
+    yield counted
+    counted["made"] = request_commits.count - counted["before"]
+
+def create_property(test_users, headers):
+    response = client.post("/properties", headers=headers, json={
+        "address": "123 Test St",
+        "postcode": "AB12 3CD",
+        "price": 100000.0,
+        "buyer_id": test_users["buyer"].id,
+        "buyer_solicitor_id": test_users["solicitor"].id,
+        "estate_agent_id": test_users["agent"].id,
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+def test_write_endpoints_commit_once(db, test_users, auth_headers):
+    agent = auth_headers("agent")
+    solicitor = auth_headers("solicitor")
+
+    with commits() as counted:
+        property_id = create_property(test_users, agent)
+    assert counted["made"] == 1
+
+    with commits() as counted:
+        response = client.post(f"/properties/{property_id}/stages", headers=agent, json={
+            "stage": "Extra Check", "status": "pending", "order": 1
+        })
+    assert response.status_code == 200
+    assert counted["made"] == 1
+    stage_id = response.json()["id"]
+
+    with commits() as counted:
+        response = client.patch(f"/properties/{property_id}/stages/{stage_id}", headers=agent, json={
+            "stage": "Extra Check", "status": "completed"
+        })
+    assert response.status_code == 200
+    assert counted["made"] == 1
+
+    first_stage = db.query(PropertyStage.id).filter(PropertyStage.property_id == property_id).first()[0]
+    with commits() as counted:
+        response = client.post(f"/properties/{property_id}/stages/{first_stage}/complete", headers=agent)
+    assert response.status_code == 200
+    assert counted["made"] == 1
+
+    with commits() as counted:
+        response = client.delete(f"/properties/{property_id}/stages/{stage_id}", headers=solicitor)
+    assert response.status_code == 200
+    assert counted["made"] == 1
+
+    with commits() as counted:
+        response = client.delete(f"/properties/{property_id}", headers=agent)
+    assert response.status_code == 200
+    assert counted["made"] == 1
+
+def test_rejected_requests_do_not_commit(db, test_users, auth_headers):
+    property_id = create_property(test_users, auth_headers("agent"))
+    with commits() as counted:
+        response = client.delete(f"/properties/{property_id}/stages/999", headers=auth_headers("solicitor"))
+    assert response.status_code == 404
+    assert counted["made"] == 0
+
+def test_failure_part_way_rolls_back_the_whole_request(db, test_users, monkeypatch, auth_headers):
+    def fail(db, property_id):
+        raise RuntimeError("template unavailable")
+
+    # The property row is flushed before the stages are cloned
+    monkeypatch.setattr(property_api, "clone_template", fail)
+    failing_client = TestClient(app, raise_server_exceptions=False)
+    with commits() as counted:
+        response = failing_client.post("/properties", headers=auth_headers("agent"), json={
+            "address": "123 Test St",
+            "postcode": "AB12 3CD",
+            "price": 100000.0,
+            "buyer_id": test_users["buyer"].id,
+            "estate_agent_id": test_users["agent"].id,
+        })
+    assert response.status_code == 500
+    assert counted["made"] == 0
+    assert db.query(Property).count() == 0